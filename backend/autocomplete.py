@@ -0,0 +1,190 @@
+"""
+Prefix index over drink names for autocomplete and "did you mean" hints.
+Keys are normalized names plus every word-start suffix ("long island iced tea" is also
+reachable as "iced tea" and "tea"), kept in one sorted list so a prefix lookup is a
+bisect plus a bounded scan. Matches are ranked by popularity (logs per drink from
+UserDrinkStats). New drinks are inserted in place; other catalog changes trigger a
+rebuild through the catalog version.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import process, fuzz
+from sqlalchemy import func
+from sqlmodel import Session, select
+from .models import Drink, UserDrinkStats
+from .database import engine
+from .ingredients import normalize_ingredient_name
+from .index_sync import VersionedIndex
+
+MAX_SCAN = 2000  # Prefix entries examined per lookup; bounds very short queries
+POPULARITY_REFRESH_SECONDS = 300
+HINT_CUTOFF = 60
+
+
+def normalize_drink_name(name: str) -> str:
+    """Case/accent-fold a drink name and collapse punctuation to single spaces"""
+    text = normalize_ingredient_name(name)
+    return re.sub(r"[^\w]+", " ", text).strip()
+
+
+def _index_keys(normalized: str) -> List[str]:
+    words = normalized.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class _AutocompleteState:
+    def __init__(self):
+        self.keys: List[Tuple[str, int]] = []  # Sorted (key, drink_id)
+        self.names: Dict[int, str] = {}
+        self.full_keys: Dict[int, str] = {}  # drink_id -> normalized full name
+        self.normalized: Dict[str, int] = {}  # Full normalized name -> drink_id
+
+    def add_drink(self, drink_id: int, name: str, sort: bool = True) -> None:
+        normalized = normalize_drink_name(name)
+        if not normalized:
+            return
+        self.names[drink_id] = name
+        self.full_keys[drink_id] = normalized
+        self.normalized.setdefault(normalized, drink_id)
+        for key in _index_keys(normalized):
+            if sort:
+                insort(self.keys, (key, drink_id))
+            else:
+                self.keys.append((key, drink_id))
+
+
+class AutocompleteIndex(VersionedIndex):
+    """Sorted-array prefix index over drink names, ranked by log counts"""
+
+    def __init__(self):
+        super().__init__()
+        self._state = _AutocompleteState()
+        self.popularity: Dict[int, int] = {}
+        self._popularity_loaded = 0.0
+        self._write_lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self.version is not None
+
+    def _load_from_database(self) -> None:
+        state = _AutocompleteState()
+        with Session(engine) as session:
+            for drink_id, name in session.exec(select(Drink.drink_id, Drink.name)).all():
+                state.add_drink(drink_id, name, sort=False)
+            popularity = self._query_popularity(session)
+        state.keys.sort()
+        self._state, self.popularity = state, popularity
+        self._popularity_loaded = time.monotonic()
+
+    @staticmethod
+    def _query_popularity(session) -> Dict[int, int]:
+        rows = session.exec(
+            select(UserDrinkStats.drink_id, func.sum(UserDrinkStats.logs))
+            .where(UserDrinkStats.drink_id.is_not(None))
+            .group_by(UserDrinkStats.drink_id)
+        ).all()
+        return {drink_id: int(logs or 0) for drink_id, logs in rows}
+
+    def ensure_built(self) -> None:
+        if not self.built:
+            self.rebuild_index_from_database()
+            return
+        self.refresh_if_stale()
+        # Logs do not bump the catalog version, so popularity refreshes on its own timer
+        if time.monotonic() - self._popularity_loaded > POPULARITY_REFRESH_SECONDS:
+            self._popularity_loaded = time.monotonic()
+            with Session(engine) as session:
+                self.popularity = self._query_popularity(session)
+
+    def add_drink(self, drink_id: int, name: str) -> None:
+        with self._write_lock:
+            self._state.add_drink(drink_id, name)
+
+    def record_log(self, drink_id: Optional[int], count: int = 1) -> None:
+        """Bump a drink's popularity in place between refreshes"""
+        if drink_id is not None:
+            self.popularity[drink_id] = self.popularity.get(drink_id, 0) + count
+
+    def lookup(self, name: str) -> Optional[int]:
+        """drink_id whose normalized name equals the query, or None"""
+        self.ensure_built()
+        return self._state.normalized.get(normalize_drink_name(name))
+
+    def complete(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Drinks with a name (or a later word of it) starting with prefix, most logged first"""
+        self.ensure_built()
+        query = normalize_drink_name(prefix)
+        if not query:
+            return []
+        state, popularity = self._state, self.popularity
+        start = bisect_left(state.keys, (query, -1))
+        matches: Dict[int, bool] = {}  # drink_id -> matched at the start of the name
+        for key, drink_id in state.keys[start:start + MAX_SCAN]:
+            if not key.startswith(query):
+                break
+            matches[drink_id] = matches.get(drink_id, False) or key == state.full_keys[drink_id]
+        ranked = sorted(
+            matches.items(),
+            key=lambda item: (-popularity.get(item[0], 0), not item[1], len(state.names[item[0]]), state.names[item[0]])
+        )
+        return [
+            {"drink_id": drink_id, "name": state.names[drink_id], "logs": popularity.get(drink_id, 0)}
+            for drink_id, _ in ranked[:limit]
+        ]
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        """
+        "Did you mean" hints for a name that did not resolve.
+        Tries prefix completion, then fuzzy matching against names sharing the first
+        characters, then (only on a complete miss) every name.
+        """
+        hints = [entry["name"] for entry in self.complete(name, limit=limit)]
+        if hints:
+            return hints
+        query = normalize_drink_name(name)
+        if not query:
+            return []
+        state = self._state
+        nearby = {drink_id: state.names[drink_id] for drink_id in self._prefix_block(query[:2])}
+        for choices in (nearby, state.names):
+            matches = process.extract(query, choices, scorer=fuzz.WRatio, processor=normalize_drink_name,
+                                      score_cutoff=HINT_CUTOFF, limit=limit)
+            if matches:
+                return [match[0] for match in matches]
+        return []
+
+    def _prefix_block(self, prefix: str) -> List[int]:
+        """drink_ids of (up to MAX_SCAN) keys starting with prefix"""
+        keys = self._state.keys
+        start = bisect_left(keys, (prefix, -1))
+        block = []
+        for key, drink_id in keys[start:start + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            block.append(drink_id)
+        return block
+
+
+# Global instance
+autocomplete_index = AutocompleteIndex()
+
+
+def autocomplete_drinks(prefix: str, limit: int = 10) -> List[dict]:
+    return autocomplete_index.complete(prefix, limit=limit)
+
+
+def suggest_drink_names(name: str, limit: int = 3) -> List[str]:
+    return autocomplete_index.suggest(name, limit=limit)
+
+
+def add_drink_to_autocomplete_index(drink_id: int, name: str, catalog_version: Optional[int] = None) -> None:
+    """Keep an already-built index current when a drink is created in this process"""
+    if autocomplete_index.built:
+        autocomplete_index.add_drink(drink_id, name)
+        if catalog_version is not None:
+            autocomplete_index.mark_applied(catalog_version)
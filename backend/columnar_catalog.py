@@ -0,0 +1,280 @@
+"""
+Columnar, memory-mapped drink catalog shared by every process on the host.
+The first process to see a new catalog_version writes one file with only the
+columns the indexes need (ids, names, CSR ingredient ids with equal and volume
+weights, category codes, embeddings); every uvicorn worker, the bot and the
+worker pool then mmap it read-only. Pages come from the OS page cache, so memory
+stays flat as processes are added and attaching takes a few milliseconds.
+
+Layout (little-endian): magic b"OTRCOLS\\n", u64 header length, header JSON
+(version, drink_count, vocabularies, {array: [dtype, shape, offset]}), then each
+array at a 64-byte aligned offset.
+
+    catalog = shared_catalog.get()
+    catalog.top_k(user_vector, k=3)   # [(drink_id, cosine similarity), ...]
+"""
+
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+from .models import Drink, DrinkIngredient
+from .database import engine, get_catalog_version
+from .index_sync import VersionedIndex
+
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", "catalog_cache")
+CATALOG_MAGIC = b"OTRCOLS\n"
+EMBEDDING_DIM = 10
+KEEP_VERSIONS = 2  # Older files are removed once a newer one is published
+_ALIGN = 64
+_U64 = struct.Struct("<Q")
+_FILE_PATTERN = re.compile(r"catalog-v(\d+)\.bin$")
+
+
+def catalog_path(version: int, directory: str = CATALOG_CACHE_DIR) -> str:
+    return os.path.join(directory, f"catalog-v{version}.bin")
+
+
+def _codes(values: List[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode strings: (int16 codes with -1 for None, vocabulary)"""
+    vocabulary: Dict[str, int] = {}
+    codes = np.array([-1 if v is None else vocabulary.setdefault(v, len(vocabulary)) for v in values], dtype=np.int16)
+    return codes, list(vocabulary)
+
+
+def _load_columns(session) -> Dict[str, object]:
+    """Read the catalog as plain columns (no ORM objects) and pack the arrays"""
+    from .faiss_utils import get_drink_embedding
+    drinks = session.exec(select(
+        Drink.drink_id, Drink.name, Drink.category, Drink.alcoholic, Drink.weights, Drink.ingredients_json
+    ).order_by(Drink.drink_id)).all()
+    pairs = session.exec(select(
+        DrinkIngredient.drink_id, DrinkIngredient.ingredient_id, DrinkIngredient.weight,
+        func.coalesce(DrinkIngredient.volume_weight, DrinkIngredient.weight)
+    ).order_by(DrinkIngredient.drink_id, DrinkIngredient.position)).all()
+
+    rows: Dict[int, Dict[int, Tuple[float, float]]] = {}
+    for drink_id, ingredient_id, weight, volume_weight in pairs:
+        # An ingredient listed twice (two spellings of one alias) keeps one column, as in a dense matrix
+        rows.setdefault(drink_id, {})[ingredient_id] = (weight or 0.0, volume_weight or 0.0)
+    indptr = np.zeros(len(drinks) + 1, dtype=np.int64)
+    ingredient_ids, weights, volume_weights = [], [], []
+    for i, drink in enumerate(drinks):
+        entries = rows.get(drink[0], {})
+        ingredient_ids.extend(entries)
+        weights.extend(w for w, _ in entries.values())
+        volume_weights.extend(v for _, v in entries.values())
+        indptr[i + 1] = len(ingredient_ids)
+    weights = np.array(weights, dtype=np.float32)
+    volume_weights = np.array(volume_weights, dtype=np.float32)
+
+    encoded = [(name or "").encode() for _, name, *_ in drinks]
+    name_offsets = np.zeros(len(drinks) + 1, dtype=np.int64)
+    np.cumsum([len(n) for n in encoded], out=name_offsets[1:])
+    category_codes, categories = _codes([d[2] for d in drinks])
+    alcoholic_codes, alcoholic = _codes([d[3] for d in drinks])
+    embeddings = np.array([
+        get_drink_embedding(name, ingredients if isinstance(ingredients, list) else None)
+        for _, name, _, _, _, ingredients in drinks
+    ], dtype=np.float32).reshape(len(drinks), EMBEDDING_DIM)
+
+    def row_norms(values: np.ndarray) -> np.ndarray:
+        sums = np.concatenate([[0.0], np.cumsum(values.astype(np.float64) ** 2)])
+        return np.sqrt(sums[indptr[1:]] - sums[indptr[:-1]]).astype(np.float32)
+
+    return {
+        "vocabularies": {"category": categories, "alcoholic": alcoholic},
+        "ingredient_bound": int(max(ingredient_ids, default=-1)) + 1,
+        "arrays": {
+            "drink_ids": np.array([d[0] for d in drinks], dtype=np.int64),
+            "name_offsets": name_offsets,
+            "name_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "indptr": indptr,
+            "ingredient_ids": np.array(ingredient_ids, dtype=np.int32),
+            "weights": weights,
+            "volume_weights": volume_weights,
+            "weight_norms": row_norms(weights),
+            "volume_weight_norms": row_norms(volume_weights),
+            # Same eligibility as the old KNN: only drinks with a non-empty weights dict
+            "weighted": np.array([isinstance(d[4], dict) and bool(d[4]) for d in drinks], dtype=np.bool_),
+            "category_codes": category_codes,
+            "alcoholic_codes": alcoholic_codes,
+            "embeddings": embeddings,
+        },
+    }
+
+
+def _write_catalog(path: str, version: int, columns: Dict[str, object]) -> None:
+    arrays: Dict[str, np.ndarray] = columns["arrays"]
+    # Offsets are relative to the end of the header so the header can describe them
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout[name] = [array.dtype.newbyteorder("<").str, list(array.shape), offset]
+        offset += array.nbytes
+    header = json.dumps({
+        "version": version,
+        "drink_count": len(arrays["drink_ids"]),
+        "ingredient_bound": columns["ingredient_bound"],
+        "vocabularies": columns["vocabularies"],
+        "arrays": layout,
+    }).encode()
+    data_start = -(-(len(CATALOG_MAGIC) + _U64.size + len(header)) // _ALIGN) * _ALIGN
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CATALOG_MAGIC + _U64.pack(len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(np.ascontiguousarray(array, dtype=layout[name][0]).tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    # Atomic publish: readers see either no file or a complete one
+    os.replace(tmp_path, path)
+
+
+def _remove_old_versions(directory: str, version: int) -> None:
+    for path in glob.glob(os.path.join(directory, "catalog-v*.bin")):
+        match = _FILE_PATTERN.search(path)
+        if match and int(match.group(1)) <= version - KEEP_VERSIONS:
+            try:
+                # Processes that still have it mapped keep their pages until they detach
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_catalog(version: Optional[int] = None, directory: str = CATALOG_CACHE_DIR) -> str:
+    """
+    Write the columnar file for a catalog version (default: the current one) and
+    return its path. Concurrent builders are safe; the last rename wins with identical content.
+    """
+    if version is None:
+        version = get_catalog_version()
+    os.makedirs(directory, exist_ok=True)
+    with Session(engine) as session:
+        columns = _load_columns(session)
+    path = catalog_path(version, directory)
+    _write_catalog(path, version, columns)
+    _remove_old_versions(directory, version)
+    return path
+
+
+class ColumnarCatalog:
+    """Read-only view over one mapped catalog file; every array is a zero-copy slice of the map"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(CATALOG_MAGIC)] != CATALOG_MAGIC:
+            raise ValueError(f"{path} is not a columnar catalog file")
+        (header_length,) = _U64.unpack_from(self._map, len(CATALOG_MAGIC))
+        header_start = len(CATALOG_MAGIC) + _U64.size
+        header = json.loads(self._map[header_start:header_start + header_length])
+        data_start = -(-(header_start + header_length) // _ALIGN) * _ALIGN
+        self.path = path
+        self.version: int = header["version"]
+        self.ingredient_bound: int = header["ingredient_bound"]
+        self.categories: List[str] = header["vocabularies"]["category"]
+        self.alcoholic_values: List[str] = header["vocabularies"]["alcoholic"]
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            count = int(np.prod(shape))
+            array = np.frombuffer(self._map, dtype=dtype, count=count, offset=data_start + offset)
+            setattr(self, name, array.reshape(shape))
+        self._names: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.drink_ids)
+
+    @property
+    def names(self) -> List[str]:
+        """Decoded drink names by row (decoded once per process on first use)"""
+        if self._names is None:
+            data = self.name_bytes.tobytes()
+            offsets = self.name_offsets.tolist()
+            self._names = [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(self))]
+        return self._names
+
+    def row_of(self, drink_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.drink_ids, drink_id))
+        return row if row < len(self) and self.drink_ids[row] == drink_id else None
+
+    def ingredients(self, row: int) -> np.ndarray:
+        return self.ingredient_ids[self.indptr[row]:self.indptr[row + 1]]
+
+    def category(self, row: int) -> Optional[str]:
+        code = int(self.category_codes[row])
+        return self.categories[code] if code >= 0 else None
+
+    def alcoholic(self, row: int) -> Optional[str]:
+        code = int(self.alcoholic_codes[row])
+        return self.alcoholic_values[code] if code >= 0 else None
+
+    def cosine_similarity(self, user_vector: Dict[int, float], use_volume_weights: bool = True) -> np.ndarray:
+        """Cosine similarity of every drink to a {ingredient_id: weight} vector, straight off the CSR arrays"""
+        values = self.volume_weights if use_volume_weights else self.weights
+        norms = self.volume_weight_norms if use_volume_weights else self.weight_norms
+        user = np.zeros(self.ingredient_bound, dtype=np.float64)
+        for ingredient_id, weight in user_vector.items():
+            if 0 <= ingredient_id < self.ingredient_bound:
+                user[ingredient_id] = weight
+        # Ingredients no drink uses still count toward the user's norm, as in a dense matrix
+        user_norm = float(np.linalg.norm(list(user_vector.values()))) if user_vector else 0.0
+        sums = np.concatenate([[0.0], np.cumsum(values * user[self.ingredient_ids])])
+        dots = sums[self.indptr[1:]] - sums[self.indptr[:-1]]
+        denominator = norms * user_norm
+        return np.divide(dots, denominator, out=np.zeros(len(self)), where=denominator > 0)
+
+    def top_k(self, user_vector: Dict[int, float], k: int = 1, use_volume_weights: bool = True,
+              exclude_names: Iterable[str] = ()) -> List[Tuple[int, float]]:
+        """Best k weighted drinks by cosine similarity, skipping exclude_names: [(drink_id, similarity), ...]"""
+        similarity = np.where(self.weighted, self.cosine_similarity(user_vector, use_volume_weights), -np.inf)
+        excluded = set(exclude_names)
+        if excluded:
+            similarity[[i for i, name in enumerate(self.names) if name in excluded]] = -np.inf
+        k = min(k, int(np.isfinite(similarity).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        return [(int(self.drink_ids[i]), float(similarity[i])) for i in top]
+
+
+def attach_catalog(version: Optional[int] = None, directory: str = CATALOG_CACHE_DIR) -> ColumnarCatalog:
+    """Map the file for a catalog version (default: current), building it first if no process has yet"""
+    if version is None:
+        version = get_catalog_version()
+    path = catalog_path(version, directory)
+    if not os.path.exists(path):
+        build_catalog(version, directory)
+    return ColumnarCatalog(path)
+
+
+class SharedCatalog(VersionedIndex):
+    """This process's attachment to the current catalog file; re-attaches when catalog_version moves"""
+
+    def __init__(self):
+        super().__init__()
+        self._catalog: Optional[ColumnarCatalog] = None
+
+    def _load_from_database(self) -> None:
+        # Readers holding the old catalog keep its map alive until they drop it
+        self._catalog = attach_catalog()
+
+    def get(self) -> ColumnarCatalog:
+        if self._catalog is None:
+            self.rebuild_index_from_database()
+        else:
+            self.refresh_if_stale()
+        return self._catalog
+
+
+# Global instance
+shared_catalog = SharedCatalog()
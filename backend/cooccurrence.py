@@ -0,0 +1,268 @@
+"""
+Item-item co-occurrence recommender: "people who log Margarita also log Paloma".
+DrinkCooccurrence is a sparse symmetric drink x drink matrix of how many users
+logged both drinks (the diagonal holds each drink's user count). record_logs keeps
+it current in the logging transaction: a user's first log of a drink adds one to
+its pairs with every drink already in their history.
+
+Similarity is cosine over users, users(a, b) / sqrt(users(a) * users(b)). The top
+COOCCURRENCE_TOP_N neighbors of each drink are precomputed into DrinkNeighbors;
+count changes mark the affected lists stale and they are recomputed on next read.
+
+    python -m backend.cooccurrence --rebuild    # recompute everything from UserDrinkStats
+"""
+
+import argparse
+import math
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+from sqlalchemy import text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select, delete
+from .models import DrinkCooccurrence, DrinkNeighbors, UserDrinkStats
+from .database import engine, get_metadata_value, set_metadata_value
+
+COOCCURRENCE_TOP_N = int(os.getenv("COOCCURRENCE_TOP_N", "20"))
+# Pairs seen for fewer users are too noisy to recommend
+COOCCURRENCE_MIN_USERS = int(os.getenv("COOCCURRENCE_MIN_USERS", "1"))
+# How many of the user's most recent distinct drinks seed a recommendation
+RECENT_HISTORY = 20
+COOCCURRENCE_BACKFILL_KEY = "drink_cooccurrence_backfilled"
+WRITE_BATCH = 5000
+
+
+def user_drink_sets(session, user_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """Distinct logged drink ids per user, from the per-user per-drink aggregates"""
+    sets: Dict[int, Set[int]] = {user_id: set() for user_id in user_ids}
+    if not sets:
+        return sets
+    rows = session.exec(select(UserDrinkStats.user_id, UserDrinkStats.drink_id).where(
+        UserDrinkStats.user_id.in_(sets.keys()), UserDrinkStats.drink_id.is_not(None), UserDrinkStats.logs > 0
+    )).all()
+    for user_id, drink_id in rows:
+        sets[user_id].add(drink_id)
+    return sets
+
+
+def pair_deltas(before: Dict[int, Set[int]], after: Dict[int, Set[int]]) -> Counter:
+    """Changes to the (drink, other drink) user counts when users' drink sets go from before to after"""
+    deltas: Counter = Counter()
+    for user_id, new_set in after.items():
+        old_set = before.get(user_id, set())
+        kept = old_set & new_set
+        for drinks, sign in ((new_set - old_set, 1), (old_set - new_set, -1)):
+            for drink_id in drinks:
+                deltas[(drink_id, drink_id)] += sign
+                for other in kept:
+                    deltas[(drink_id, other)] += sign
+                    deltas[(other, drink_id)] += sign
+                for other in drinks:
+                    if other != drink_id:
+                        deltas[(drink_id, other)] += sign
+    return Counter({pair: n for pair, n in deltas.items() if n})
+
+
+def update_cooccurrence(session, before: Dict[int, Set[int]], after: Dict[int, Set[int]]) -> None:
+    """Apply the pair changes in the caller's transaction and mark affected neighbor lists stale"""
+    deltas = pair_deltas(before, after)
+    if not deltas:
+        return
+    stmt = sqlite_insert(DrinkCooccurrence)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["drink_id", "other_drink_id"],
+        set_={"users": DrinkCooccurrence.users + stmt.excluded.users}
+    )
+    session.execute(stmt, [{"drink_id": a, "other_drink_id": b, "users": n} for (a, b), n in deltas.items()])
+    touched = sorted({a for a, _ in deltas})
+    if any(n < 0 for n in deltas.values()):
+        session.exec(delete(DrinkCooccurrence).where(DrinkCooccurrence.drink_id.in_(touched), DrinkCooccurrence.users <= 0))
+    # A drink's list changes when its row changes, or when a neighbor's user count (diagonal) changes
+    counted = sorted({a for (a, b) in deltas if a == b})
+    session.execute(
+        update(DrinkNeighbors)
+        .where(DrinkNeighbors.drink_id.in_(touched) | DrinkNeighbors.drink_id.in_(
+            select(DrinkCooccurrence.other_drink_id).where(DrinkCooccurrence.drink_id.in_(counted))
+        ))
+        .values(stale=True)
+    )
+
+
+_NEIGHBOR_QUERY = text("""
+    SELECT c.other_drink_id, c.users, own.users, theirs.users
+    FROM drinkcooccurrence c
+    JOIN drinkcooccurrence own ON own.drink_id = c.drink_id AND own.other_drink_id = c.drink_id
+    JOIN drinkcooccurrence theirs ON theirs.drink_id = c.other_drink_id AND theirs.other_drink_id = c.other_drink_id
+    WHERE c.drink_id = :drink_id AND c.other_drink_id != c.drink_id AND c.users >= :min_users
+""")
+
+
+def compute_neighbors(session, drink_id: int, top_n: int = COOCCURRENCE_TOP_N) -> List[List[float]]:
+    """Top-n [other_drink_id, cosine similarity] for one drink, straight from its matrix row"""
+    scored = [
+        (other, users / math.sqrt(own * theirs))
+        for other, users, own, theirs in session.execute(_NEIGHBOR_QUERY, {"drink_id": drink_id, "min_users": COOCCURRENCE_MIN_USERS})
+    ]
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return [[other, score] for other, score in scored[:top_n]]
+
+
+def get_neighbors(session, drink_ids: Iterable[int]) -> Dict[int, List[List[float]]]:
+    """
+    Precomputed neighbor lists for many drinks in one query; missing or stale lists are
+    recomputed and saved in the caller's transaction (the caller commits).
+    """
+    ids = list(dict.fromkeys(drink_ids))
+    if not ids:
+        return {}
+    rows = {row.drink_id: row for row in session.exec(select(DrinkNeighbors).where(DrinkNeighbors.drink_id.in_(ids))).all()}
+    lists = {}
+    for drink_id in ids:
+        row = rows.get(drink_id)
+        if row is None or row.stale:
+            row = row or DrinkNeighbors(drink_id=drink_id)
+            row.neighbors, row.stale, row.updated_at = compute_neighbors(session, drink_id), False, datetime.utcnow()
+            session.add(row)
+        lists[drink_id] = row.neighbors or []
+    return lists
+
+
+def also_drunk(drink_id: int, limit: int = 10) -> List[dict]:
+    """Drinks most often logged by the users who logged drink_id"""
+    from .hydration import hydrate_drink_names
+    with Session(engine) as session:
+        neighbors = get_neighbors(session, [drink_id])[drink_id][:limit]
+        session.commit()
+    names = hydrate_drink_names([other for other, _ in neighbors])
+    return [
+        {"drink_id": other, "name": names[other], "similarity_score": score}
+        for other, score in neighbors if other in names
+    ]
+
+
+def recommend_for_user(user_id: int, k: int = 1) -> List[Tuple[int, float, int]]:
+    """
+    Score untried drinks by summing their similarity to the user's recent drinks.
+    Returns up to k (drink_id, score, strongest source drink_id), best first.
+    """
+    with Session(engine) as session:
+        history = session.exec(
+            select(UserDrinkStats.drink_id)
+            .where(UserDrinkStats.user_id == user_id, UserDrinkStats.drink_id.is_not(None))
+            .order_by(UserDrinkStats.last_at.desc())
+        ).all()
+        neighbors = get_neighbors(session, list(dict.fromkeys(history))[:RECENT_HISTORY])
+        session.commit()
+    tried = set(history)
+    scores: Dict[int, float] = {}
+    sources: Dict[int, Tuple[float, int]] = {}
+    for source, items in neighbors.items():
+        for other, score in items:
+            if other in tried:
+                continue
+            scores[other] = scores.get(other, 0.0) + score
+            if score > sources.get(other, (0.0, None))[0]:
+                sources[other] = (score, source)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+    return [(drink_id, score, sources[drink_id][1]) for drink_id, score in ranked]
+
+
+def cooccurrence_suggestions(user_id: int, k: int = 1) -> List[dict]:
+    """Up to k suggestion dicts (same shape as suggest_drink) from recommend_for_user"""
+    from .hydration import hydrate_drinks, hydrate_drink_names
+    from .ml_utils import suggestion_from_drink
+    ranked = recommend_for_user(user_id, k)
+    if not ranked:
+        return []
+    with Session(engine) as session:
+        drinks = hydrate_drinks(session, [drink_id for drink_id, _, _ in ranked])
+    sources = hydrate_drink_names(source for _, _, source in ranked)
+    suggestions = []
+    for rank, (drink_id, score, source) in enumerate(ranked):
+        if drink_id not in drinks:
+            continue
+        suggestion = suggestion_from_drink(drinks[drink_id], score, rank, k)
+        suggestion["reason"] = f"Often logged by people who also drink {sources.get(source, 'your recent drinks')}"
+        suggestions.append(suggestion)
+    return suggestions
+
+
+def rebuild_cooccurrence(verbose: bool = True) -> int:
+    """
+    Recompute the whole matrix from UserDrinkStats (binary user x drink matrix B, C = B^T B)
+    and every neighbor list. Returns the number of stored pairs.
+    """
+    from scipy import sparse
+    started = time.perf_counter()
+    with Session(engine) as session:
+        pairs = session.exec(
+            select(UserDrinkStats.user_id, UserDrinkStats.drink_id)
+            .where(UserDrinkStats.drink_id.is_not(None), UserDrinkStats.logs > 0)
+            .distinct()
+        ).all()
+        session.exec(delete(DrinkCooccurrence))
+        session.exec(delete(DrinkNeighbors))
+        stored = 0
+        if pairs:
+            user_ids, user_rows = np.unique(np.array([p[0] for p in pairs], dtype=np.int64), return_inverse=True)
+            drink_ids, drink_cols = np.unique(np.array([p[1] for p in pairs], dtype=np.int64), return_inverse=True)
+            users_by_drink = sparse.csr_matrix(
+                (np.ones(len(pairs), dtype=np.int64), (user_rows, drink_cols)), shape=(len(user_ids), len(drink_ids))
+            )
+            counts = (users_by_drink.T @ users_by_drink).tocoo()
+            rows = [
+                {"drink_id": int(drink_ids[a]), "other_drink_id": int(drink_ids[b]), "users": int(n)}
+                for a, b, n in zip(counts.row, counts.col, counts.data)
+            ]
+            for start in range(0, len(rows), WRITE_BATCH):
+                session.execute(sqlite_insert(DrinkCooccurrence), rows[start:start + WRITE_BATCH])
+            stored = len(rows)
+
+            # Normalize to cosine and keep the top-N per drink
+            counts = counts.tocsr()
+            own = counts.diagonal().astype(np.float64)
+            neighbor_rows = []
+            for a in range(counts.shape[0]):
+                start, end = counts.indptr[a], counts.indptr[a + 1]
+                cols, users = counts.indices[start:end], counts.data[start:end]
+                keep = (cols != a) & (users >= COOCCURRENCE_MIN_USERS)
+                cols, users = cols[keep], users[keep]
+                scores = users / np.sqrt(own[a] * own[cols])
+                order = np.lexsort((drink_ids[cols], -scores))[:COOCCURRENCE_TOP_N]
+                neighbor_rows.append(DrinkNeighbors(
+                    drink_id=int(drink_ids[a]),
+                    neighbors=[[int(drink_ids[cols[i]]), float(scores[i])] for i in order]
+                ))
+            session.add_all(neighbor_rows)
+        session.commit()
+    if verbose:
+        print(f"Rebuilt drink co-occurrence ({stored} pairs from {len(pairs)} user-drink pairs) in {time.perf_counter() - started:.2f}s")
+    return stored
+
+
+def backfill_cooccurrence() -> int:
+    """Migration: build the matrix once for logs recorded before it existed"""
+    if get_metadata_value(COOCCURRENCE_BACKFILL_KEY):
+        return 0
+    stored = rebuild_cooccurrence()
+    set_metadata_value(COOCCURRENCE_BACKFILL_KEY, "1")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Item-item drink co-occurrence model")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the matrix and all neighbor lists from UserDrinkStats")
+    parser.add_argument("--drink", type=int, help="Print the neighbors of one drink id")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_cooccurrence()
+    if args.drink is not None:
+        for item in also_drunk(args.drink):
+            print(f"{item['similarity_score']:.3f}  {item['name']} ({item['drink_id']})")
+
+
+if __name__ == "__main__":
+    main()
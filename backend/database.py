@@ -2,13 +2,66 @@ import os
 import json
 from datetime import datetime, timedelta
 from sqlmodel import SQLModel, create_engine, Session, select
-from .models import User, Drink, UserDrinkLog, DatabaseMetadata
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from .models import User, Drink, UserDrinkLog, DatabaseMetadata, Ingredient, IngredientAlias, DrinkIngredient
 from rapidfuzz import process, fuzz
 import time
+from contextlib import contextmanager
+from sqlalchemy import event
 
 DATABASE_URL = "sqlite:///./database.db"
 engine = create_engine(DATABASE_URL, echo=True)
 
+# Async engine for the FastAPI routers (aiosqlite driver, same database file)
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./database.db"
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=True)
+
+# DatabaseMetadata key bumped on every drink catalog change (see bump_catalog_version)
+CATALOG_VERSION_KEY = "catalog_version"
+
+@contextmanager
+def count_statements(bind=None):
+    """
+    Record the SQL statements executed on an engine inside the block, e.g. to assert
+    how many round trips a workflow makes:
+
+        with count_statements() as statements:
+            ...
+        assert len(statements) == 6
+    """
+    bind = bind if bind is not None else engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+def add_missing_columns() -> int:
+    """
+    Lightweight migration: add model columns that are missing from existing tables.
+    create_all() only creates new tables, so new nullable columns are added here.
+    Returns the number of columns added.
+    """
+    added = 0
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table.name}")'))}
+            if not existing:
+                continue
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                    print(f"Added column {table.name}.{column.name}")
+                    added += 1
+    return added
+
 def get_metadata_value(key: str, default: str = None) -> str:
     """Get a metadata value from the database"""
     with Session(engine) as session:
@@ -27,6 +80,38 @@ def set_metadata_value(key: str, value: str):
             session.add(metadata)
         session.commit()
 
+def get_catalog_version() -> int:
+    """Get the drink catalog version shared by all processes using this database"""
+    value = get_metadata_value(CATALOG_VERSION_KEY, "0")
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+async def get_catalog_version_async(session) -> int:
+    """get_catalog_version on an AsyncSession (read in the caller's transaction)"""
+    value = (await session.exec(select(DatabaseMetadata.value).where(DatabaseMetadata.key == CATALOG_VERSION_KEY))).first()
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+def bump_catalog_version(session) -> int:
+    """
+    Increment the catalog version inside the caller's transaction, so the new
+    version becomes visible to other processes together with the drink changes.
+    Returns the new version.
+    """
+    result = session.execute(
+        text("UPDATE databasemetadata SET value = CAST(value AS INTEGER) + 1, updated_at = :now WHERE key = :key"),
+        {"now": datetime.utcnow(), "key": CATALOG_VERSION_KEY}
+    )
+    if result.rowcount == 0:
+        session.add(DatabaseMetadata(key=CATALOG_VERSION_KEY, value="1"))
+        session.flush()
+        return 1
+    return int(session.exec(select(DatabaseMetadata.value).where(DatabaseMetadata.key == CATALOG_VERSION_KEY)).one())
+
 def fuzzy_drink_exists(session, name: str, threshold: int = 70):
     drinks = session.exec(select(Drink)).all()
     db_names = []
@@ -44,28 +129,33 @@ def drink_exists_by_cocktail_db_id(session, cocktail_db_id: str):
     """Check if a drink exists by its CocktailDB ID"""
     return session.exec(select(Drink).where(Drink.cocktail_db_id == cocktail_db_id)).first()
 
-def populate_hardcoded_drinks():
-    """Populate database with hardcoded drinks from JSON file"""
+def populate_hardcoded_drinks() -> int:
+    """Populate database with hardcoded drinks from JSON file. Returns the number of drinks added."""
     path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "drinks_hardcoded.json")
     if not os.path.exists(path):
-        return
+        return 0
     
     with open(path, "r") as f:
         drinks = json.load(f)
     
+    from backend.ingredients import load_alias_map, sync_drink_ingredients
+
+    added = 0
     with Session(engine) as session:
+        alias_map = load_alias_map(session)
         for d in drinks:
             # Fuzzy match in local DB
             exists = fuzzy_drink_exists(session, d["name"])
             if not exists:
                 # Check CocktailDB API for this drink
                 from backend.cocktail_api import cocktail_api
-                from backend.ml_utils import compute_drink_weights
+                from backend.ml_utils import compute_drink_weights, compute_volume_weights
                 api_drink_data = cocktail_api.search_drink_by_name(d["name"])
                 if api_drink_data:
                     formatted_data = cocktail_api.format_drink_for_db(api_drink_data)
                     # Compute weights for the drink
                     weights = compute_drink_weights(formatted_data['ingredients_json'])
+                    volume_weights = compute_volume_weights(formatted_data['ingredients_json'], formatted_data['measures_json'])
                     # Preserve tags and image_url from hardcoded if present
                     tags = d.get('tags') if d.get('tags') else formatted_data.get('tags')
                     image_url = d.get('image_url') if d.get('image_url') else formatted_data.get('image_url')
@@ -80,11 +170,13 @@ def populate_hardcoded_drinks():
                         alcoholic=formatted_data['alcoholic'],
                         glass=formatted_data['glass'],
                         weights=weights,
+                        volume_weights=volume_weights,
                         tags=tags
                     )
                 else:
                     # Compute weights for hardcoded drink
                     weights = compute_drink_weights(d["ingredients_json"])
+                    volume_weights = compute_volume_weights(d["ingredients_json"], d.get("measures_json"))
                     drink = Drink(
                         name=d["name"],
                         ingredients_json=d["ingredients_json"],
@@ -96,20 +188,29 @@ def populate_hardcoded_drinks():
                         alcoholic=d.get("alcoholic"),
                         glass=d.get("glass"),
                         weights=weights,
+                        volume_weights=volume_weights,
                         tags=d.get('tags')
                     )
                 session.add(drink)
+                session.flush()
+                sync_drink_ingredients(session, drink, alias_map=alias_map)
+                added += 1
         session.commit()
+    return added
 
-def populate_from_cocktaildb_by_letter():
-    """Populate database with all cocktails from CocktailDB API by listing each letter"""
+def populate_from_cocktaildb_by_letter() -> int:
+    """Populate database with all cocktails from CocktailDB API by listing each letter. Returns the number of drinks added."""
     from backend.cocktail_api import cocktail_api
+    from backend.ingredients import load_alias_map, sync_drink_ingredients
     
     # Letters A-Z
     letters = [chr(i) for i in range(ord('A'), ord('Z') + 1)]
     
+    added = 0
     with Session(engine) as session:
+        alias_map = load_alias_map(session)
         for letter in letters:
+            letter_added = 0
             try:
                 print(f"Fetching cocktails starting with letter: {letter}")
                 response = cocktail_api.list_cocktails_by_first_letter(letter)
@@ -129,8 +230,9 @@ def populate_from_cocktaildb_by_letter():
                             formatted_data = cocktail_api.format_drink_for_db(drink_detail)
                             
                             # Compute weights for the drink
-                            from backend.ml_utils import compute_drink_weights
+                            from backend.ml_utils import compute_drink_weights, compute_volume_weights
                             weights = compute_drink_weights(formatted_data['ingredients_json'])
+                            volume_weights = compute_volume_weights(formatted_data['ingredients_json'], formatted_data['measures_json'])
                             
                             drink = Drink(
                                 name=formatted_data['name'],
@@ -142,22 +244,31 @@ def populate_from_cocktaildb_by_letter():
                                 category=formatted_data['category'],
                                 alcoholic=formatted_data['alcoholic'],
                                 glass=formatted_data['glass'],
-                                weights=weights
+                                weights=weights,
+                                volume_weights=volume_weights
                             )
                             session.add(drink)
+                            session.flush()
+                            sync_drink_ingredients(session, drink, alias_map=alias_map)
+                            letter_added += 1
                 
                 # Commit after each letter to avoid large transactions
                 session.commit()
+                added += letter_added
                 print(f"Added cocktails for letter: {letter}")
                 
             except Exception as e:
                 print(f"Error processing letter {letter}: {e}")
                 session.rollback()
+                # Aliases created in the failed batch were rolled back too
+                alias_map = load_alias_map(session)
                 continue
+    return added
 
-def update_latest_cocktails():
-    """Update database with latest cocktails from CocktailDB API"""
+def update_latest_cocktails() -> int:
+    """Update database with latest cocktails from CocktailDB API. Returns the number of drinks added."""
     from backend.cocktail_api import cocktail_api
+    from backend.ingredients import sync_drink_ingredients
     
     try:
         # Get latest cocktails
@@ -165,8 +276,9 @@ def update_latest_cocktails():
         
         if not response.get('drinks'):
             print("No latest cocktails found")
-            return
+            return 0
         
+        added = 0
         with Session(engine) as session:
             for drink_data in response['drinks']:
                 # Check if drink already exists by CocktailDB ID
@@ -174,7 +286,7 @@ def update_latest_cocktails():
                     existing = drink_exists_by_cocktail_db_id(session, drink_data['idDrink'])
                     if existing:
                         print(f"Drink {drink_data.get('strDrink', 'Unknown')} already exists, stopping update")
-                        return  # Stop when we hit an existing drink
+                        break  # Stop when we hit an existing drink (keeping the newer ones added so far)
                 
                 # Get full drink details
                 full_drink = cocktail_api.lookup_cocktail_by_id(drink_data['idDrink'])
@@ -183,8 +295,9 @@ def update_latest_cocktails():
                     formatted_data = cocktail_api.format_drink_for_db(drink_detail)
                     
                     # Compute weights for the drink
-                    from backend.ml_utils import compute_drink_weights
+                    from backend.ml_utils import compute_drink_weights, compute_volume_weights
                     weights = compute_drink_weights(formatted_data['ingredients_json'])
+                    volume_weights = compute_volume_weights(formatted_data['ingredients_json'], formatted_data['measures_json'])
                     
                     drink = Drink(
                         name=formatted_data['name'],
@@ -196,16 +309,22 @@ def update_latest_cocktails():
                         category=formatted_data['category'],
                         alcoholic=formatted_data['alcoholic'],
                         glass=formatted_data['glass'],
-                        weights=weights
+                        weights=weights,
+                        volume_weights=volume_weights
                     )
                     session.add(drink)
+                    session.flush()
+                    sync_drink_ingredients(session, drink)
+                    added += 1
                     print(f"Added new cocktail: {formatted_data['name']}")
             
             session.commit()
             print("Latest cocktails update completed")
+        return added
             
     except Exception as e:
         print(f"Error updating latest cocktails: {e}")
+        return 0
 
 def should_update_database() -> bool:
     """Check if database should be updated based on last update time"""
@@ -221,37 +340,68 @@ def should_update_database() -> bool:
     except:
         return True  # Invalid date, should update
 
-def update_database():
-    """Main function to update the database intelligently"""
+def update_database(sync_cocktaildb: bool = True):
+    """
+    Main function to update the database intelligently.
+    With sync_cocktaildb=False only migrations and snapshot seeding run (no network).
+    """
     print("Checking if database needs update...")
     
-    # First ensure tables exist
-    SQLModel.metadata.create_all(engine)
+    # First ensure tables exist; a new database gets incremental vacuum (backend/maintenance.py)
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM sqlite_master LIMIT 1").first() is None:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        SQLModel.metadata.create_all(conn)
+    # Drink rows or columns changed by this run; import_snapshot publishes its own change
+    changed = add_missing_columns()
+    from backend.search import ensure_fts_index
+    ensure_fts_index()
+    
+    with Session(engine) as session:
+        database_exists = session.exec(select(Drink.drink_id)).first() is not None
     
-    if should_update_database():
+    from backend.snapshot import DEFAULT_SNAPSHOT_PATH, import_snapshot
+    if not sync_cocktaildb:
+        if not database_exists and os.path.exists(DEFAULT_SNAPSHOT_PATH):
+            import_snapshot(DEFAULT_SNAPSHOT_PATH)
+    elif should_update_database():
         print("Database update needed, starting update process...")
         
-        # Check if database exists and has data
-        with Session(engine) as session:
-            drink_count = session.exec(select(Drink)).all()
-            database_exists = len(drink_count) > 0
-        
-        if not database_exists:
+        if not database_exists and os.path.exists(DEFAULT_SNAPSHOT_PATH):
+            print(f"Database is empty, seeding from snapshot {DEFAULT_SNAPSHOT_PATH}...")
+            # No network: the snapshot already holds the hardcoded and CocktailDB drinks
+            import_snapshot(DEFAULT_SNAPSHOT_PATH)
+        elif not database_exists:
             print("Database is empty, performing full population...")
             # Populate with hardcoded drinks first
-            populate_hardcoded_drinks()
+            changed += populate_hardcoded_drinks()
             # Then populate with all CocktailDB data
-            populate_from_cocktaildb_by_letter()
+            changed += populate_from_cocktaildb_by_letter()
         else:
             print("Database exists, checking for latest cocktails...")
             # Only add latest cocktails
-            update_latest_cocktails()
+            changed += update_latest_cocktails()
         
         # Update the last update timestamp
         set_metadata_value("last_cocktaildb_update", datetime.utcnow().isoformat())
         print("Database update completed")
     else:
         print("Database is up to date")
+    
+    # Migrate drinks created before the ingredient catalog existed
+    from backend.ingredients import backfill_drink_ingredients
+    from backend.reweight import backfill_volume_weights
+    from backend.cooccurrence import backfill_cooccurrence
+    changed += backfill_drink_ingredients()
+    changed += backfill_volume_weights()
+    backfill_cooccurrence()  # Co-occurrence is not part of the drink catalog indexes
+    
+    # Tell running API workers / bot processes to reload their in-memory indexes,
+    # only when something changed: a reload rebuilds FAISS, pantry and autocomplete
+    if changed:
+        with Session(engine) as session:
+            bump_catalog_version(session)
+            session.commit()
 
 def create_db_and_tables():
     """Create database tables and populate with initial data"""
@@ -0,0 +1,264 @@
+"""
+Offline near-duplicate detection for the drink catalog.
+Candidate pairs come from two cheap blocking passes, then get scored exactly:
+- names: rare character trigrams as block keys, rapidfuzz cdist inside each block
+  (workers=-1, so scoring runs on every core)
+- ingredients: MinHash signatures over canonical ingredient ids (chunked across a
+  process pool) with LSH banding
+Pairs above --min-score are clustered (union-find) into merge proposals that remap
+UserDrinkLog.drink_id onto one kept drink:
+
+    python -m backend.dedupe --output proposals.json
+    python -m backend.dedupe --apply proposals.json [--delete-merged]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from sqlalchemy import func, update
+from sqlmodel import Session, select, delete
+from .models import Drink, DrinkIngredient, UserDrinkLog, UserDrinkStats, UserDrinkLogRollup
+from .database import engine, bump_catalog_version
+from .cooccurrence import rebuild_cooccurrence
+
+NAME_CUTOFF = 75  # Minimum token_sort_ratio for a name candidate
+BLOCK_KEYS_PER_NAME = 3  # Rarest trigrams used as block keys
+MAX_BLOCK_SIZE = 5000  # Larger blocks carry no signal and are skipped
+NUM_PERMUTATIONS = 128
+SIGNATURE_CHUNK = 10000  # Drinks per MinHash worker task
+LSH_BANDS = 32  # 32 bands x 4 rows: pairs with Jaccard >~ 0.45 usually collide
+MAX_BUCKET_SIZE = 200
+MIN_SCORE = 0.8
+NAME_WEIGHT = 0.6  # score = 0.6 * name similarity + 0.4 * ingredient Jaccard
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_drink_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", " ", (name or "").lower()).strip()
+
+
+def load_catalog(session):
+    """Return (drink_ids, names, cocktail_db flags, ingredient sets)"""
+    rows = session.exec(select(Drink.drink_id, Drink.name, Drink.cocktail_db_id).order_by(Drink.drink_id)).all()
+    ingredient_sets: Dict[int, Set[int]] = defaultdict(set)
+    for drink_id, ingredient_id in session.exec(select(DrinkIngredient.drink_id, DrinkIngredient.ingredient_id)).all():
+        ingredient_sets[drink_id].add(ingredient_id)
+    drink_ids = [r[0] for r in rows]
+    names = [normalize_drink_name(r[1]) for r in rows]
+    from_cocktaildb = [bool(r[2]) for r in rows]
+    return drink_ids, names, from_cocktaildb, [ingredient_sets.get(i, set()) for i in drink_ids]
+
+
+def _trigrams(name: str) -> Set[str]:
+    padded = f"  {name} "
+    return {padded[k:k + 3] for k in range(len(padded) - 2)} if name else set()
+
+
+def name_candidates(names: List[str], cutoff: int = NAME_CUTOFF) -> Dict[Tuple[int, int], float]:
+    """Candidate pairs (i, j), i < j, with their name similarity (0-100), via trigram blocking"""
+    grams = [_trigrams(name) for name in names]
+    frequency = Counter(g for gs in grams for g in gs)
+    blocks: Dict[str, List[int]] = defaultdict(list)
+    for i, gs in enumerate(grams):
+        for gram in sorted(gs, key=lambda g: (frequency[g], g))[:BLOCK_KEYS_PER_NAME]:
+            blocks[gram].append(i)
+
+    pairs: Dict[Tuple[int, int], float] = {}
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        block_names = [names[i] for i in members]
+        scores = cdist(block_names, block_names, scorer=fuzz.token_sort_ratio, score_cutoff=cutoff, workers=-1, dtype=np.uint8)
+        rows, cols = np.nonzero(np.triu(scores, k=1))
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            i, j = sorted((members[r], members[c]))
+            pairs[(i, j)] = float(scores[r, c])
+    return pairs
+
+
+def _hash_coefficients(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _signature_chunk(args) -> np.ndarray:
+    """MinHash signatures for one chunk of ingredient sets (runs in a worker process)"""
+    ingredient_sets, num_perm, seed = args
+    a, b = _hash_coefficients(num_perm, seed)
+    lengths = np.array([len(s) for s in ingredient_sets], dtype=np.int64)
+    signatures = np.full((len(ingredient_sets), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return signatures
+    flat = np.fromiter((x for s in ingredient_sets for x in sorted(s)), dtype=np.uint64, count=int(lengths.sum()))
+    # a*x + b wraps mod 2^64 before the mod p; still a well-mixed hash family for small ids
+    hashed = (np.outer(flat, a) + b) % np.uint64(_MERSENNE_PRIME)
+    starts = np.r_[0, np.cumsum(lengths)[:-1]][nonempty]
+    signatures[nonempty] = np.minimum.reduceat(hashed, starts, axis=0)
+    return signatures
+
+
+def minhash_signatures(ingredient_sets: List[Set[int]], num_perm: int = NUM_PERMUTATIONS, seed: int = 1, workers: Optional[int] = None) -> np.ndarray:
+    """MinHash signatures (n_drinks x num_perm), computed in chunks across a process pool"""
+    chunks = [(ingredient_sets[i:i + SIGNATURE_CHUNK], num_perm, seed) for i in range(0, len(ingredient_sets), SIGNATURE_CHUNK)]
+    if len(chunks) <= 1:
+        return _signature_chunk(chunks[0]) if chunks else np.empty((0, num_perm), dtype=np.uint64)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return np.vstack(list(pool.map(_signature_chunk, chunks)))
+
+
+def ingredient_candidates(signatures: np.ndarray, ingredient_sets: List[Set[int]], bands: int = LSH_BANDS) -> Set[Tuple[int, int]]:
+    """Candidate pairs sharing at least one LSH band bucket"""
+    num_perm = signatures.shape[1]
+    rows_per_band = num_perm // bands
+    has_ingredients = np.array([bool(s) for s in ingredient_sets])
+    pairs: Set[Tuple[int, int]] = set()
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        _, bucket = np.unique(chunk, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind="stable")
+        boundaries = np.flatnonzero(np.diff(bucket[order])) + 1
+        for group in np.split(order, boundaries):
+            if 2 <= len(group) <= MAX_BUCKET_SIZE and has_ingredients[group[0]]:
+                members = sorted(group.tolist())
+                pairs.update((members[x], members[y]) for x in range(len(members)) for y in range(x + 1, len(members)))
+    return pairs
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicates(min_score: float = MIN_SCORE, verbose: bool = True) -> List[dict]:
+    """Run both blocking passes, score candidates and cluster them into merge proposals"""
+    started = time.perf_counter()
+    with Session(engine) as session:
+        drink_ids, names, from_cocktaildb, ingredient_sets = load_catalog(session)
+        log_counts = dict(session.exec(
+            select(UserDrinkLog.drink_id, func.count()).where(UserDrinkLog.drink_id.is_not(None)).group_by(UserDrinkLog.drink_id)
+        ).all())
+
+    by_name = name_candidates(names)
+    by_ingredients = ingredient_candidates(minhash_signatures(ingredient_sets), ingredient_sets)
+    candidates = set(by_name) | by_ingredients
+
+    scored = []
+    for i, j in candidates:
+        name_score = by_name.get((i, j))
+        if name_score is None:
+            name_score = fuzz.token_sort_ratio(names[i], names[j])
+        ingredient_score = jaccard(ingredient_sets[i], ingredient_sets[j])
+        score = NAME_WEIGHT * name_score / 100.0 + (1 - NAME_WEIGHT) * ingredient_score
+        if score >= min_score:
+            scored.append((i, j, score, name_score, ingredient_score))
+
+    # Union-find so chains of duplicates collapse into one proposal
+    parent = list(range(len(drink_ids)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, *_ in scored:
+        parent[find(i)] = find(j)
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i, j, *_ in scored:
+        for x in (i, j):
+            if x not in clusters[find(x)]:
+                clusters[find(x)].append(x)
+    pair_scores = defaultdict(list)
+    for i, j, score, name_score, ingredient_score in scored:
+        pair_scores[find(i)].append({
+            "drink_ids": [drink_ids[i], drink_ids[j]],
+            "score": round(score, 3),
+            "name_similarity": round(name_score, 1),
+            "ingredient_jaccard": round(ingredient_score, 3)
+        })
+
+    proposals = []
+    for root, members in clusters.items():
+        # Keep the CocktailDB drink if any, then the most-logged, then the oldest
+        keep = min(members, key=lambda x: (not from_cocktaildb[x], -log_counts.get(drink_ids[x], 0), drink_ids[x]))
+        merge = sorted(x for x in members if x != keep)
+        proposals.append({
+            "keep_id": drink_ids[keep],
+            "keep_name": names[keep],
+            "merge_ids": [drink_ids[x] for x in merge],
+            "merge_names": [names[x] for x in merge],
+            "logs_to_remap": sum(log_counts.get(drink_ids[x], 0) for x in merge),
+            "pairs": sorted(pair_scores[root], key=lambda p: -p["score"])
+        })
+    proposals.sort(key=lambda p: -max(pair["score"] for pair in p["pairs"]))
+
+    if verbose:
+        print(f"{len(drink_ids)} drinks, {len(by_name)} name candidates, {len(by_ingredients)} ingredient candidates, "
+              f"{len(scored)} pairs >= {min_score}, {len(proposals)} proposals in {time.perf_counter() - started:.2f}s")
+    return proposals
+
+
+def apply_proposals(proposals: List[dict], delete_merged: bool = False) -> int:
+    """
+    Remap UserDrinkLog.drink_id (and UserDrinkStats / UserDrinkLogRollup drink_id) from merged drinks onto the kept drink,
+    then rebuild the co-occurrence matrix so the kept drink's pair counts absorb the merged ones.
+    Optionally delete the merged drinks. Returns the number of logs remapped.
+    """
+    remapped = 0
+    with Session(engine) as session:
+        for proposal in proposals:
+            keep_id, merge_ids = proposal["keep_id"], proposal["merge_ids"]
+            if not merge_ids:
+                continue
+            result = session.execute(update(UserDrinkLog).where(UserDrinkLog.drink_id.in_(merge_ids)).values(drink_id=keep_id))
+            remapped += result.rowcount
+            session.execute(update(UserDrinkStats).where(UserDrinkStats.drink_id.in_(merge_ids)).values(drink_id=keep_id))
+            session.execute(update(UserDrinkLogRollup).where(UserDrinkLogRollup.drink_id.in_(merge_ids)).values(drink_id=keep_id))
+            if delete_merged:
+                session.exec(delete(DrinkIngredient).where(DrinkIngredient.drink_id.in_(merge_ids)))
+                session.exec(delete(Drink).where(Drink.drink_id.in_(merge_ids)))
+        bump_catalog_version(session)
+        session.commit()
+    if any(proposal["merge_ids"] for proposal in proposals):
+        # Users of several merged drinks count once for the kept drink, so pair counts can't just be summed
+        rebuild_cooccurrence(verbose=False)
+    print(f"Remapped {remapped} logs across {len(proposals)} proposals")
+    return remapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and merge near-duplicate drinks")
+    parser.add_argument("--min-score", type=float, default=MIN_SCORE)
+    parser.add_argument("--output", help="Write merge proposals as JSON")
+    parser.add_argument("--apply", help="Apply merge proposals from a JSON file")
+    parser.add_argument("--delete-merged", action="store_true", help="Delete merged drinks after remapping logs")
+    args = parser.parse_args()
+
+    if args.apply:
+        with open(args.apply) as f:
+            apply_proposals(json.load(f), delete_merged=args.delete_merged)
+        return
+    proposals = find_duplicates(min_score=args.min_score)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(proposals, f, indent=2)
+    else:
+        for proposal in proposals:
+            print(f"keep {proposal['keep_id']} '{proposal['keep_name']}' <- {list(zip(proposal['merge_ids'], proposal['merge_names']))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Offline evaluation of suggestion strategies by replaying UserDrinkLog.
+Logs are split in time: everything before the cutoff (the --test-fraction most recent
+logs come after it) is history, and the drinks a user first logs after the cutoff are
+what a good suggestion would have predicted. For each strategy, every evaluated user's
+history is replayed (prefs EMA with --decay, co-occurrence counts, ALS factors), the
+k best untried drinks are taken, and the report shows side by side:
+
+    recall@k     share of the user's new drinks that were suggested
+    ndcg@k       same, rewarding hits near the top
+    coverage     share of the catalog suggested to anyone
+    latency      amortized ms per query when scoring everyone in batches, and
+                 p50/p95 ms of single-user queries through the same code
+
+    python -m backend.evaluation --k 10 --save before.json
+    python -m backend.evaluation --k 10 --decay 0.7 --compare before.json
+    python -m backend.evaluation --recompute-weights   # score with the current compute_*_weights code
+
+Scoring is matrix math over all users at once (sparse prefs x drink weights,
+interaction matrices), so a full replay runs in seconds. Add a strategy by putting a
+factory in STRATEGIES: it receives the ReplayData and returns a function mapping an
+array of user rows to a (users x drinks) score matrix.
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, Optional
+import numpy as np
+from sqlmodel import Session, select
+from .models import Drink, UserDrinkLog, UserDrinkLogRollup
+from .database import engine
+from .loadtest import percentile
+
+FETCH_BATCH = 50000
+SCORE_BATCH = 2000
+LATENCY_SAMPLES = 200
+DEFAULT_STRATEGIES = ("popular", "knn", "knn-equal", "cooccurrence", "collaborative")
+
+
+class ReplayData:
+    """Logs split at the cutoff, encoded against the catalog's drink rows"""
+
+    def __init__(self, test_fraction: float = 0.2, decay: float = 0.8, recompute_weights: bool = False,
+                 max_users: Optional[int] = None, seed: int = 0):
+        from scipy import sparse
+        from .columnar_catalog import attach_catalog
+        self.catalog = attach_catalog()
+        self.decay = decay
+        self.drink_count = len(self.catalog)
+        row_of = {int(drink_id): row for row, drink_id in enumerate(self.catalog.drink_ids)}
+
+        users, rows, quantities, times = self._stream_logs(row_of)
+        self.log_count = len(users)
+        self.cutoff = float(np.quantile(times, 1.0 - test_fraction)) if len(times) else 0.0
+        train = times < self.cutoff
+        self.user_ids, user_rows = np.unique(users, return_inverse=True)
+        shape = (len(self.user_ids), self.drink_count)
+        # History: summed quantity per (user, drink) before the cutoff
+        self.history = sparse.csr_matrix((quantities[train], (user_rows[train], rows[train])), shape=shape)
+        self.history.sum_duplicates()
+        self.history.data[self.history.data <= 0] = 1e-6  # Logged is logged, even with quantity 0
+        tried = self.history.copy()
+        tried.data[:] = 1
+        self.tried = tried
+        # Truth: drinks first logged after the cutoff
+        later = sparse.csr_matrix((np.ones(int((~train).sum())), (user_rows[~train], rows[~train])), shape=shape)
+        later.sum_duplicates()
+        later.data[:] = 1
+        later = later - later.multiply(tried)
+        later.eliminate_zeros()
+        self.truth = later.tocsr()
+
+        has_history = np.diff(self.tried.indptr) > 0
+        has_truth = np.diff(self.truth.indptr) > 0
+        self.eval_rows = np.flatnonzero(has_history & has_truth)
+        if max_users and len(self.eval_rows) > max_users:
+            rng = np.random.default_rng(seed)
+            self.eval_rows = np.sort(rng.choice(self.eval_rows, max_users, replace=False))
+
+        self._train_users, self._train_rows = user_rows[train], rows[train]
+        self._order = np.lexsort((times[train], self._train_users))
+        self.drink_matrices = self._drink_matrices(recompute_weights)
+        self.weighted = np.asarray(self.catalog.weighted, dtype=bool)
+
+    @staticmethod
+    def _stream_logs(row_of: Dict[int, int]):
+        query = (
+            select(UserDrinkLog.user_id, UserDrinkLog.drink_id, UserDrinkLog.quantity, UserDrinkLog.timestamp)
+            .where(UserDrinkLog.drink_id.is_not(None))
+            .execution_options(yield_per=FETCH_BATCH)
+        )
+        # Logs past the retention window are history as one row per rollup, at its last log
+        rollups = (
+            select(UserDrinkLogRollup.user_id, UserDrinkLogRollup.drink_id, UserDrinkLogRollup.quantity, UserDrinkLogRollup.last_at)
+            .where(UserDrinkLogRollup.drink_id.is_not(None))
+            .execution_options(yield_per=FETCH_BATCH)
+        )
+        users, rows, quantities, times = [], [], [], []
+        with Session(engine) as session:
+            for partition in (p for q in (query, rollups) for p in session.execute(q).partitions()):
+                for user_id, drink_id, quantity, timestamp in partition:
+                    row = row_of.get(drink_id)
+                    if row is not None:
+                        users.append(user_id)
+                        rows.append(row)
+                        quantities.append(1.0 if quantity is None else quantity)
+                        times.append(timestamp.timestamp() if timestamp else 0.0)
+        return (np.array(users, dtype=np.int64), np.array(rows, dtype=np.int64),
+                np.array(quantities, dtype=np.float64), np.array(times, dtype=np.float64))
+
+    def _drink_matrices(self, recompute: bool) -> Dict[str, object]:
+        """Drink x ingredient weight matrices: from the catalog, or from the current weighting code"""
+        from scipy import sparse
+        catalog = self.catalog
+        bound = catalog.ingredient_bound
+        if not recompute:
+            return {
+                name: sparse.csr_matrix((np.asarray(values, dtype=np.float64), catalog.ingredient_ids, catalog.indptr), shape=(self.drink_count, bound))
+                for name, values in (("volume", catalog.volume_weights), ("equal", catalog.weights))
+            }
+        from .ingredients import load_alias_map, canonical_weight_vector
+        from .ml_utils import compute_drink_weights, compute_volume_weights
+        with Session(engine) as session:
+            alias_map = load_alias_map(session)
+            drinks = dict((d[0], d[1:]) for d in session.exec(select(Drink.drink_id, Drink.ingredients_json, Drink.measures_json)).all())
+        matrices = {}
+        for name, compute in (("volume", compute_volume_weights), ("equal", lambda ingredients, _: compute_drink_weights(ingredients))):
+            rows, cols, values = [], [], []
+            for row, drink_id in enumerate(catalog.drink_ids):
+                ingredients, measures = drinks.get(int(drink_id), ([], []))
+                vector = canonical_weight_vector(compute(ingredients or [], measures) or {}, alias_map)
+                for ingredient_id, weight in vector.items():
+                    if ingredient_id < bound:
+                        rows.append(row)
+                        cols.append(ingredient_id)
+                        values.append(weight)
+            matrices[name] = sparse.csr_matrix((values, (rows, cols)), shape=(self.drink_count, bound))
+        return matrices
+
+    def replay_prefs(self):
+        """
+        User x ingredient-id prefs after replaying each user's history through the l1 EMA
+        (prefs_rebuild.replay_l1), mapped onto ingredient ids like canonical_weight_vector
+        """
+        from scipy import sparse
+        from .prefs_rebuild import load_drink_ingredients, replay_l1
+        from .ingredients import load_alias_map, normalize_ingredient_name
+        with Session(engine) as session:
+            drink_row, indptr, codes, names = load_drink_ingredients(session)
+            alias_map = load_alias_map(session)
+        # prefs_rebuild encodes drinks in its own row order; translate from catalog rows
+        catalog_to_prefs = np.array([drink_row.get(int(d), -1) for d in self.catalog.drink_ids], dtype=np.int64)
+        users = self._train_users[self._order]
+        rows = catalog_to_prefs[self._train_rows[self._order]]
+        keep = rows >= 0
+        pref_users, pref_codes, weights = replay_l1(users[keep], rows[keep], indptr, codes, self.decay)
+        code_to_id = np.array([alias_map.get(normalize_ingredient_name(name), -1) for name in names], dtype=np.int64)
+        ids = code_to_id[pref_codes] if len(pref_codes) else np.array([], dtype=np.int64)
+        mapped = ids >= 0
+        user_rows = np.searchsorted(self.user_ids, pref_users[mapped])
+        return sparse.csr_matrix(
+            (weights[mapped], (user_rows, ids[mapped])),
+            shape=(len(self.user_ids), self.catalog.ingredient_bound)
+        )
+
+
+def _popular(data: ReplayData) -> Callable:
+    # Offline stand-in for CocktailDB's popular list: drinks logged by the most users before the cutoff
+    counts = np.asarray(data.history.getnnz(axis=0), dtype=np.float64)
+    return lambda rows: np.broadcast_to(counts, (len(rows), data.drink_count)).copy()
+
+
+def _knn(weights: str) -> Callable:
+    def factory(data: ReplayData) -> Callable:
+        prefs = data.replay_prefs()
+        drinks = data.drink_matrices[weights]
+        drink_norms = np.sqrt(np.asarray(drinks.multiply(drinks).sum(axis=1)).ravel())
+        user_norms = np.sqrt(np.asarray(prefs.multiply(prefs).sum(axis=1)).ravel())
+        drinks_t = drinks.T.tocsc()
+
+        def score(rows: np.ndarray) -> np.ndarray:
+            dots = (prefs[rows] @ drinks_t).toarray()
+            denominator = user_norms[rows, None] * drink_norms[None, :]
+            similarity = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+            # suggest_drink only ranks drinks that have weights
+            similarity[:, ~data.weighted] = -np.inf
+            return similarity
+        return score
+    return factory
+
+
+def _cooccurrence(data: ReplayData) -> Callable:
+    from .cooccurrence import COOCCURRENCE_TOP_N, COOCCURRENCE_MIN_USERS
+    tried = data.tried.astype(np.float64)
+    counts = (tried.T @ tried).toarray()
+    own = np.diag(counts).copy()
+    denominator = np.sqrt(own[:, None] * own[None, :])
+    similarity = np.divide(counts, denominator, out=np.zeros_like(counts), where=denominator > 0)
+    np.fill_diagonal(similarity, 0.0)
+    similarity[counts < COOCCURRENCE_MIN_USERS] = 0.0
+    # Keep each drink's precomputed top-N neighbors only, as served from DrinkNeighbors
+    if similarity.shape[1] > COOCCURRENCE_TOP_N:
+        cut = np.partition(similarity, -COOCCURRENCE_TOP_N, axis=1)[:, -COOCCURRENCE_TOP_N][:, None]
+        similarity[similarity < cut] = 0.0
+    return lambda rows: np.asarray(tried[rows] @ similarity)
+
+
+def _collaborative(data: ReplayData) -> Callable:
+    from .factorization import train_als
+    user_factors, drink_factors = train_als(data.history)
+    return lambda rows: user_factors[rows] @ drink_factors.T
+
+
+STRATEGIES: Dict[str, Callable] = {
+    "popular": _popular,
+    "knn": _knn("volume"),
+    "knn-equal": _knn("equal"),
+    "cooccurrence": _cooccurrence,
+    "collaborative": _collaborative,
+}
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k best scores per row, best first"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def evaluate_strategy(data: ReplayData, name: str, k: int = 10) -> dict:
+    """Fit one strategy on the history and score every evaluated user"""
+    started = time.perf_counter()
+    score = STRATEGIES[name](data)
+    fit_seconds = time.perf_counter() - started
+
+    rows = data.eval_rows
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    recall_sum = ndcg_sum = 0.0
+    suggested = np.zeros(data.drink_count, dtype=bool)
+    started = time.perf_counter()
+    for start in range(0, len(rows), SCORE_BATCH):
+        batch = rows[start:start + SCORE_BATCH]
+        scores = np.array(score(batch), dtype=np.float64)
+        # Every strategy skips drinks the user already logged
+        tried = data.tried[batch]
+        scores[np.repeat(np.arange(len(batch)), np.diff(tried.indptr)), tried.indices] = -np.inf
+        top = _top_k(scores, k)
+        valid = np.isfinite(np.take_along_axis(scores, top, axis=1))
+        truth = data.truth[batch]
+        hits = (np.take_along_axis(truth.toarray(), top, axis=1) > 0) & valid
+        truth_counts = np.diff(truth.indptr)
+        recall_sum += float((hits.sum(axis=1) / truth_counts).sum())
+        ideal = np.cumsum(discounts)[np.minimum(truth_counts, k) - 1]
+        ndcg_sum += float(((hits * discounts).sum(axis=1) / ideal).sum())
+        suggested[top[valid]] = True
+    batch_seconds = time.perf_counter() - started
+
+    samples = rows[:LATENCY_SAMPLES]
+    single = []
+    for row in samples:
+        tick = time.perf_counter()
+        _top_k(np.array(score(np.array([row])), dtype=np.float64), k)
+        single.append(time.perf_counter() - tick)
+    single.sort()
+    users = max(len(rows), 1)
+    return {
+        "strategy": name,
+        "users": len(rows),
+        f"recall@{k}": recall_sum / users,
+        f"ndcg@{k}": ndcg_sum / users,
+        "coverage": float(suggested.sum()) / max(data.drink_count, 1),
+        "fit_s": fit_seconds,
+        "batch_ms_per_query": batch_seconds / users * 1000,
+        "p50_ms": percentile(single, 50) * 1000,
+        "p95_ms": percentile(single, 95) * 1000,
+    }
+
+
+def run_evaluation(strategies=DEFAULT_STRATEGIES, k: int = 10, test_fraction: float = 0.2, decay: float = 0.8,
+                   recompute_weights: bool = False, max_users: Optional[int] = None, verbose: bool = True) -> dict:
+    """Replay logs once and evaluate every strategy on the same split. Returns the report."""
+    started = time.perf_counter()
+    data = ReplayData(test_fraction, decay, recompute_weights, max_users)
+    if verbose:
+        print(f"Replaying {data.log_count} logs: {len(data.user_ids)} users, {len(data.eval_rows)} with new drinks after the cutoff "
+              f"({time.perf_counter() - started:.2f}s)")
+    results = [evaluate_strategy(data, name, k) for name in strategies]
+    return {
+        "k": k,
+        "test_fraction": test_fraction,
+        "decay": decay,
+        "recompute_weights": recompute_weights,
+        "logs": data.log_count,
+        "users": len(data.eval_rows),
+        "elapsed_s": time.perf_counter() - started,
+        "strategies": results,
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    k = report["k"]
+    columns = [f"recall@{k}", f"ndcg@{k}", "coverage", "batch_ms_per_query", "p50_ms", "p95_ms"]
+    print(f"{'strategy':<16}" + "".join(f"{c:>20}" for c in columns))
+    previous = {r["strategy"]: r for r in (baseline or {}).get("strategies", [])}
+    for result in report["strategies"]:
+        cells = []
+        for column in columns:
+            cell = f"{result[column]:.4f}"
+            if result["strategy"] in previous and column in previous[result["strategy"]]:
+                cell += f" ({result[column] - previous[result['strategy']][column]:+.4f})"
+            cells.append(f"{cell:>20}")
+        print(f"{result['strategy']:<16}" + "".join(cells))
+    print(f"{report['users']} users, {report['logs']} logs, {report['elapsed_s']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay UserDrinkLog and compare suggestion strategies")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="Most recent share of logs held out")
+    parser.add_argument("--decay", type=float, default=0.8, help="Prefs EMA decay used in the replay")
+    parser.add_argument("--strategies", default=",".join(DEFAULT_STRATEGIES), help=f"Comma-separated: {', '.join(STRATEGIES)}")
+    parser.add_argument("--recompute-weights", action="store_true", help="Weight drinks with the current compute_*_weights code instead of stored weights")
+    parser.add_argument("--max-users", type=int, help="Evaluate a random sample of users")
+    parser.add_argument("--save", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Show differences against a saved report")
+    args = parser.parse_args()
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)}")
+    report = run_evaluation(strategies, args.k, args.test_fraction, args.decay, args.recompute_weights, args.max_users)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
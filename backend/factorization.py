@@ -0,0 +1,268 @@
+"""
+Offline implicit-feedback matrix factorization (ALS) over UserDrinkLog.
+Every log counts as evidence the user likes the drink, weighted by its quantity:
+r_ud = summed quantity, confidence c_ud = 1 + alpha * log1p(r_ud). Alternating least
+squares (Hu, Koren & Volinsky) fits user and drink factors so that x_u . y_d ~ 1 for
+logged drinks, with each solve done by a few conjugate-gradient steps batched over
+all users (or drinks) at once in sparse matrix products, so there is no per-user loop.
+
+    python -m backend.factorization train [--factors 32 --iterations 15]
+    python -m backend.factorization recommend USER_ID [-k 5]
+
+Training streams logs in batches and writes ALS_MODEL_PATH (npz: ids and factor
+matrices) atomically. Serving scores a user's row against every drink factor (one
+matrix-vector product); users not in the model fall back to suggest_drink.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, List, Tuple
+import numpy as np
+from sqlmodel import Session, select
+from .models import UserDrinkLog, UserDrinkLogRollup
+from .database import engine
+
+ALS_MODEL_PATH = os.getenv("ALS_MODEL_PATH", os.path.join("model_factors", "als.npz"))
+ALS_FACTORS = int(os.getenv("ALS_FACTORS", "32"))
+ALS_ITERATIONS = int(os.getenv("ALS_ITERATIONS", "15"))
+ALS_REGULARIZATION = float(os.getenv("ALS_REGULARIZATION", "0.05"))
+ALS_ALPHA = float(os.getenv("ALS_ALPHA", "40"))
+CG_STEPS = 3
+FETCH_BATCH = 50000
+# Seconds between checks for a newly trained model file
+MODEL_CHECK_SECONDS = 2.0
+
+
+def stream_interactions(session) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stream (user_id, drink_id, quantity) into int/float arrays, FETCH_BATCH rows at a time.
+    Logs past the retention window come from their rollups (already summed).
+    """
+    queries = [
+        select(UserDrinkLog.user_id, UserDrinkLog.drink_id, UserDrinkLog.quantity).where(UserDrinkLog.drink_id.is_not(None)),
+        select(UserDrinkLogRollup.user_id, UserDrinkLogRollup.drink_id, UserDrinkLogRollup.quantity).where(UserDrinkLogRollup.drink_id.is_not(None)),
+    ]
+    users, drinks, quantities = [], [], []
+    for query in queries:
+        for partition in session.execute(query.execution_options(yield_per=FETCH_BATCH)).partitions():
+            users.append(np.fromiter((row[0] for row in partition), dtype=np.int64, count=len(partition)))
+            drinks.append(np.fromiter((row[1] for row in partition), dtype=np.int64, count=len(partition)))
+            quantities.append(np.fromiter((1.0 if row[2] is None else row[2] for row in partition), dtype=np.float64, count=len(partition)))
+    if not users:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+    return np.concatenate(users), np.concatenate(drinks), np.concatenate(quantities)
+
+
+def interaction_matrix(user_ids: np.ndarray, drink_ids: np.ndarray, quantities: np.ndarray):
+    """
+    Sum quantities into a user x drink CSR matrix.
+    Returns (matrix, user id per row, drink id per column); non-positive totals are dropped.
+    """
+    from scipy import sparse
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    drinks, drink_cols = np.unique(drink_ids, return_inverse=True)
+    matrix = sparse.csr_matrix((quantities, (user_rows, drink_cols)), shape=(len(users), len(drinks)))
+    matrix.data[matrix.data < 0] = 0
+    matrix.eliminate_zeros()
+    return matrix, users, drinks
+
+
+def _cg_solve(confidence, fixed: np.ndarray, current: np.ndarray, regularization: float, steps: int = CG_STEPS) -> np.ndarray:
+    """
+    A few conjugate-gradient steps on every row's normal equations at once:
+    (Y^T Y + Y^T (C_u - I) Y + reg I) x_u = Y^T C_u p_u, with p_u = 1 on logged drinks.
+    confidence is CSR (rows being solved x fixed rows) holding c_ud.
+    """
+    from scipy import sparse
+    gram = fixed.T @ fixed + regularization * np.eye(fixed.shape[1], dtype=fixed.dtype)
+    rows = np.repeat(np.arange(confidence.shape[0]), np.diff(confidence.indptr))
+    cols = confidence.indices
+    extra = (confidence.data - 1.0).astype(fixed.dtype)
+
+    def apply(vectors: np.ndarray) -> np.ndarray:
+        # Y^T (C_u - I) Y v for every row, through one sparse matrix with the same pattern
+        projected = np.einsum("ij,ij->i", fixed[cols], vectors[rows]) * extra
+        return vectors @ gram + sparse.csr_matrix((projected, cols, confidence.indptr), shape=confidence.shape) @ fixed
+
+    x = current.copy()
+    residual = confidence @ fixed - apply(x)
+    direction = residual.copy()
+    norm = np.einsum("ij,ij->i", residual, residual)
+    for _ in range(steps):
+        product = apply(direction)
+        denominator = np.einsum("ij,ij->i", direction, product)
+        step = np.divide(norm, denominator, out=np.zeros_like(norm), where=denominator > 1e-12)
+        x += step[:, None] * direction
+        residual -= step[:, None] * product
+        new_norm = np.einsum("ij,ij->i", residual, residual)
+        ratio = np.divide(new_norm, norm, out=np.zeros_like(norm), where=norm > 1e-12)
+        direction = residual + ratio[:, None] * direction
+        norm = new_norm
+    return x
+
+
+def train_als(matrix, factors: int = ALS_FACTORS, iterations: int = ALS_ITERATIONS,
+              regularization: float = ALS_REGULARIZATION, alpha: float = ALS_ALPHA,
+              seed: int = 0, verbose: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Fit (user_factors, drink_factors) to a user x drink quantity matrix"""
+    confidence = matrix.astype(np.float32)
+    confidence.data = 1.0 + alpha * np.log1p(confidence.data)
+    confidence_t = confidence.T.tocsr()
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((matrix.shape[0], factors)) * 0.01).astype(np.float32)
+    drink_factors = (rng.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+    for iteration in range(iterations):
+        started = time.perf_counter()
+        user_factors = _cg_solve(confidence, drink_factors, user_factors, regularization)
+        drink_factors = _cg_solve(confidence_t, user_factors, drink_factors, regularization)
+        if verbose:
+            print(f"ALS iteration {iteration + 1}/{iterations} in {time.perf_counter() - started:.2f}s")
+    return user_factors, drink_factors
+
+
+def save_model(path: str, user_ids: np.ndarray, user_factors: np.ndarray, drink_ids: np.ndarray,
+               drink_factors: np.ndarray, params: dict) -> None:
+    """Write the factor matrices to a temp file and swap it in, so readers never see a partial model"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, user_ids=user_ids, user_factors=user_factors, drink_ids=drink_ids,
+                 drink_factors=drink_factors, params=np.array(json.dumps(params)))
+    os.replace(tmp, path)
+
+
+def train_model(path: str = ALS_MODEL_PATH, factors: int = ALS_FACTORS, iterations: int = ALS_ITERATIONS,
+                regularization: float = ALS_REGULARIZATION, alpha: float = ALS_ALPHA, verbose: bool = True) -> dict:
+    """Stream all logs, fit ALS and write the model. Returns a summary."""
+    started = time.perf_counter()
+    with Session(engine) as session:
+        user_ids, drink_ids, quantities = stream_interactions(session)
+    loaded = time.perf_counter()
+    matrix, users, drinks = interaction_matrix(user_ids, drink_ids, quantities)
+    user_factors, drink_factors = train_als(matrix, factors, iterations, regularization, alpha, verbose=verbose)
+    params = {
+        "factors": factors, "iterations": iterations, "regularization": regularization, "alpha": alpha,
+        "logs": int(len(user_ids)), "trained_at": datetime.utcnow().isoformat()
+    }
+    save_model(path, users, user_factors, drinks, drink_factors, params)
+    summary = {
+        "logs": int(len(user_ids)),
+        "users": int(matrix.shape[0]),
+        "drinks": int(matrix.shape[1]),
+        "nonzeros": int(matrix.nnz),
+        "load_seconds": loaded - started,
+        "total_seconds": time.perf_counter() - started,
+        "path": path
+    }
+    if verbose:
+        print(summary)
+    return summary
+
+
+class FactorModel:
+    """Trained factors loaded from disk; reloads when the model file is replaced"""
+
+    def __init__(self, path: str = ALS_MODEL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = None  # (mtime, user_row, user_factors, drink_ids, drink_factors)
+        self._checked_at = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        if self._state is not None and now - self._checked_at < MODEL_CHECK_SECONDS:
+            return self._state
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._state = None
+                return None
+            if self._state is None or self._state[0] != mtime:
+                with np.load(self.path) as data:
+                    user_row = {int(user_id): row for row, user_id in enumerate(data["user_ids"])}
+                    self._state = (mtime, user_row, data["user_factors"], data["drink_ids"], data["drink_factors"])
+            return self._state
+
+    def available(self) -> bool:
+        return self._current() is not None
+
+    def has_user(self, user_id: int) -> bool:
+        state = self._current()
+        return state is not None and user_id in state[1]
+
+    def recommend(self, user_id: int, k: int = 1, exclude_ids: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Top-k (drink_id, score) by x_u . y_d, excluding exclude_ids; [] for cold users"""
+        state = self._current()
+        if state is None or user_id not in state[1]:
+            return []
+        _, user_row, user_factors, drink_ids, drink_factors = state
+        scores = drink_factors @ user_factors[user_row[user_id]]
+        excluded = np.isin(drink_ids, np.fromiter(exclude_ids, dtype=np.int64))
+        scores[excluded] = -np.inf
+        k = min(k, int((~excluded).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(drink_ids[i]), float(scores[i])) for i in top]
+
+
+# Global instance used by the bot
+factor_model = FactorModel()
+
+
+def collaborative_suggestions(user_id: int, k: int = 1) -> List[dict]:
+    """Up to k suggestion dicts (same shape as suggest_drink) from the trained factors; [] for cold users"""
+    from .hydration import hydrate_drinks
+    from .ml_utils import suggestion_from_drink
+    from .models import UserDrinkStats
+    if not factor_model.has_user(user_id):
+        return []
+    with Session(engine) as session:
+        tried = session.exec(
+            select(UserDrinkStats.drink_id).where(UserDrinkStats.user_id == user_id, UserDrinkStats.drink_id.is_not(None))
+        ).all()
+        hits = factor_model.recommend(user_id, k, exclude_ids=tried)
+        drinks = hydrate_drinks(session, [drink_id for drink_id, _ in hits])
+    suggestions = []
+    for rank, (drink_id, score) in enumerate(hits):
+        if drink_id in drinks:
+            suggestion = suggestion_from_drink(drinks[drink_id], score, rank, k)
+            suggestion["reason"] = f"Rank {rank+1} of top {k} among drinkers with similar tastes"
+            suggestions.append(suggestion)
+    return suggestions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Implicit-feedback ALS over UserDrinkLog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Fit user and drink factors and write them to ALS_MODEL_PATH")
+    train.add_argument("--factors", type=int, default=ALS_FACTORS)
+    train.add_argument("--iterations", type=int, default=ALS_ITERATIONS)
+    train.add_argument("--regularization", type=float, default=ALS_REGULARIZATION)
+    train.add_argument("--alpha", type=float, default=ALS_ALPHA)
+    train.add_argument("--output", default=ALS_MODEL_PATH)
+    recommend = commands.add_parser("recommend", help="Print a user's top drinks from the trained model")
+    recommend.add_argument("user_id", type=int)
+    recommend.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    if args.command == "train":
+        train_model(args.output, args.factors, args.iterations, args.regularization, args.alpha)
+    else:
+        suggestions = collaborative_suggestions(args.user_id, args.k)
+        if not suggestions:
+            print(f"User {args.user_id} is not in the model (cold user); the bot falls back to suggest_drink")
+        for suggestion in suggestions:
+            print(f"{suggestion['similarity_score']:.3f}  {suggestion['name']}")
+
+
+if __name__ == "__main__":
+    main()
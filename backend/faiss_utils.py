@@ -1,44 +1,53 @@
 import faiss
 import numpy as np
 from typing import List, Tuple, Optional
-from sqlmodel import Session, select
-from .models import Drink
-from .database import engine
+from .index_sync import VersionedIndex
 
-class DrinkVectorIndex:
+class DrinkVectorIndex(VersionedIndex):
     def __init__(self, dimension: int = 10):
+        super().__init__()
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)  # L2 distance for similarity
-        self.drink_ids = []  # Keep track of drink_id order in index
+        # (faiss index, drink_id order) swapped as one tuple so readers never see a half-built index
+        self._state = (faiss.IndexFlatL2(dimension), [])  # L2 distance for similarity
+
+    @property
+    def index(self):
+        return self._state[0]
+
+    @property
+    def drink_ids(self) -> List[int]:
+        return self._state[1]
         
     def add_drink_embedding(self, drink_id: int, embedding: List[float]) -> None:
         """Add a drink embedding to the FAISS index"""
+        index, drink_ids = self._state
         vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
-        self.index.add(vector)
-        self.drink_ids.append(drink_id)
+        index.add(vector)
+        drink_ids.append(drink_id)
         
     def search_similar_drinks(self, query_embedding: List[float], k: int = 5) -> List[Tuple[int, float]]:
         """Search for similar drinks using a query embedding"""
+        self.refresh_if_stale()
+        index, drink_ids = self._state
         query_vector = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
-        distances, indices = self.index.search(query_vector, k)
+        distances, indices = index.search(query_vector, k)
         
         results = []
         for i, distance in zip(indices[0], distances[0]):
-            if i < len(self.drink_ids):  # Valid index
-                drink_id = self.drink_ids[i]
+            if 0 <= i < len(drink_ids):  # Valid index
+                drink_id = drink_ids[i]
                 results.append((drink_id, float(distance)))
         return results
     
-    def rebuild_index_from_database(self) -> None:
-        """Rebuild the FAISS index from all drinks in the database"""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.drink_ids = []
-        
-        with Session(engine) as session:
-            drinks = session.exec(select(Drink)).all()
-            for drink in drinks:
-                if drink.embedding:
-                    self.add_drink_embedding(drink.drink_id, drink.embedding)
+    def _load_from_database(self) -> None:
+        """Build a fresh FAISS index from the shared columnar catalog and swap it in"""
+        from .columnar_catalog import attach_catalog
+        index = faiss.IndexFlatL2(self.dimension)
+        # Embeddings are computed once per catalog version when the catalog file is written
+        catalog = attach_catalog()
+        if len(catalog):
+            index.add(np.ascontiguousarray(catalog.embeddings, dtype=np.float32))
+        self._state = (index, catalog.drink_ids.tolist())
 
 # Global instance
 drink_index = DrinkVectorIndex()
@@ -77,21 +86,11 @@ def get_drink_embedding(drink_name: str, ingredients: Optional[List[str]] = None
     
     return embedding[:10]
 
-def update_drink_embedding(drink_id: int, drink_name: str, ingredients: Optional[List[str]] = None) -> List[float]:
-    """Update a drink's embedding and add to FAISS index"""
-    embedding = get_drink_embedding(drink_name, ingredients)
-    
-    # Update database
-    with Session(engine) as session:
-        drink = session.get(Drink, drink_id)
-        if drink:
-            drink.embedding = embedding
-            session.commit()
-    
-    # Update FAISS index
-    drink_index.add_drink_embedding(drink_id, embedding)
-    
-    return embedding
+def add_drink_to_vector_index(drink_id: int, drink_name: str, ingredients: Optional[List[str]] = None, catalog_version: Optional[int] = None) -> None:
+    """Update the local FAISS index in place; skip the reload if nothing else changed meanwhile"""
+    drink_index.add_drink_embedding(drink_id, get_drink_embedding(drink_name, ingredients))
+    if catalog_version is not None:
+        drink_index.mark_applied(catalog_version)
 
 def find_similar_drinks(drink_name: str, ingredients: Optional[List[str]] = None, k: int = 5) -> List[Tuple[int, float]]:
     """Find similar drinks using FAISS"""
@@ -0,0 +1,80 @@
+"""
+Batched hydration of ranked drink ids (FAISS hits, KNN suggestions, popular lists).
+Indexes return ids; turning them into response rows costs one IN (...) query over
+only the columns the response uses, or no query at all when the shared columnar
+catalog already has them, so response time does not grow with k.
+
+    rows = hydrate_drinks(session, [12, 7, 40], SUGGESTION_COLUMNS)   # {drink_id: row}
+    names = hydrate_drink_names([12, 7, 40])                            # {drink_id: name}
+"""
+
+from typing import Dict, Iterable, List, Sequence
+from sqlmodel import Session, select
+from .models import Drink
+from .database import engine
+
+# SQLite allows 999 bound parameters per statement
+HYDRATE_CHUNK = 500
+SUGGESTION_COLUMNS = (
+    "drink_id", "name", "category", "alcoholic", "glass", "instructions",
+    "ingredients_json", "measures_json", "image_url", "tags", "cocktail_db_id"
+)
+
+
+def _unique(values: Iterable) -> List:
+    return list(dict.fromkeys(v for v in values if v is not None))
+
+
+def _projection(columns: Sequence[str], key: str):
+    names = [key] + [c for c in columns if c != key]
+    return select(*(getattr(Drink, c) for c in names))
+
+
+def hydrate_drinks(session, drink_ids: Iterable[int], columns: Sequence[str] = SUGGESTION_COLUMNS) -> Dict[int, object]:
+    """
+    Fetch the given columns for many drinks in one IN (...) query per HYDRATE_CHUNK ids.
+    Returns {drink_id: row}; rows expose the columns as attributes. Missing ids are absent.
+    Works on a Session or, through AsyncSession.run_sync, an async one.
+    """
+    ids = _unique(drink_ids)
+    rows = {}
+    for start in range(0, len(ids), HYDRATE_CHUNK):
+        query = _projection(columns, "drink_id").where(Drink.drink_id.in_(ids[start:start + HYDRATE_CHUNK]))
+        rows.update((row.drink_id, row) for row in session.exec(query).all())
+    return rows
+
+
+def hydrate_drinks_by_cocktail_db_id(session, cocktail_db_ids: Iterable[str], columns: Sequence[str] = SUGGESTION_COLUMNS) -> Dict[str, object]:
+    """Like hydrate_drinks, keyed by TheCocktailDB idDrink"""
+    ids = _unique(cocktail_db_ids)
+    rows = {}
+    for start in range(0, len(ids), HYDRATE_CHUNK):
+        query = _projection(columns, "cocktail_db_id").where(Drink.cocktail_db_id.in_(ids[start:start + HYDRATE_CHUNK]))
+        rows.update((row.cocktail_db_id, row) for row in session.exec(query).all())
+    return rows
+
+
+def catalog_drink_names(drink_ids: Iterable[int]) -> Dict[int, str]:
+    """Names straight from the shared columnar catalog; ids it does not have yet are absent"""
+    from .columnar_catalog import shared_catalog
+    catalog = shared_catalog.get()
+    names = {}
+    for drink_id in _unique(drink_ids):
+        row = catalog.row_of(drink_id)
+        if row is not None:
+            names[drink_id] = catalog.names[row]
+    return names
+
+
+def hydrate_drink_names(drink_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    {drink_id: name} for many drinks: from the mapped catalog, plus one query for
+    drinks added since it was written (other indexes may already know about them)
+    """
+    ids = _unique(drink_ids)
+    names = catalog_drink_names(ids)
+    missing = [drink_id for drink_id in ids if drink_id not in names]
+    if missing:
+        with Session(engine) as session:
+            names.update((drink_id, row.name) for drink_id, row in hydrate_drinks(session, missing, ("name",)).items())
+    return names
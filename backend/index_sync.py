@@ -0,0 +1,65 @@
+"""
+Cross-process consistency for in-memory catalog indexes.
+Each API worker / bot process holds its own copy of indexes such as the FAISS
+drink index. Writers bump the catalog version in DatabaseMetadata in the same
+transaction as the drink change; readers poll that version at most every
+CATALOG_VERSION_CHECK_SECONDS and rebuild when it moves, so every process
+serves the same catalog within that bound.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+from .database import get_catalog_version
+
+VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "2.0"))
+
+
+class VersionedIndex(ABC):
+    """
+    Base class for indexes built from the drink catalog.
+    Subclasses implement _load_from_database() and swap their state in one assignment.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._last_check = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @abstractmethod
+    def _load_from_database(self) -> None:
+        """Build the index from the database and swap it in"""
+
+    def rebuild_index_from_database(self) -> None:
+        """Rebuild from the database and record the catalog version it reflects"""
+        with self._refresh_lock:
+            # Read the version first: a change committed mid-rebuild triggers another rebuild
+            version = get_catalog_version()
+            self._load_from_database()
+            self.version = version
+            self._last_check = time.monotonic()
+
+    def refresh_if_stale(self, force_check: bool = False) -> bool:
+        """
+        Rebuild if another process published a newer catalog version.
+        The version query runs at most once per VERSION_CHECK_INTERVAL.
+        Returns True if the index was rebuilt.
+        """
+        now = time.monotonic()
+        if self.version is not None and not force_check and now - self._last_check < VERSION_CHECK_INTERVAL:
+            return False
+        self._last_check = now
+        if get_catalog_version() == self.version:
+            return False
+        self.rebuild_index_from_database()
+        return True
+
+    def mark_applied(self, new_version: int) -> None:
+        """
+        Record that the change which produced new_version was already applied in place.
+        Only skips the rebuild when no other process changed the catalog in between.
+        """
+        if self.version is not None and new_version == self.version + 1:
+            self.version = new_version
@@ -0,0 +1,157 @@
+"""
+Ingredient catalog utilities.
+Maps free-form ingredient strings onto canonical Ingredient rows with integer ids
+and keeps the DrinkIngredient join table in sync with Drink.ingredients_json.
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional
+from sqlmodel import Session, select, delete
+from .models import Drink, Ingredient, IngredientAlias, DrinkIngredient
+from .database import engine, get_metadata_value, set_metadata_value
+
+# Known spelling variants and shorthand, keyed by normalized alias
+INGREDIENT_ALIASES = {
+    "grand mariner": "Grand Marnier",
+    "drambule": "Drambuie",
+    "lime juices": "Lime juice",
+    "oj": "Orange juice",
+    "coke": "Coca-Cola",
+    "menthe dark": "Creme de Menthe Dark",
+    "menthe light": "Creme de Menthe Light",
+    "cacao light": "Creme de Cacao Light",
+    "ryan's": "Ryan's Irish Cream",
+    "soco": "Southern Comfort",
+    "jaeger": "Jagermeister",
+}
+
+INGREDIENT_BACKFILL_KEY = "ingredient_catalog_backfilled"
+
+
+def normalize_ingredient_name(name: str) -> str:
+    """
+    Normalize an ingredient string for alias lookups.
+    Folds case, accents and curly quotes and drops parenthetical notes like "(splash)".
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace("’", "'").replace("‘", "'")
+    text = re.sub(r"\([^)]*\)", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().casefold()
+
+
+def load_alias_map(session) -> Dict[str, int]:
+    """Return a dict mapping normalized alias -> ingredient_id"""
+    rows = session.exec(select(IngredientAlias.alias, IngredientAlias.ingredient_id)).all()
+    return {alias: ingredient_id for alias, ingredient_id in rows}
+
+
+def resolve_ingredient_ids(session, names: List[str], create: bool = True, alias_map: Optional[Dict[str, int]] = None) -> List[Optional[int]]:
+    """
+    Resolve ingredient strings to canonical ingredient ids.
+    Unknown ingredients get a new Ingredient row (and alias) when create is True,
+    otherwise resolve to None. alias_map is updated in place when provided.
+    """
+    if alias_map is None:
+        alias_map = load_alias_map(session)
+    ids = []
+    for name in names or []:
+        alias = normalize_ingredient_name(name)
+        if not alias:
+            ids.append(None)
+            continue
+        ingredient_id = alias_map.get(alias)
+        if ingredient_id is None and create:
+            canonical = INGREDIENT_ALIASES.get(alias, name.strip())
+            canonical_key = normalize_ingredient_name(canonical)
+            ingredient_id = alias_map.get(canonical_key)
+            if ingredient_id is None:
+                ingredient = Ingredient(name=canonical, normalized_name=canonical_key)
+                session.add(ingredient)
+                session.flush()
+                ingredient_id = ingredient.ingredient_id
+                session.add(IngredientAlias(alias=canonical_key, ingredient_id=ingredient_id))
+                alias_map[canonical_key] = ingredient_id
+            if alias != canonical_key:
+                session.add(IngredientAlias(alias=alias, ingredient_id=ingredient_id))
+            alias_map[alias] = ingredient_id
+        ids.append(ingredient_id)
+    return ids
+
+
+def sync_drink_ingredients(session, drink: Drink, alias_map: Optional[Dict[str, int]] = None) -> List[int]:
+    """
+    Rewrite the DrinkIngredient rows for a drink from its ingredients_json/weights/volume_weights.
+    Variants that collapse onto the same ingredient are merged (weights summed).
+    The drink must already have a drink_id (flush the session first).
+    Returns the ordered list of distinct ingredient ids.
+    """
+    ingredients = drink.ingredients_json if isinstance(drink.ingredients_json, list) else []
+    measures = drink.measures_json if isinstance(drink.measures_json, list) else []
+    weights = drink.weights or {}
+    volume_weights = drink.volume_weights or {}
+    ids = resolve_ingredient_ids(session, ingredients, alias_map=alias_map)
+
+    session.exec(delete(DrinkIngredient).where(DrinkIngredient.drink_id == drink.drink_id))
+    rows: Dict[int, DrinkIngredient] = {}
+    for position, (name, ingredient_id) in enumerate(zip(ingredients, ids)):
+        if ingredient_id is None:
+            continue
+        weight = weights.get(name)
+        volume_weight = volume_weights.get(name)
+        if ingredient_id in rows:
+            row = rows[ingredient_id]
+            if weight is not None:
+                row.weight = (row.weight or 0.0) + weight
+            if volume_weight is not None:
+                row.volume_weight = (row.volume_weight or 0.0) + volume_weight
+            continue
+        rows[ingredient_id] = DrinkIngredient(
+            drink_id=drink.drink_id,
+            ingredient_id=ingredient_id,
+            position=position,
+            measure=measures[position] if position < len(measures) and measures[position] else None,
+            weight=weight,
+            volume_weight=volume_weight
+        )
+    for row in rows.values():
+        session.add(row)
+    return list(rows.keys())
+
+
+def canonical_weight_vector(weights: dict, alias_map: Dict[str, int]) -> Dict[int, float]:
+    """
+    Map a {ingredient_name: weight} dict (e.g. User.prefs) onto ingredient ids.
+    Names that are not in the catalog are dropped.
+    """
+    vector: Dict[int, float] = {}
+    for name, weight in (weights or {}).items():
+        ingredient_id = alias_map.get(normalize_ingredient_name(name))
+        if ingredient_id is not None:
+            vector[ingredient_id] = vector.get(ingredient_id, 0.0) + float(weight)
+    return vector
+
+
+def backfill_drink_ingredients(force: bool = False) -> int:
+    """
+    Migration: populate Ingredient/DrinkIngredient rows for every existing drink.
+    Runs once (tracked in DatabaseMetadata) unless force is True.
+    Returns the number of drinks processed.
+    """
+    if not force and get_metadata_value(INGREDIENT_BACKFILL_KEY):
+        return 0
+    processed = 0
+    with Session(engine) as session:
+        alias_map = load_alias_map(session)
+        drinks = session.exec(select(Drink)).all()
+        for drink in drinks:
+            sync_drink_ingredients(session, drink, alias_map=alias_map)
+            processed += 1
+        session.commit()
+    set_metadata_value(INGREDIENT_BACKFILL_KEY, "1")
+    print(f"Backfilled ingredient catalog for {processed} drinks")
+    return processed
@@ -0,0 +1,139 @@
+"""
+HTTP load test for the FastAPI backend.
+Drives a running server with a mix of catalog, search, similarity and log
+requests from many concurrent clients and reports requests/s and tail latency
+per route. Save a run with --save and pass it to --compare on a later run to
+see the two side by side (e.g. the sync routers vs the async routers):
+
+    uvicorn backend.main:app --workers 1
+    python -m backend.loadtest --label sync --save sync.json      # on the sync build
+    python -m backend.loadtest --label async --compare sync.json  # on the async build
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+import httpx
+
+DRINK_NAMES = ["Margarita", "Mojito", "Old Fashioned", "Negroni", "Cosmopolitan", "Daiquiri", "Manhattan", "Kamikaze"]
+SEARCH_TERMS = ["mint stirred", "lime shaken", "shot", "cream", "orange bitters"]
+PANTRIES = ["vodka, lime juice, triple sec", "gin, tonic water, lime", "rum, coca-cola, lime"]
+
+# (route label, weight, request path factory)
+SCENARIOS = [
+    ("GET /drinks/{id}", 30, lambda: f"/drinks/{random.randint(1, 600)}"),
+    ("GET /drinks/similar/{name}", 20, lambda: f"/drinks/similar/{random.choice(DRINK_NAMES)}?k=5"),
+    ("GET /drinks/search", 15, lambda: f"/drinks/search?q={random.choice(SEARCH_TERMS)}"),
+    ("GET /drinks/makeable", 10, lambda: f"/drinks/makeable?ingredients={random.choice(PANTRIES)}"),
+    ("GET /users/", 10, lambda: "/users/"),
+    ("GET /logs/", 15, lambda: f"/logs/?user_id={random.randint(1, 50)}"),
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> dict:
+    """Build the report: throughput and p50/p95/p99 (ms) per route and overall"""
+    report = {"elapsed_s": elapsed, "routes": {}}
+    everything = []
+    for label, values in latencies.items():
+        values = sorted(values)
+        everything.extend(values)
+        report["routes"][label] = {
+            "requests": len(values),
+            "errors": errors.get(label, 0),
+            "rps": len(values) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    everything.sort()
+    report["total"] = {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": len(everything) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p95_ms": percentile(everything, 95) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+    }
+    return report
+
+
+async def run_load(base_url: str, concurrency: int, duration: float, seed: int = 0) -> dict:
+    random.seed(seed)
+    labels = [s[0] for s in SCENARIOS]
+    weights = [s[1] for s in SCENARIOS]
+    factories = {s[0]: s[2] for s in SCENARIOS}
+    latencies: Dict[str, List[float]] = {label: [] for label in labels}
+    errors: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                label = random.choices(labels, weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await client.get(factories[label]())
+                    ok = response.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                latencies[label].append(time.perf_counter() - started)
+                if not ok:
+                    errors[label] = errors.get(label, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed)
+
+
+def print_report(report: dict, label: str, baseline: dict = None) -> None:
+    header = f"{'route':32} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}"
+    if baseline:
+        header += f"   {'base req/s':>10} {'base p99':>9}"
+    print(f"== {label} ==")
+    print(header)
+    rows = list(report["routes"].items()) + [("TOTAL", report["total"])]
+    for route, stats in rows:
+        line = f"{route:32} {stats['rps']:9.1f} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['errors']:5d}"
+        if baseline:
+            base = baseline["total"] if route == "TOTAL" else baseline["routes"].get(route)
+            if base:
+                line += f"   {base['rps']:10.1f} {base['p99_ms']:9.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the OnTheRocks API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--save", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to show side by side")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.url, args.concurrency, args.duration))
+    report["label"] = args.label
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, args.label, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
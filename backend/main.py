@@ -1,13 +1,26 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from .routers import users, drinks, logs
 from .faiss_utils import drink_index
+from .pantry_index import pantry_index
+from .autocomplete import autocomplete_index
+from .responses import ORJSONResponse, NotModified, not_modified_handler, GZIP_MINIMUM_SIZE, GZIP_COMPRESS_LEVEL
+from .profiling import ProfilingMiddleware
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+# Outermost, so profiles include compression; a pass-through unless PROFILE_MODE is set
+app.add_middleware(ProfilingMiddleware)
+app.add_exception_handler(NotModified, not_modified_handler)
 
 @app.on_event("startup")
 def on_startup():
     # Rebuild FAISS index from existing drinks in database
     drink_index.rebuild_index_from_database()
+    # Build ingredient bitsets for /drinks/makeable
+    pantry_index.rebuild_index_from_database()
+    # Sorted name keys for /drinks/autocomplete
+    autocomplete_index.rebuild_index_from_database()
 
 app.include_router(users.router)
 app.include_router(drinks.router)
@@ -0,0 +1,275 @@
+"""
+Database maintenance: log retention, planner statistics and space reclamation.
+
+- Retention: UserDrinkLog rows older than LOG_RETENTION_DAYS are folded into
+  UserDrinkLogRollup (one row per user, drink name and local day, with counts,
+  quantities and first/last timestamps) and deleted. The aggregates, tried-sets,
+  drink history counts and offline jobs read the rollups alongside the raw logs, so
+  nothing a user sees changes.
+- ANALYZE with a bounded analysis_limit, so the planner's statistics follow the data.
+- Incremental vacuum: free pages go back to the filesystem in small steps. New
+  databases are created with auto_vacuum=INCREMENTAL; older ones need one full
+  VACUUM (--enable-incremental-vacuum) while the bot is stopped.
+
+Every step runs in short transactions of ROLLUP_BATCH logs / VACUUM_STEP_PAGES pages,
+so the bot keeps logging while it runs. The bot schedules it every
+MAINTENANCE_INTERVAL_HOURS on an executor thread; it can also run from cron:
+
+    python -m backend.maintenance [--retention-days 365] [--dry-run] [--save report.json]
+
+The report shows logs rolled up, database size and free pages before and after,
+and the query plans of PLAN_QUERIES whose plan changed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select, delete
+from .models import User, UserDrinkLog, UserDrinkLogRollup
+from .database import engine, get_metadata_value, set_metadata_value
+from .stats import local_day
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "365"))  # 0 keeps raw logs forever
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))  # 0 disables the bot's schedule
+ROLLUP_BATCH = 2000
+VACUUM_STEP_PAGES = 1000
+ANALYSIS_LIMIT = 1000
+MAINTENANCE_LAST_RUN_KEY = "maintenance_last_run"
+
+# Hot queries whose plans are compared before and after maintenance
+PLAN_QUERIES = {
+    "user log history": "SELECT name FROM userdrinklog WHERE user_id = 1",
+    "logs by drink": "SELECT id FROM userdrinklog WHERE drink_id = 1",
+    "logs past retention": "SELECT id FROM userdrinklog WHERE timestamp < '2000-01-01' ORDER BY id LIMIT 1",
+    "user favorites": "SELECT name, logs FROM userdrinkstats WHERE user_id = 1 ORDER BY logs DESC, last_at DESC LIMIT 5",
+    "user daily buckets": "SELECT day, logs, quantity FROM userdailystats WHERE user_id = 1 ORDER BY day",
+    "drink neighbors": "SELECT other_drink_id, users FROM drinkcooccurrence WHERE drink_id = 1",
+    "drink ingredients": "SELECT ingredient_id, weight FROM drinkingredient WHERE drink_id = 1",
+}
+
+
+def database_size() -> Dict[str, int]:
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    path = engine.url.database
+    return {
+        "bytes": page_size * page_count,
+        "file_bytes": os.path.getsize(path) if path and os.path.exists(path) else 0,
+        "free_pages": freelist,
+        "page_size": page_size,
+    }
+
+
+def query_plans() -> Dict[str, List[str]]:
+    plans = {}
+    with engine.connect() as conn:
+        for label, sql in PLAN_QUERIES.items():
+            try:
+                plans[label] = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            except Exception as e:
+                plans[label] = [f"error: {e}"]
+    return plans
+
+
+def rollup_logs(retention_days: int = LOG_RETENTION_DAYS, batch: int = ROLLUP_BATCH, dry_run: bool = False) -> dict:
+    """
+    Fold logs older than retention_days into UserDrinkLogRollup and delete them,
+    batch logs per transaction. Returns counts of logs rolled up and transactions.
+    """
+    if retention_days <= 0:
+        return {"retention_days": retention_days, "logs_rolled_up": 0, "batches": 0}
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    if dry_run:
+        with Session(engine) as session:
+            pending = session.exec(select(func.count()).select_from(UserDrinkLog).where(UserDrinkLog.timestamp < cutoff)).one()
+        return {"retention_days": retention_days, "cutoff": cutoff.isoformat(), "logs_rolled_up": pending, "batches": 0, "dry_run": True}
+
+    rolled = batches = 0
+    while True:
+        with Session(engine) as session:
+            logs = session.exec(
+                select(UserDrinkLog).where(UserDrinkLog.timestamp < cutoff).order_by(UserDrinkLog.id).limit(batch)
+            ).all()
+            if not logs:
+                break
+            user_ids = {log.user_id for log in logs}
+            timezones = dict(session.exec(select(User.user_id, User.timezone).where(User.user_id.in_(user_ids))).all())
+            buckets: Dict[tuple, list] = {}
+            for log in logs:
+                timestamp = log.timestamp or cutoff
+                key = (log.user_id, log.name, local_day(timestamp, timezones.get(log.user_id)))
+                bucket = buckets.setdefault(key, [0, 0.0, log.drink_id, timestamp, timestamp])
+                bucket[0] += 1
+                bucket[1] += log.quantity if log.quantity is not None else 1.0
+                bucket[2] = bucket[2] if bucket[2] is not None else log.drink_id
+                bucket[3] = min(bucket[3], timestamp)
+                bucket[4] = max(bucket[4], timestamp)
+            stmt = sqlite_insert(UserDrinkLogRollup)
+            stmt = stmt.on_conflict_do_update(index_elements=["user_id", "name", "day"], set_={
+                "logs": UserDrinkLogRollup.logs + stmt.excluded.logs,
+                "quantity": UserDrinkLogRollup.quantity + stmt.excluded.quantity,
+                "drink_id": func.coalesce(stmt.excluded.drink_id, UserDrinkLogRollup.drink_id),
+                "first_at": func.min(UserDrinkLogRollup.first_at, stmt.excluded.first_at),
+                "last_at": func.max(UserDrinkLogRollup.last_at, stmt.excluded.last_at),
+            })
+            session.execute(stmt, [
+                {"user_id": user_id, "name": name, "day": day, "drink_id": drink_id, "logs": count,
+                 "quantity": quantity, "first_at": first_at, "last_at": last_at}
+                for (user_id, name, day), (count, quantity, drink_id, first_at, last_at) in buckets.items()
+            ])
+            session.exec(delete(UserDrinkLog).where(UserDrinkLog.id.in_([log.id for log in logs])))
+            session.commit()
+        rolled += len(logs)
+        batches += 1
+    return {"retention_days": retention_days, "cutoff": cutoff.isoformat(), "logs_rolled_up": rolled, "batches": batches}
+
+
+def analyze() -> float:
+    """Refresh planner statistics, sampling at most ANALYSIS_LIMIT rows per index. Returns seconds taken."""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    return time.perf_counter() - started
+
+
+def incremental_vacuum(step_pages: int = VACUUM_STEP_PAGES) -> dict:
+    """Return free pages to the filesystem step_pages at a time (needs auto_vacuum=INCREMENTAL)"""
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    if mode != 2:
+        return {"skipped": "auto_vacuum is not INCREMENTAL; run python -m backend.maintenance --enable-incremental-vacuum once"}
+    steps, previous = 0, None
+    while True:
+        with engine.connect() as conn:
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if not free or free == previous:
+                break
+            # The pragma frees one page per step: drain it on the raw DBAPI cursor
+            cursor = conn.connection.cursor()
+            cursor.execute(f"PRAGMA incremental_vacuum({step_pages})").fetchall()
+            cursor.close()
+            conn.commit()
+        previous = free
+        steps += 1
+    return {"steps": steps}
+
+
+def enable_incremental_vacuum() -> None:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (one full, blocking VACUUM)"""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    print(f"Enabled incremental vacuum in {time.perf_counter() - started:.2f}s")
+
+
+def run_maintenance(retention_days: int = LOG_RETENTION_DAYS, dry_run: bool = False, verbose: bool = True) -> dict:
+    """Rollup, ANALYZE and incremental vacuum, with before/after size and plan report"""
+    started = time.perf_counter()
+    size_before, plans_before = database_size(), query_plans()
+    report = {"started_at": datetime.utcnow().isoformat(), "rollup": rollup_logs(retention_days, dry_run=dry_run)}
+    if not dry_run:
+        report["analyze_s"] = analyze()
+        report["vacuum"] = incremental_vacuum()
+        set_metadata_value(MAINTENANCE_LAST_RUN_KEY, datetime.utcnow().isoformat())
+    size_after, plans_after = database_size(), query_plans()
+    report["size_before"], report["size_after"] = size_before, size_after
+    report["reclaimed_bytes"] = size_before["file_bytes"] - size_after["file_bytes"]
+    report["plan_changes"] = {
+        label: {"before": plans_before[label], "after": plans_after[label]}
+        for label in PLAN_QUERIES if plans_before[label] != plans_after[label]
+    }
+    report["plans"] = plans_after
+    report["elapsed_s"] = time.perf_counter() - started
+    if verbose:
+        print_report(report)
+    return report
+
+
+def print_report(report: dict) -> None:
+    rollup = report["rollup"]
+    action = "would roll up" if rollup.get("dry_run") else "rolled up"
+    print(f"Retention {rollup['retention_days']} days: {action} {rollup['logs_rolled_up']} logs in {rollup['batches']} transactions")
+    before, after = report["size_before"], report["size_after"]
+    print(f"Database {before['file_bytes'] / 1e6:.2f} MB -> {after['file_bytes'] / 1e6:.2f} MB "
+          f"(reclaimed {report['reclaimed_bytes'] / 1e6:.2f} MB; free pages {before['free_pages']} -> {after['free_pages']})")
+    if "skipped" in report.get("vacuum", {}):
+        print(f"Incremental vacuum skipped: {report['vacuum']['skipped']}")
+    for label, change in report["plan_changes"].items():
+        print(f"Plan changed for {label}:\n  before: {' | '.join(change['before'])}\n  after:  {' | '.join(change['after'])}")
+    print(f"Maintenance finished in {report['elapsed_s']:.2f}s")
+
+
+class MaintenanceScheduler:
+    """Runs run_maintenance on an executor thread every MAINTENANCE_INTERVAL_HOURS from the bot's event loop"""
+
+    def __init__(self, interval_hours: float = MAINTENANCE_INTERVAL_HOURS):
+        self.interval = interval_hours * 3600
+        self.last_report: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the schedule (idempotent; on_ready fires again after reconnects)"""
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _seconds_until_due(self) -> float:
+        last_run = get_metadata_value(MAINTENANCE_LAST_RUN_KEY)
+        if not last_run:
+            return 0.0
+        elapsed = (datetime.utcnow() - datetime.fromisoformat(last_run)).total_seconds()
+        return max(0.0, self.interval - elapsed)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # A restart does not rerun maintenance that ran recently
+            await asyncio.sleep(await loop.run_in_executor(None, self._seconds_until_due))
+            try:
+                self.last_report = await loop.run_in_executor(None, run_maintenance)
+            except Exception as e:
+                print(f"Database maintenance failed, will retry next interval: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instance used by the bot
+maintenance_scheduler = MaintenanceScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log retention rollup, ANALYZE and incremental vacuum")
+    parser.add_argument("--retention-days", type=int, default=LOG_RETENTION_DAYS, help="Roll up raw logs older than this (0 keeps all)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many logs would be rolled up")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true", help="One-time full VACUUM switching to auto_vacuum=INCREMENTAL (stop the bot first)")
+    parser.add_argument("--save", help="Write the report as JSON")
+    args = parser.parse_args()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+    report = run_maintenance(args.retention_days, dry_run=args.dry_run)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
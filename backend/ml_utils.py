@@ -1,14 +1,12 @@
 """
 Machine Learning utilities for drink recommendations and weight computations.
-Contains sklearn KNN functionality and weight computation logic.
+Contains KNN suggestion and weight computation logic.
 """
 
 import numpy as np
 from typing import Optional, Dict, Any
-from sqlmodel import Session, select
-from .models import User, Drink
+from sqlmodel import Session
 from .database import engine
-from sklearn.neighbors import NearestNeighbors
 import random
 
 
@@ -38,106 +36,124 @@ def compute_drink_weights(ingredients_json: list) -> dict:
     return normalized_weights
 
 
-def update_user_prefs(user_id: int, drink_ingredients: list, drink_measures: Optional[list] = None, decay: float = 0.8, norm: str = "l1"):
+def compute_volume_weights(ingredients_json: list, measures_json: Optional[list] = None) -> dict:
     """
-    Update the user's ingredient preference vector using binary presence (all ingredients equal weight).
-    - user_id: the user's ID
-    - drink_ingredients: list of clean ingredient names (from strIngredient fields)
-    - decay: lambda decay/memory factor (0 < decay < 1)
-    - norm: 'l1' or 'l2'
+    Compute measure-aware ingredient weights from measures_json.
+    Measures are parsed into millilitres (oz, cl, ml, tsp, dash, shot, ...); "parts" are
+    kept proportional when every measure is in parts and read as 1 oz otherwise.
+    Ingredients with unparseable measures ("Fill with", "1") get the median parsed volume.
+    Falls back to compute_drink_weights when no measure parses.
+    Returns a dict mapping ingredient names to L1-normalized weights.
     """
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.user_id == user_id)).first()
-        if not user:
-            return None
-        w_prev = user.prefs or {}
-        # drink_ingredients already contains clean ingredient names from strIngredient fields
-        ingredient_names = drink_ingredients
-        # Build full ingredient set
-        all_ingredients = set(w_prev.keys()) | set(ingredient_names)
-        all_ingredients = sorted(all_ingredients)
-        # Binary presence vector
-        z = np.array([1.0 if ing in ingredient_names else 0.0 for ing in all_ingredients], dtype=np.float32)
-        # Build w_prev vector
-        w_prev_vec = np.array([w_prev.get(ing, 0.0) for ing in all_ingredients], dtype=np.float32)
-        # Exponential moving average
-        w_raw = decay * w_prev_vec + (1 - decay) * z
-        # Normalize
-        if norm == "l1":
-            total = np.sum(w_raw)
-            if total == 0:
-                return w_prev  # avoid div by zero
-            w_new_vec = w_raw / total
-        else:  # l2
-            mag = np.sqrt(np.sum(w_raw ** 2))
-            if mag == 0:
-                return w_prev
-            w_new_vec = w_raw / mag
-        # Convert back to dict
-        w_new = {ing: float(w_new_vec[i]) for i, ing in enumerate(all_ingredients)}
-        user.prefs = w_new
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return w_new
-
-
-def suggest_drink(user_weights: dict, k: int = 1, logged_drinks: Optional[list] = None) -> Optional[list]:
+    from .utils import parse_measure_volume, PART_ML
+
+    if not ingredients_json:
+        return {}
+    measures = measures_json if isinstance(measures_json, list) else []
+    parsed = [parse_measure_volume(measures[i] if i < len(measures) else "") for i in range(len(ingredients_json))]
+    known = [(amount, is_part) for amount, is_part in parsed if amount]
+    if not known:
+        return compute_drink_weights(ingredients_json)
+    all_parts = all(is_part for _, is_part in known)
+    volumes = []
+    for amount, is_part in parsed:
+        if amount and is_part and not all_parts:
+            amount = amount * PART_ML
+        volumes.append(amount)
+    fallback = float(np.median([v for v in volumes if v]))
+    weights: dict = {}
+    for ingredient, volume in zip(ingredients_json, volumes):
+        weights[ingredient] = weights.get(ingredient, 0.0) + (volume or fallback)
+    total = sum(weights.values())
+    return {ingredient: weight / total for ingredient, weight in weights.items()}
+
+
+def apply_prefs_update(w_prev: dict, drink_ingredients: list, decay: float = 0.8, norm: str = "l1") -> dict:
+    """
+    One exponential-moving-average step of a preference vector (pure function).
+    - w_prev: current {ingredient: weight} dict
+    - drink_ingredients: list of clean ingredient names of the consumed drink
+    Returns the new normalized dict, or w_prev unchanged if the result would be all zeros.
     """
-    Suggest up to k drinks using sklearn KNN based on user preference weights, skipping already-logged drinks.
+    w_prev = w_prev or {}
+    # drink_ingredients already contains clean ingredient names from strIngredient fields
+    ingredient_names = drink_ingredients
+    # Build full ingredient set
+    all_ingredients = set(w_prev.keys()) | set(ingredient_names)
+    all_ingredients = sorted(all_ingredients)
+    # Binary presence vector
+    z = np.array([1.0 if ing in ingredient_names else 0.0 for ing in all_ingredients], dtype=np.float32)
+    # Build w_prev vector
+    w_prev_vec = np.array([w_prev.get(ing, 0.0) for ing in all_ingredients], dtype=np.float32)
+    # Exponential moving average
+    w_raw = decay * w_prev_vec + (1 - decay) * z
+    # Normalize
+    if norm == "l1":
+        total = np.sum(w_raw)
+        if total == 0:
+            return w_prev  # avoid div by zero
+        w_new_vec = w_raw / total
+    else:  # l2
+        mag = np.sqrt(np.sum(w_raw ** 2))
+        if mag == 0:
+            return w_prev
+        w_new_vec = w_raw / mag
+    # Convert back to dict
+    return {ing: float(w_new_vec[i]) for i, ing in enumerate(all_ingredients)}
+
+
+def replay_prefs_updates(w_prev: dict, ingredient_lists: list, decay: float = 0.8, norm: str = "l1") -> dict:
+    """Apply apply_prefs_update for each drink's ingredients, in the given (timestamp) order"""
+    w = w_prev or {}
+    for ingredients in ingredient_lists:
+        if ingredients:
+            w = apply_prefs_update(w, ingredients, decay=decay, norm=norm)
+    return w
+
+
+def suggest_drink(user_weights: dict, k: int = 1, logged_drinks: Optional[list] = None, use_volume_weights: bool = True) -> Optional[list]:
+    """
+    Suggest up to k drinks by cosine similarity (KNN) of user preference weights, skipping already-logged drinks.
     Args:
         user_weights: Dict mapping ingredient names to user preference weights
         k: Number of neighbors for KNN (default 1)
         logged_drinks: List of drink names to skip (already logged by user)
+        use_volume_weights: Use measure-aware drink weights where available (default True)
     Returns:
         List of up to k drink dicts, sorted by similarity (best first)
     """
-    if logged_drinks is None:
-        logged_drinks = []
-    # 1. Gather all drinks with weights, skipping logged
+    from .ingredients import load_alias_map, canonical_weight_vector
+    from .columnar_catalog import shared_catalog
+    # Score against the shared columnar catalog; only the k winners are hydrated.
+    # Measure-aware weights precomputed at ingest win over equal weights when present.
+    catalog = shared_catalog.get()
+    with Session(engine) as session:
+        user_vector = canonical_weight_vector(user_weights, load_alias_map(session))
+    return hydrate_suggestions(catalog.top_k(user_vector, k, use_volume_weights, logged_drinks or []), k)
+
+
+def suggestion_from_drink(drink, similarity: float, rank: int, k: int) -> dict:
+    """Suggestion dict returned by suggest_drink for one ranked drink (a Drink or a hydrated row)"""
+    return {
+        "name": drink.name,
+        "category": drink.category,
+        "alcoholic": drink.alcoholic,
+        "glass": drink.glass,
+        "instructions": drink.instructions,
+        "ingredients": drink.ingredients_json,
+        "measures": drink.measures_json,
+        "image_url": drink.image_url,
+        "similarity_score": similarity,
+        "reason": f"Rank {rank+1} of top {k} by ingredient profile",
+        "tags": drink.tags
+    }
+
+
+def hydrate_suggestions(hits: list, k: int) -> Optional[list]:
+    """Turn ranked (drink_id, similarity) pairs into suggestion dicts with one projected query"""
+    from .hydration import hydrate_drinks
+    if not hits:
+        return None
     with Session(engine) as session:
-        drinks = session.exec(select(Drink)).all()
-        drinks = [d for d in drinks if d.weights and isinstance(d.weights, dict) and len(d.weights) > 0 and d.name not in logged_drinks]
-        if not drinks:
-            return None
-        # 2. Build ingredient set
-        all_ingredients = set()
-        for d in drinks:
-            all_ingredients.update(d.weights.keys())
-        all_ingredients.update(user_weights.keys())
-        all_ingredients = sorted(all_ingredients)
-        ingredient_index = {ing: i for i, ing in enumerate(all_ingredients)}
-        # 3. Build drink matrix
-        drink_matrix = np.zeros((len(drinks), len(all_ingredients)), dtype=np.float32)
-        for i, d in enumerate(drinks):
-            for ing, w in d.weights.items():
-                if ing in ingredient_index:
-                    drink_matrix[i, ingredient_index[ing]] = w
-        # 4. Build user vector
-        user_vec = np.zeros((1, len(all_ingredients)), dtype=np.float32)
-        for ing, w in user_weights.items():
-            if ing in ingredient_index:
-                user_vec[0, ingredient_index[ing]] = w
-        # 5. KNN search
-        n_neighbors = min(k, len(drinks))
-        nbrs = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine')
-        nbrs.fit(drink_matrix)
-        distances, indices = nbrs.kneighbors(user_vec)
-        # 6. Collect top k drinks (sorted by similarity)
-        results = []
-        for rank, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            d = drinks[idx]
-            results.append({
-                "name": d.name,
-                "category": d.category,
-                "alcoholic": d.alcoholic,
-                "glass": d.glass,
-                "instructions": d.instructions,
-                "ingredients": d.ingredients_json,
-                "measures": d.measures_json,
-                "image_url": d.image_url,
-                "similarity_score": 1.0 - float(dist),
-                "reason": f"Rank {rank+1} of top {k} by ingredient profile",
-                "tags": d.tags
-            })
-        return results 
\ No newline at end of file
+        drinks = hydrate_drinks(session, [drink_id for drink_id, _ in hits])
+    return [suggestion_from_drink(drinks[drink_id], similarity, rank, k) for rank, (drink_id, similarity) in enumerate(hits) if drink_id in drinks] 
\ No newline at end of file
@@ -1,6 +1,6 @@
 from sqlmodel import SQLModel, Field, Relationship, Column
 from typing import Optional, List, Any
-from datetime import datetime
+from datetime import datetime, date
 import sqlalchemy as sa
 
 class User(SQLModel, table=True):
@@ -28,6 +28,7 @@ class Drink(SQLModel, table=True):
     last_updated: datetime = Field(default_factory=datetime.utcnow)  # Track when drink was last updated
     # Ingredient weights for KNN recommendations
     weights: Optional[dict] = Field(default=None, sa_column=Column(sa.JSON))  # {ingredient: normalized_weight, ...}
+    volume_weights: Optional[dict] = Field(default=None, sa_column=Column(sa.JSON))  # Same shape, weighted by parsed measure volume
     tags: Optional[list] = Field(default=None, sa_column=Column(sa.JSON))
     creator: Optional[User] = Relationship(back_populates="drinks")
     logs: List["UserDrinkLog"] = Relationship(back_populates="drink")
@@ -47,4 +48,60 @@ class DatabaseMetadata(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     key: str = Field(unique=True)  # e.g., "last_cocktaildb_update"
     value: str  # Store as string, can be parsed as needed
-    updated_at: datetime = Field(default_factory=datetime.utcnow) 
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow) 
+
+class Ingredient(SQLModel, table=True):
+    ingredient_id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)  # Canonical display name
+    normalized_name: str = Field(unique=True, index=True)  # Case/accent-folded lookup key
+
+class IngredientAlias(SQLModel, table=True):
+    alias: str = Field(primary_key=True)  # Normalized spelling variant, e.g. "grand mariner"
+    ingredient_id: int = Field(foreign_key="ingredient.ingredient_id", index=True)
+
+class DrinkIngredient(SQLModel, table=True):
+    drink_id: int = Field(foreign_key="drink.drink_id", primary_key=True)
+    ingredient_id: int = Field(foreign_key="ingredient.ingredient_id", primary_key=True, index=True)
+    position: int = 0  # Index into Drink.ingredients_json
+    measure: Optional[str] = None
+    weight: Optional[float] = None  # Same value as Drink.weights, keyed by ingredient id
+    volume_weight: Optional[float] = None  # Same value as Drink.volume_weights
+
+
+class UserDailyStats(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.user_id", primary_key=True)
+    day: date = Field(primary_key=True)  # Calendar day in the user's timezone
+    logs: int = 0  # Number of UserDrinkLog rows
+    quantity: float = 0.0  # Sum of quantities (missing quantity counts as 1)
+
+class UserDrinkStats(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.user_id", primary_key=True)
+    name: str = Field(primary_key=True)  # UserDrinkLog.name
+    drink_id: Optional[int] = Field(default=None, foreign_key="drink.drink_id")
+    logs: int = 0
+    quantity: float = 0.0
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+class UserDrinkLogRollup(SQLModel, table=True):
+    # UserDrinkLog rows past the retention window, folded per user, drink name and local day
+    user_id: int = Field(foreign_key="user.user_id", primary_key=True)
+    name: str = Field(primary_key=True)  # UserDrinkLog.name
+    day: date = Field(primary_key=True)  # Calendar day in the user's timezone at rollup time
+    drink_id: Optional[int] = Field(default=None, foreign_key="drink.drink_id")
+    logs: int = 0
+    quantity: float = 0.0
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+class DrinkCooccurrence(SQLModel, table=True):
+    # Sparse symmetric drink x drink matrix over users' distinct drinks (both (a, b) and (b, a) stored)
+    drink_id: int = Field(foreign_key="drink.drink_id", primary_key=True)
+    other_drink_id: int = Field(foreign_key="drink.drink_id", primary_key=True)
+    users: int = 0  # Users who logged both; on the diagonal, users who logged the drink
+
+class DrinkNeighbors(SQLModel, table=True):
+    drink_id: int = Field(foreign_key="drink.drink_id", primary_key=True)
+    neighbors: Optional[list] = Field(default=None, sa_column=Column(sa.JSON))  # [[other_drink_id, similarity], ...] best first
+    stale: bool = False  # Co-occurrence counts changed since the list was computed
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,192 @@
+import threading
+import numpy as np
+from typing import List, Tuple, Dict, Optional
+from sqlmodel import Session, select
+from .models import Ingredient
+from .database import engine
+from .ingredients import load_alias_map, normalize_ingredient_name
+from .index_sync import VersionedIndex
+
+# Number of set bits for every byte value, used to popcount packed masks
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(masks: np.ndarray) -> np.ndarray:
+    """Count set bits in each row of a uint64 mask matrix"""
+    if masks.size == 0:
+        return np.zeros(masks.shape[0], dtype=np.int64)
+    return _POPCOUNT_TABLE[masks.view(np.uint8)].reshape(masks.shape[0], -1).sum(axis=1)
+
+
+class _PantryState:
+    """Bitset arrays for one catalog version; replaced wholesale on rebuild"""
+
+    def __init__(self):
+        self.drink_ids: List[int] = []
+        self.drink_names: List[str] = []
+        self.drink_ingredients: List[List[int]] = []  # Ingredient columns per drink
+        self.ingredient_columns: Dict[int, int] = {}  # ingredient_id -> bit column
+        self.column_ingredients: List[int] = []  # bit column -> ingredient_id
+        self.drink_masks = np.zeros((0, 1), dtype=np.uint64)
+        self.ingredient_postings = np.zeros((0, 1), dtype=np.uint8)
+        self.dirty = False
+
+    def column(self, ingredient_id: int) -> int:
+        column = self.ingredient_columns.get(ingredient_id)
+        if column is None:
+            column = len(self.column_ingredients)
+            self.ingredient_columns[ingredient_id] = column
+            self.column_ingredients.append(ingredient_id)
+        return column
+
+    def add_drink(self, drink_id: int, name: str, ingredient_ids: List[int]) -> None:
+        self.drink_ids.append(drink_id)
+        self.drink_names.append(name)
+        self.drink_ingredients.append(sorted({self.column(i) for i in ingredient_ids}))
+        self.dirty = True
+
+    def build_arrays(self) -> None:
+        """Pack the per-drink ingredient lists into the bitset matrices"""
+        n_drinks = len(self.drink_ids)
+        n_words = max(1, (len(self.column_ingredients) + 63) // 64)
+        masks = np.zeros((n_drinks, n_words), dtype=np.uint64)
+        postings = np.zeros((len(self.column_ingredients), n_drinks), dtype=bool)
+        for row, columns in enumerate(self.drink_ingredients):
+            for column in columns:
+                masks[row, column // 64] |= np.uint64(1) << np.uint64(column % 64)
+                postings[column, row] = True
+        self.drink_masks = masks
+        self.ingredient_postings = np.packbits(postings, axis=1)
+        self.dirty = False
+
+
+class PantryIndex(VersionedIndex):
+    """
+    In-memory bitset index over the DrinkIngredient join table.
+    - drink_masks: one row per drink, bit j set when the drink uses ingredient column j
+    - ingredient_postings: one packed row per ingredient column, bit i set when drink i uses it
+    "Can I make it?" and "missing <= n" queries are AND/NOT/popcount over these arrays.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._state = _PantryState()
+        self.alias_map: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self.version is not None
+
+    def add_drink(self, drink_id: int, name: str, ingredient_ids: List[int]) -> None:
+        """Register a drink; arrays are repacked lazily on the next query"""
+        with self._pending_lock:
+            self._state.add_drink(drink_id, name, ingredient_ids)
+
+    def _load_from_database(self) -> None:
+        """Build a fresh bitset index from the shared columnar catalog and swap it in"""
+        from .columnar_catalog import attach_catalog
+        state = _PantryState()
+        catalog = attach_catalog()
+        with Session(engine) as session:
+            alias_map = load_alias_map(session)
+        names, indptr = catalog.names, catalog.indptr.tolist()
+        for row, drink_id in enumerate(catalog.drink_ids.tolist()):
+            if indptr[row + 1] > indptr[row]:
+                state.add_drink(drink_id, names[row], catalog.ingredients(row).tolist())
+        state.build_arrays()
+        self._state, self.alias_map = state, alias_map
+
+    def ensure_built(self) -> None:
+        if not self.built:
+            self.rebuild_index_from_database()
+        else:
+            self.refresh_if_stale()
+        if self._state.dirty:
+            with self._pending_lock:
+                if self._state.dirty:
+                    self._state.build_arrays()
+
+    def resolve_pantry(self, pantry: List[str]) -> Tuple[List[int], List[str]]:
+        """Map pantry strings to ingredient ids; returns (ingredient_ids, unknown_names)"""
+        if any(normalize_ingredient_name(name) not in self.alias_map for name in pantry):
+            # Ingredients may have been added since the last build
+            with Session(engine) as session:
+                self.alias_map = load_alias_map(session)
+        ingredient_ids, unknown = [], []
+        for name in pantry:
+            ingredient_id = self.alias_map.get(normalize_ingredient_name(name))
+            if ingredient_id is None:
+                unknown.append(name)
+            else:
+                ingredient_ids.append(ingredient_id)
+        return ingredient_ids, unknown
+
+    def search_makeable(self, pantry_ingredient_ids: List[int], max_missing: int = 1, limit: int = 20) -> List[Tuple[int, str, List[int], int]]:
+        """
+        Find drinks whose ingredients are covered by the pantry, allowing up to max_missing extras.
+        Returns (drink_id, name, missing_ingredient_ids, matched_count) tuples ranked by
+        fewest missing, then most pantry ingredients used.
+        """
+        self.ensure_built()
+        state = self._state
+        columns = sorted({state.ingredient_columns[i] for i in pantry_ingredient_ids if i in state.ingredient_columns})
+        n_drinks = state.drink_masks.shape[0]
+        if not columns or not n_drinks:
+            return []
+        # Candidate drinks use at least one pantry ingredient (OR of postings)
+        candidate_bits = np.bitwise_or.reduce(state.ingredient_postings[columns], axis=0)
+        candidates = np.flatnonzero(np.unpackbits(candidate_bits)[:n_drinks])
+        pantry_mask = np.zeros(state.drink_masks.shape[1], dtype=np.uint64)
+        for column in columns:
+            pantry_mask[column // 64] |= np.uint64(1) << np.uint64(column % 64)
+        masks = state.drink_masks[candidates]
+        missing_counts = _popcount_rows(masks & ~pantry_mask)
+        matched_counts = _popcount_rows(masks & pantry_mask)
+        keep = missing_counts <= max_missing
+        candidates, missing_counts, matched_counts = candidates[keep], missing_counts[keep], matched_counts[keep]
+        order = np.lexsort((-matched_counts, missing_counts))[:limit]
+        pantry_columns = set(columns)
+        results = []
+        for pos in order:
+            row = int(candidates[pos])
+            missing = [state.column_ingredients[c] for c in state.drink_ingredients[row] if c not in pantry_columns]
+            results.append((state.drink_ids[row], state.drink_names[row], missing, int(matched_counts[pos])))
+        return results
+
+# Global instance
+pantry_index = PantryIndex()
+
+def find_makeable_drinks(pantry: List[str], max_missing: int = 1, limit: int = 20) -> dict:
+    """
+    Answer "what can I make?" for a list of pantry ingredient names.
+    Returns {"makeable": [...], "almost": [...], "unknown_ingredients": [...]}.
+    """
+    pantry_index.ensure_built()
+    ingredient_ids, unknown = pantry_index.resolve_pantry(pantry)
+    hits = pantry_index.search_makeable(ingredient_ids, max_missing=max_missing, limit=limit)
+    missing_ids = {i for _, _, missing, _ in hits for i in missing}
+    names = {}
+    if missing_ids:
+        with Session(engine) as session:
+            names = dict(session.exec(
+                select(Ingredient.ingredient_id, Ingredient.name).where(Ingredient.ingredient_id.in_(missing_ids))
+            ).all())
+    makeable, almost = [], []
+    for drink_id, name, missing, matched in hits:
+        entry = {
+            "drink_id": drink_id,
+            "name": name,
+            "matched": matched,
+            "missing": [names.get(i, str(i)) for i in missing]
+        }
+        (almost if missing else makeable).append(entry)
+    return {"makeable": makeable, "almost": almost, "unknown_ingredients": unknown}
+
+
+def add_drink_to_pantry_index(drink_id: int, name: str, ingredient_ids: List[int], catalog_version: Optional[int] = None) -> None:
+    """Keep an already-built index current when a drink is created in this process"""
+    if pantry_index.built:
+        pantry_index.add_drink(drink_id, name, ingredient_ids)
+        if catalog_version is not None:
+            pantry_index.mark_applied(catalog_version)
@@ -0,0 +1,215 @@
+"""
+Offline job: rebuild every User.prefs by replaying all UserDrinkLog rows.
+Run after changing decay/norm in apply_prefs_update or after fixing ingredient names:
+
+    python -m backend.prefs_rebuild --dry-run      # report what would change
+    python -m backend.prefs_rebuild --decay 0.8    # write new prefs
+
+For l1 normalization each EMA step w_t = (d*w_{t-1} + (1-d)*z_t) / s_t has a scalar
+normalizer s_t that depends only on the drink's ingredient count n_t (w_{t-1} already
+sums to 1), so the final vector is a weighted sum of the z_t:
+
+    w_T = sum_t z_t * (1-d)/s_t * prod_{j>t} d/s_j
+
+Those coefficients are computed for all users at once with segmented cumulative sums
+over integer-encoded (user, ingredient) arrays. l2 falls back to a per-user replay.
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from sqlalchemy import update
+from sqlmodel import Session, select
+from .models import User, Drink, UserDrinkLog, UserDrinkLogRollup
+from .database import engine
+from .ml_utils import replay_prefs_updates
+
+FETCH_BATCH = 10000
+WRITE_BATCH = 1000
+
+
+def load_drink_ingredients(session) -> Tuple[Dict[int, int], np.ndarray, np.ndarray, List[str]]:
+    """
+    Integer-encode Drink.ingredients_json as CSR arrays.
+    Returns (drink_row, indptr, ingredient_codes, ingredient_names); ingredient names
+    are deduplicated per drink, matching the binary presence vector of apply_prefs_update.
+    """
+    drink_row: Dict[int, int] = {}
+    codes: Dict[str, int] = {}
+    indptr = [0]
+    flat: List[int] = []
+    for drink_id, ingredients in session.exec(select(Drink.drink_id, Drink.ingredients_json)).all():
+        drink_row[drink_id] = len(indptr) - 1
+        for name in dict.fromkeys(ingredients if isinstance(ingredients, list) else []):
+            flat.append(codes.setdefault(name, len(codes)))
+        indptr.append(len(flat))
+    names = [None] * len(codes)
+    for name, code in codes.items():
+        names[code] = name
+    return drink_row, np.array(indptr, dtype=np.int64), np.array(flat, dtype=np.int64), names
+
+
+def stream_logs(session, drink_row: Dict[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stream (user_id, drink row) pairs ordered by user and timestamp into int arrays.
+    Logs past the retention window are replayed from their rollups, once per rolled-up
+    log at the rollup's first timestamp (their order within a day is not kept).
+    """
+    rollups = session.exec(
+        select(UserDrinkLogRollup.user_id, UserDrinkLogRollup.drink_id, UserDrinkLogRollup.logs, UserDrinkLogRollup.first_at)
+        .where(UserDrinkLogRollup.drink_id.is_not(None))
+        .order_by(UserDrinkLogRollup.user_id, UserDrinkLogRollup.first_at)
+    ).all()
+    query = (
+        select(UserDrinkLog.user_id, UserDrinkLog.drink_id)
+        .where(UserDrinkLog.drink_id.is_not(None))
+        .order_by(UserDrinkLog.user_id, UserDrinkLog.timestamp, UserDrinkLog.id)
+        .execution_options(yield_per=FETCH_BATCH)
+    )
+    users, rows = [], []
+    for partition in session.execute(query).partitions():
+        for user_id, drink_id in partition:
+            row = drink_row.get(drink_id)
+            if row is not None:
+                users.append(user_id)
+                rows.append(row)
+    if not rollups:
+        return np.array(users, dtype=np.int64), np.array(rows, dtype=np.int64)
+
+    # Rolled-up logs are all older than the raw ones: put each user's rollups first
+    rolled_users, rolled_rows = [], []
+    for user_id, drink_id, logs, _ in rollups:
+        row = drink_row.get(drink_id)
+        if row is not None:
+            rolled_users.extend([user_id] * logs)
+            rolled_rows.extend([row] * logs)
+    users = np.array(rolled_users + users, dtype=np.int64)
+    rows = np.array(rolled_rows + rows, dtype=np.int64)
+    order = np.argsort(users, kind="stable")
+    return users[order], rows[order]
+
+
+def replay_l1(user_ids: np.ndarray, drink_rows: np.ndarray, indptr: np.ndarray, ingredient_codes: np.ndarray, decay: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized l1 EMA replay. Inputs are sorted by (user, timestamp).
+    Returns (user_ids, ingredient_codes, weights) triples of the final prefs.
+    """
+    counts = indptr[drink_rows + 1] - indptr[drink_rows]
+    keep = counts > 0  # Drinks without ingredients leave prefs untouched
+    user_ids, drink_rows, counts = user_ids[keep], drink_rows[keep], counts[keep]
+    if len(user_ids) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+
+    first = np.ones(len(user_ids), dtype=bool)
+    first[1:] = user_ids[1:] != user_ids[:-1]
+    # Normalizer per step: previous prefs sum to 1 except before a user's first drink
+    s = (1 - decay) * counts + np.where(first, 0.0, decay)
+    step = np.log(decay) - np.log(s)
+    # Suffix sums of step within each user segment (excluding the row itself)
+    segment = np.cumsum(first) - 1
+    segment_end = np.r_[np.flatnonzero(first)[1:], len(user_ids)]
+    suffix = np.r_[np.cumsum(step[::-1])[::-1], 0.0]
+    after = suffix[1:len(user_ids) + 1] - suffix[segment_end[segment]]
+    coef = np.exp(np.log(1 - decay) - np.log(s) + after)
+
+    # Expand each log to its ingredient codes (CSR gather)
+    starts = indptr[drink_rows]
+    pair_log = np.repeat(np.arange(len(user_ids)), counts)
+    offsets = np.arange(len(pair_log)) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_ing = ingredient_codes[starts[pair_log] + offsets]
+    n_ing = int(ingredient_codes.max()) + 1
+    keys = segment[pair_log] * n_ing + pair_ing
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    weights = np.bincount(inverse, weights=coef[pair_log])
+    segment_users = user_ids[first]
+    return segment_users[unique_keys // n_ing], unique_keys % n_ing, weights
+
+
+def compute_all_prefs(decay: float = 0.8, norm: str = "l1") -> Dict[int, dict]:
+    """Replay every user's logs and return {user_id: prefs dict}"""
+    with Session(engine) as session:
+        drink_row, indptr, ingredient_codes, names = load_drink_ingredients(session)
+        user_ids, drink_rows = stream_logs(session, drink_row)
+
+    prefs: Dict[int, dict] = {}
+    if norm == "l1":
+        users, codes, weights = replay_l1(user_ids, drink_rows, indptr, ingredient_codes, decay)
+        for user_id, code, weight in zip(users.tolist(), codes.tolist(), weights.tolist()):
+            prefs.setdefault(user_id, {})[names[code]] = weight
+        return {u: dict(sorted(p.items())) for u, p in prefs.items()}
+
+    # l2: the normalizer depends on the vector itself, replay per user
+    boundaries = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1], True])
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        lists = [[names[c] for c in ingredient_codes[indptr[r]:indptr[r + 1]]] for r in drink_rows[start:end]]
+        result = replay_prefs_updates({}, lists, decay=decay, norm=norm)
+        if result:
+            prefs[int(user_ids[start])] = result
+    return prefs
+
+
+def diff_prefs(old: dict, new: dict, tolerance: float = 1e-6) -> float:
+    """Largest absolute weight difference between two prefs dicts (0.0 when equivalent)"""
+    old, new = old or {}, new or {}
+    keys = set(old) | set(new)
+    diff = max((abs(old.get(k, 0.0) - new.get(k, 0.0)) for k in keys), default=0.0)
+    return diff if diff > tolerance else 0.0
+
+
+def rebuild_user_prefs(decay: float = 0.8, norm: str = "l1", dry_run: bool = False, verbose: bool = True) -> dict:
+    """
+    Recompute and (unless dry_run) write back prefs for every user with logs.
+    Returns a summary with counts of users changed and the largest weight change.
+    """
+    started = time.perf_counter()
+    new_prefs = compute_all_prefs(decay=decay, norm=norm)
+    computed = time.perf_counter()
+
+    changed = []
+    max_diff = 0.0
+    with Session(engine) as session:
+        user_ids = list(new_prefs.keys())
+        for i in range(0, len(user_ids), WRITE_BATCH):
+            batch = user_ids[i:i + WRITE_BATCH]
+            current = dict(session.exec(select(User.user_id, User.prefs).where(User.user_id.in_(batch))).all())
+            updates = []
+            for user_id in batch:
+                if user_id not in current:
+                    continue
+                diff = diff_prefs(current[user_id], new_prefs[user_id])
+                if diff:
+                    changed.append(user_id)
+                    max_diff = max(max_diff, diff)
+                    updates.append({"user_id": user_id, "prefs": new_prefs[user_id]})
+                    if dry_run and verbose:
+                        print(f"User {user_id}: max weight change {diff:.4f}")
+            if updates and not dry_run:
+                session.execute(update(User), updates)
+                session.commit()
+
+    summary = {
+        "users_replayed": len(new_prefs),
+        "users_changed": len(changed),
+        "max_weight_change": max_diff,
+        "compute_seconds": computed - started,
+        "total_seconds": time.perf_counter() - started,
+        "dry_run": dry_run
+    }
+    if verbose:
+        print(summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild User.prefs from UserDrinkLog")
+    parser.add_argument("--decay", type=float, default=0.8)
+    parser.add_argument("--norm", choices=["l1", "l2"], default="l1")
+    parser.add_argument("--dry-run", action="store_true", help="Only report users whose prefs would change")
+    args = parser.parse_args()
+    rebuild_user_prefs(decay=args.decay, norm=args.norm, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Opt-in profiling of bot commands and API requests.
+With PROFILE_MODE set, a PROFILE_SAMPLE_RATE share of invocations is profiled and the
+PROFILE_KEEP slowest are kept in PROFILE_DIR, each as a profile plus a JSON sidecar
+with the command or route, its parameters and the duration:
+
+    sample    a background thread samples every thread's stack each PROFILE_INTERVAL
+              seconds while the invocation runs -> .folded (flamegraph.pl, speedscope)
+    cprofile  cProfile on the event loop thread, one invocation at a time -> .prof
+              (pstats, snakeviz, flameprof)
+
+Samples cover the whole process while an invocation runs (executor threads included),
+so under heavy concurrency other requests show up in the flamegraph too.
+
+    PROFILE_MODE=sample PROFILE_SAMPLE_RATE=0.1 uvicorn backend.main:app
+    !profile sample 0.5 | !profile off | !profile status     # bot admins (PROFILE_ADMIN_IDS)
+"""
+
+import cProfile
+import heapq
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Optional
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "").lower()  # "", "sample" or "cprofile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def folded_stack(frame, thread_name: str) -> str:
+    """One flamegraph.pl line prefix: root first, frames joined by ';'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ":"))
+        frame = frame.f_back
+    names.append(f"thread {thread_name}")
+    return ";".join(reversed(names))
+
+
+class Invocation:
+    """One profiled command or request"""
+
+    def __init__(self, label: str, params: dict, mode: str):
+        self.label = label
+        self.params = params
+        self.mode = mode
+        self.samples: Counter = Counter()
+        self.profile: Optional[cProfile.Profile] = None
+        self.started = time.perf_counter()
+        self.started_at = datetime.utcnow()
+
+
+class _Sampler(threading.Thread):
+    """Daemon thread that adds every thread's current stack to each active invocation"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.active = set()
+        self.condition = threading.Condition()
+
+    def add(self, invocation: Invocation) -> None:
+        with self.condition:
+            self.active.add(invocation)
+            self.condition.notify()
+
+    def discard(self, invocation: Invocation) -> None:
+        with self.condition:
+            self.active.discard(invocation)
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self.condition:
+                while not self.active:
+                    self.condition.wait()
+                targets = list(self.active)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                folded_stack(frame, names.get(ident, str(ident)))
+                for ident, frame in sys._current_frames().items() if ident != own
+            ]
+            for invocation in targets:
+                invocation.samples.update(stacks)
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """Decides which invocations to profile and keeps the slowest PROFILE_KEEP on disk"""
+
+    def __init__(self, mode: str = PROFILE_MODE, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 keep: int = PROFILE_KEEP, directory: str = PROFILE_DIR, interval: float = PROFILE_INTERVAL):
+        self.mode = mode if mode in PROFILE_MODES else ""
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.directory = directory
+        self.interval = interval
+        self.stats = {"profiled": 0, "kept": 0}
+        self._slowest = []  # min-heap of (duration, base path) of the files on disk
+        self._lock = threading.Lock()
+        self._sampler: Optional[_Sampler] = None
+        self._cprofile_busy = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    def configure(self, mode: Optional[str] = None, sample_rate: Optional[float] = None) -> None:
+        """Switch profiling at runtime (mode "off" disables it)"""
+        if mode is not None:
+            self.mode = mode if mode in PROFILE_MODES else ""
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+
+    def slowest(self) -> list:
+        """[(duration_s, base path)] of the kept profiles, slowest first"""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+    def start(self, label: str, params: dict) -> Optional[Invocation]:
+        """Begin profiling an invocation, or return None if it is not sampled"""
+        if not self.mode or random.random() >= self.sample_rate:
+            return None
+        invocation = Invocation(label, params, self.mode)
+        if self.mode == "cprofile":
+            # Only one profiler can be attached to the event loop thread at a time
+            if self._cprofile_busy:
+                return None
+            self._cprofile_busy = True
+            invocation.profile = cProfile.Profile()
+            invocation.profile.enable()
+        else:
+            if self._sampler is None:
+                self._sampler = _Sampler(self.interval)
+                self._sampler.start()
+            self._sampler.add(invocation)
+        return invocation
+
+    def finish(self, invocation: Optional[Invocation], label: Optional[str] = None) -> None:
+        """Stop profiling; write the profile if it is among the slowest so far"""
+        if invocation is None:
+            return
+        duration = time.perf_counter() - invocation.started
+        if invocation.profile is not None:
+            invocation.profile.disable()
+            self._cprofile_busy = False
+        elif self._sampler is not None:
+            self._sampler.discard(invocation)
+        if label:
+            invocation.label = label
+        self.stats["profiled"] += 1
+        with self._lock:
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0][0]:
+                return
+            base = self._write(invocation, duration)
+            heapq.heappush(self._slowest, (duration, base))
+            if len(self._slowest) > self.keep:
+                _, evicted = heapq.heappop(self._slowest)
+                for suffix in (".folded", ".prof", ".json"):
+                    try:
+                        os.remove(evicted + suffix)
+                    except FileNotFoundError:
+                        pass
+            self.stats["kept"] += 1
+
+    def _write(self, invocation: Invocation, duration: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", invocation.label).strip("_")[:60] or "invocation"
+        stamp = invocation.started_at.strftime("%Y%m%dT%H%M%S%f")
+        base = os.path.join(self.directory, f"{stamp}-{slug}-{duration * 1000:.0f}ms")
+        if invocation.profile is not None:
+            invocation.profile.dump_stats(base + ".prof")
+        else:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                for stack, count in invocation.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({
+                "label": invocation.label,
+                "params": invocation.params,
+                "mode": invocation.mode,
+                "started_at": invocation.started_at.isoformat(),
+                "duration_ms": duration * 1000,
+                "samples": sum(invocation.samples.values()),
+                "interval_s": self.interval if invocation.profile is None else None,
+            }, f, indent=2, default=str)
+        return base
+
+    def wrap(self, handler: Callable, label: str, params: dict) -> Callable:
+        """Async handler that profiles calls to handler (returned unchanged when profiling is off)"""
+        if not self.mode:
+            return handler
+
+        async def profiled(*args, **kwargs):
+            invocation = self.start(label, params)
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                self.finish(invocation)
+        return profiled
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles sampled HTTP requests, labelled by route template"""
+
+    def __init__(self, app, instance: Optional[Profiler] = None):
+        self.app = app
+        self.profiler = instance if instance is not None else profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        params = {"path": scope["path"], "query": scope.get("query_string", b"").decode("latin-1")}
+        invocation = self.profiler.start(f"{scope['method']} {scope['path']}", params)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            if invocation is not None:
+                invocation.params["path_params"] = scope.get("path_params", {})
+            self.profiler.finish(invocation, f"{scope['method']} {route.path}" if route is not None else None)
+
+
+# Global instance shared by the command router and the API
+profiler = Profiler()
+
@@ -0,0 +1,70 @@
+"""
+Response helpers for the FastAPI app:
+- ORJSONResponse: the app's default response class (orjson instead of json.dumps)
+- conditional GETs: catalog routes carry an ETag derived from catalog_version; a
+  matching If-None-Match raises NotModified before the route queries or serializes
+  anything, and the app answers 304 with an empty body
+"""
+
+import os
+from typing import Any
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+# Responses smaller than this are sent uncompressed (GZipMiddleware minimum_size)
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+# Level 5 compresses the full /drinks/ list about 4x faster than 9 for ~5% more bytes
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "5"))
+# Clients may cache catalog responses but must revalidate them (a 304 is cheap)
+CATALOG_CACHE_CONTROL = "no-cache"
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (handles datetimes and numpy values natively)"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class NotModified(Exception):
+    """Raised by a dependency when the client's cached copy is current"""
+
+    def __init__(self, etag: str):
+        super().__init__(etag)
+        self.etag = etag
+
+
+def catalog_etag_for(version: int) -> str:
+    # Weak: the same catalog version may be sent gzipped or not
+    return f'W/"catalog-{version}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, so W/ prefixes are ignored; "*" matches anything)"""
+    if not if_none_match:
+        return False
+    bare = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == bare:
+            return True
+    return False
+
+
+def catalog_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+
+
+def check_not_modified(request: Request, response: Response, etag: str) -> None:
+    """
+    Raise NotModified on a matching If-None-Match; otherwise tag the response being built.
+    Routes that return a Response themselves must pass catalog_headers(etag) to it.
+    """
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        raise NotModified(etag)
+    response.headers.update(catalog_headers(etag))
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers=catalog_headers(exc.etag))
@@ -0,0 +1,73 @@
+"""
+Batch job: recompute ingredient weights for the whole catalog.
+Refreshes Drink.weights (equal weighting) and Drink.volume_weights (measure-aware)
+and rewrites the DrinkIngredient rows, so suggest_drink never parses measures at
+query time. Run after changing the measure parser or unit table:
+
+    python -m backend.reweight
+"""
+
+import argparse
+import time
+from sqlmodel import Session, select
+from .models import Drink
+from .database import engine, bump_catalog_version, get_metadata_value, set_metadata_value
+from .ingredients import load_alias_map, sync_drink_ingredients
+from .ml_utils import compute_drink_weights, compute_volume_weights
+
+VOLUME_WEIGHTS_BACKFILL_KEY = "volume_weights_backfilled"
+# Value of VOLUME_WEIGHTS_BACKFILL_KEY once stored weights match the current measure parser;
+# bump it with parser changes so startup reweights the catalog once
+VOLUME_WEIGHTS_VERSION = "2"  # 2: units attached to the number ("4cl")
+BATCH_SIZE = 500
+
+
+def reweight_catalog(only_missing: bool = False, verbose: bool = True) -> int:
+    """
+    Recompute weights for every drink (or only drinks without volume_weights).
+    Commits every BATCH_SIZE drinks and bumps the catalog version once at the end.
+    Returns the number of drinks updated.
+    """
+    started = time.perf_counter()
+    updated = 0
+    # expire_on_commit=False: batch commits must not trigger a reload per remaining drink
+    with Session(engine, expire_on_commit=False) as session:
+        alias_map = load_alias_map(session)
+        for drink in session.exec(select(Drink)).all():
+            # JSON columns may hold SQL NULL or JSON null, so filter in Python
+            if only_missing and isinstance(drink.volume_weights, dict):
+                continue
+            ingredients = drink.ingredients_json if isinstance(drink.ingredients_json, list) else []
+            drink.weights = compute_drink_weights(ingredients)
+            drink.volume_weights = compute_volume_weights(ingredients, drink.measures_json)
+            session.add(drink)
+            sync_drink_ingredients(session, drink, alias_map=alias_map)
+            updated += 1
+            if updated % BATCH_SIZE == 0:
+                session.commit()
+        if updated:
+            bump_catalog_version(session)
+        session.commit()
+    if verbose:
+        print(f"Reweighted {updated} drinks in {time.perf_counter() - started:.2f}s")
+    return updated
+
+
+def backfill_volume_weights() -> int:
+    """Migration: recompute every drink's weights once per VOLUME_WEIGHTS_VERSION"""
+    if get_metadata_value(VOLUME_WEIGHTS_BACKFILL_KEY) == VOLUME_WEIGHTS_VERSION:
+        return 0
+    updated = reweight_catalog()
+    set_metadata_value(VOLUME_WEIGHTS_BACKFILL_KEY, VOLUME_WEIGHTS_VERSION)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute ingredient weights for the drink catalog")
+    parser.add_argument("--only-missing", action="store_true", help="Only drinks without volume weights")
+    args = parser.parse_args()
+    reweight_catalog(only_missing=args.only_missing)
+
+
+if __name__ == "__main__":
+    main()
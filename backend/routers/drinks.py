@@ -1,60 +1,134 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlmodel import Session, select
-from ..models import Drink
-from ..database import engine
-from ..faiss_utils import find_similar_drinks
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models import Drink, DrinkIngredient
+from ..database import async_engine, bump_catalog_version, get_catalog_version_async
+from ..faiss_utils import find_similar_drinks, add_drink_to_vector_index
 from ..cocktail_api import cocktail_api
+from ..ingredients import sync_drink_ingredients
+from ..ml_utils import compute_volume_weights
+from ..pantry_index import find_makeable_drinks, add_drink_to_pantry_index
+from ..search import search_drinks_local
+from ..autocomplete import autocomplete_drinks, add_drink_to_autocomplete_index
+from ..hydration import hydrate_drink_names
+from ..cooccurrence import also_drunk
+from ..responses import ORJSONResponse, catalog_etag_for, catalog_headers, check_not_modified
 from typing import List, Optional
 
 router = APIRouter(prefix="/drinks", tags=["drinks"])
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with AsyncSession(async_engine) as session:
         yield session
 
-@router.post("/", response_model=Drink)
-def create_drink(drink: Drink, session: Session = Depends(get_session)):
+async def catalog_etag(request: Request, response: Response, session: AsyncSession = Depends(get_session)) -> str:
+    """
+    ETag for routes that read the catalog tables directly. Answers 304 (via NotModified)
+    before the route runs; the version is read in the route's own transaction, so the
+    tag always describes the rows that would be returned.
+    """
+    etag = catalog_etag_for(await get_catalog_version_async(session))
+    check_not_modified(request, response, etag)
+    return etag
+
+def _insert_drink(session, drink: Drink):
+    """Sync part of create_drink, run on the AsyncSession's underlying Session"""
+    if drink.volume_weights is None and isinstance(drink.ingredients_json, list):
+        drink.volume_weights = compute_volume_weights(drink.ingredients_json, drink.measures_json)
     session.add(drink)
-    session.commit()
-    session.refresh(drink)
+    session.flush()
+    ingredient_ids = sync_drink_ingredients(session, drink)
+    version = bump_catalog_version(session)
+    return ingredient_ids, version
+
+@router.post("/", response_model=Drink)
+async def create_drink(drink: Drink, session: AsyncSession = Depends(get_session)):
+    ingredient_ids, version = await session.run_sync(_insert_drink, drink)
+    await session.commit()
+    # Commit expires the instance; reload it before reading attributes (no lazy IO on an AsyncSession)
+    await session.refresh(drink)
+    add_drink_to_pantry_index(drink.drink_id, drink.name, ingredient_ids, version)
+    add_drink_to_vector_index(drink.drink_id, drink.name, drink.ingredients_json if isinstance(drink.ingredients_json, list) else None, version)
+    add_drink_to_autocomplete_index(drink.drink_id, drink.name, version)
     return drink
 
 @router.get("/", response_model=List[Drink])
-def read_drinks(created_by_user_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
-    query = select(Drink)
+async def read_drinks(created_by_user_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_session), etag: str = Depends(catalog_etag)):
+    # Plain column rows straight to orjson: no ORM objects and no response_model validation
+    query = select(*Drink.__table__.columns)
     if created_by_user_id is not None:
         query = query.where(Drink.created_by_user_id == created_by_user_id)
-    drinks = session.exec(query).all()
-    return drinks
+    drinks = (await session.exec(query)).mappings().all()
+    return ORJSONResponse([dict(drink) for drink in drinks], headers=catalog_headers(etag))
+
+@router.get("/makeable")
+async def get_makeable_drinks(
+    ingredients: str = Query(..., description="Comma-separated pantry ingredients"),
+    max_missing: int = Query(1, ge=0, le=3),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Find drinks that can be made from the given ingredients, plus near misses"""
+    pantry = [i.strip() for i in ingredients.split(",") if i.strip()]
+    result = await run_in_threadpool(find_makeable_drinks, pantry, max_missing=max_missing, limit=limit)
+    return {"pantry": pantry, **result}
+
+@router.get("/search")
+async def search_drinks(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50), etag: str = Depends(catalog_etag)):
+    """Ranked full-text search over local drink names, instructions, ingredients and tags"""
+    results = await run_in_threadpool(search_drinks_local, q, limit=limit)
+    return {"query": q, "results": results}
+
+@router.get("/autocomplete")
+async def autocomplete(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    """Drink names starting with q (or with a word starting with q), most logged first"""
+    # In-memory bisect; only the first call (or a catalog change) touches the database
+    results = await run_in_threadpool(autocomplete_drinks, q, limit=limit)
+    return {"query": q, "results": results}
 
 @router.get("/{drink_id}", response_model=Drink)
-def read_drink(drink_id: int, session: Session = Depends(get_session)):
-    drink = session.get(Drink, drink_id)
+async def read_drink(drink_id: int, session: AsyncSession = Depends(get_session), etag: str = Depends(catalog_etag)):
+    drink = await session.get(Drink, drink_id)
     if not drink:
         raise HTTPException(status_code=404, detail="Drink not found")
     return drink
 
 @router.delete("/{drink_id}")
-def delete_drink(drink_id: int, session: Session = Depends(get_session)):
-    drink = session.get(Drink, drink_id)
+async def delete_drink(drink_id: int, session: AsyncSession = Depends(get_session)):
+    drink = await session.get(Drink, drink_id)
     if not drink:
         raise HTTPException(status_code=404, detail="Drink not found")
-    session.delete(drink)
-    session.commit()
+    await session.exec(delete(DrinkIngredient).where(DrinkIngredient.drink_id == drink_id))
+    await session.delete(drink)
+    # Indexes in every worker (including this one) reload on the next version check
+    await session.run_sync(bump_catalog_version)
+    await session.commit()
     return {"ok": True}
 
+@router.get("/{drink_id}/also-drunk")
+async def get_also_drunk(drink_id: int, limit: int = Query(10, ge=1, le=50), session: AsyncSession = Depends(get_session)):
+    """Drinks most often logged by people who log this one (precomputed co-occurrence neighbors)"""
+    drink = await session.get(Drink, drink_id)
+    if not drink:
+        raise HTTPException(status_code=404, detail="Drink not found")
+    # A stale neighbor list is recomputed and saved on read; that is blocking SQLite work
+    results = await run_in_threadpool(also_drunk, drink_id, limit)
+    return {"drink_id": drink_id, "name": drink.name, "also_drunk": results}
+
 @router.get("/similar/{drink_name}")
-def get_similar_drinks(drink_name: str, k: int = Query(5, ge=1, le=20), session: Session = Depends(get_session)):
+async def get_similar_drinks(drink_name: str, k: int = Query(5, ge=1, le=20)):
     """Find similar drinks using FAISS similarity search"""
-    similar_drinks = find_similar_drinks(drink_name, k=k)
+    # FAISS search (and a possible index reload) is blocking; keep it off the event loop
+    similar_drinks = await run_in_threadpool(find_similar_drinks, drink_name, k=k)
+    # Names for all hits at once, from the mapped catalog (no per-hit query)
+    names = await run_in_threadpool(hydrate_drink_names, [drink_id for drink_id, _ in similar_drinks])
     
     results = []
     for drink_id, distance in similar_drinks:
-        drink = session.get(Drink, drink_id)
-        if drink:
+        if drink_id in names:
             results.append({
-                "drink_id": drink.drink_id,
-                "name": drink.name,
+                "drink_id": drink_id,
+                "name": names[drink_id],
                 "similarity_score": 1.0 / (1.0 + distance),  # Convert distance to similarity
                 "distance": distance
             })
@@ -62,19 +136,19 @@ def get_similar_drinks(drink_name: str, k: int = Query(5, ge=1, le=20), session:
     return {"query": drink_name, "similar_drinks": results}
 
 @router.get("/search/cocktaildb/{drink_name}")
-def search_cocktail_db(drink_name: str):
+async def search_cocktail_db(drink_name: str):
     """Search for drinks using TheCocktailDB API"""
-    drink_data = cocktail_api.search_drink_by_name(drink_name)
+    drink_data = await run_in_threadpool(cocktail_api.search_drink_by_name, drink_name)
     if drink_data:
         formatted_data = cocktail_api.format_drink_for_db(drink_data)
         return {"found": True, "drink": formatted_data}
     return {"found": False, "message": f"No drink found with name '{drink_name}'"}
 
 @router.get("/random/cocktaildb")
-def get_random_cocktail():
+async def get_random_cocktail():
     """Get a random drink from TheCocktailDB API"""
-    drink_data = cocktail_api.get_random_drink()
+    drink_data = await run_in_threadpool(cocktail_api.get_random_drink)
     if drink_data:
         formatted_data = cocktail_api.format_drink_for_db(drink_data)
         return {"found": True, "drink": formatted_data}
-    return {"found": False, "message": "Could not fetch random drink"} 
\ No newline at end of file
+    return {"found": False, "message": "Could not fetch random drink"}
@@ -1,44 +1,84 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlmodel import Session, select
+import json
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import ValidationError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models import UserDrinkLog
-from ..database import engine
+from ..database import async_engine
+from ..utils import bulk_log_user_drinks
+from ..stats import record_logs
 from typing import List, Optional
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with AsyncSession(async_engine) as session:
         yield session
 
 @router.post("/", response_model=UserDrinkLog)
-def create_log(log: UserDrinkLog, session: Session = Depends(get_session)):
+async def create_log(log: UserDrinkLog, session: AsyncSession = Depends(get_session)):
     session.add(log)
-    session.commit()
-    session.refresh(log)
+    await session.run_sync(record_logs, [log])
+    await session.commit()
+    await session.refresh(log)
     return log
 
+@router.post("/bulk")
+async def create_logs_bulk(request: Request, session: AsyncSession = Depends(get_session)):
+    """
+    Import many logs in one transaction. Accepts a JSON array or NDJSON
+    (one log object per line, Content-Type: application/x-ndjson).
+    Drink names are resolved in one batch and each user's prefs are updated once.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or not body.lstrip().startswith(b"["):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not items:
+        raise HTTPException(status_code=400, detail="No logs provided")
+    
+    logs = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=422, detail=f"Log {i}: expected an object")
+        item.pop("id", None)
+        try:
+            logs.append(UserDrinkLog.model_validate(item))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Log {i}: {e}")
+    
+    result = await session.run_sync(bulk_log_user_drinks, logs)
+    await session.commit()
+    return result
+
 @router.get("/", response_model=List[UserDrinkLog])
-def read_logs(user_id: Optional[int] = Query(None), drink_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+async def read_logs(user_id: Optional[int] = Query(None), drink_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_session)):
     query = select(UserDrinkLog)
     if user_id is not None:
         query = query.where(UserDrinkLog.user_id == user_id)
     if drink_id is not None:
         query = query.where(UserDrinkLog.drink_id == drink_id)
-    logs = session.exec(query).all()
+    logs = (await session.exec(query)).all()
     return logs
 
 @router.get("/{log_id}", response_model=UserDrinkLog)
-def read_log(log_id: int, session: Session = Depends(get_session)):
-    log = session.get(UserDrinkLog, log_id)
+async def read_log(log_id: int, session: AsyncSession = Depends(get_session)):
+    log = await session.get(UserDrinkLog, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     return log
 
 @router.delete("/{log_id}")
-def delete_log(log_id: int, session: Session = Depends(get_session)):
-    log = session.get(UserDrinkLog, log_id)
+async def delete_log(log_id: int, session: AsyncSession = Depends(get_session)):
+    log = await session.get(UserDrinkLog, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
-    session.delete(log)
-    session.commit()
-    return {"ok": True} 
\ No newline at end of file
+    await session.run_sync(record_logs, [log], None, -1)
+    await session.delete(log)
+    await session.commit()
+    return {"ok": True}
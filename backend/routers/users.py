@@ -1,39 +1,49 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models import User
-from ..database import engine
+from ..database import async_engine
+from ..stats import get_user_stats
 from typing import List
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with AsyncSession(async_engine) as session:
         yield session
 
 @router.post("/", response_model=User)
-def create_user(user: User, session: Session = Depends(get_session)):
+async def create_user(user: User, session: AsyncSession = Depends(get_session)):
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     return user
 
 @router.get("/", response_model=List[User])
-def read_users(session: Session = Depends(get_session)):
-    users = session.exec(select(User)).all()
+async def read_users(session: AsyncSession = Depends(get_session)):
+    users = (await session.exec(select(User))).all()
     return users
 
 @router.get("/{user_id}", response_model=User)
-def read_user(user_id: int, session: Session = Depends(get_session)):
-    user = session.get(User, user_id)
+async def read_user(user_id: int, session: AsyncSession = Depends(get_session)):
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+@router.get("/{user_id}/stats")
+async def read_user_stats(user_id: int, session: AsyncSession = Depends(get_session)):
+    """Drinks per day/week, rolling windows, streaks and favorites from the aggregate tables"""
+    stats = await session.run_sync(get_user_stats, user_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return stats
+
 @router.delete("/{user_id}")
-def delete_user(user_id: int, session: Session = Depends(get_session)):
-    user = session.get(User, user_id)
+async def delete_user(user_id: int, session: AsyncSession = Depends(get_session)):
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    session.delete(user)
-    session.commit()
-    return {"ok": True} 
\ No newline at end of file
+    await session.delete(user)
+    await session.commit()
+    return {"ok": True}
@@ -0,0 +1,104 @@
+"""
+Local full-text search over the drink catalog using SQLite FTS5.
+drink_fts is an external-content table over `drink`, kept in sync by triggers
+so every ingest path (hardcoded, CocktailDB sync, !adddrink, API) is covered.
+"""
+
+import re
+from typing import List
+from sqlalchemy import text
+from sqlmodel import Session
+from .database import engine
+
+FTS_TABLE = "drink_fts"
+
+# Column order matters for bm25() weights and snippet() column numbers
+FTS_COLUMNS = ["name", "instructions", "ingredients_json", "tags"]
+FTS_WEIGHTS = [10.0, 1.0, 5.0, 3.0]
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {", ".join(FTS_COLUMNS)},
+        content='drink', content_rowid='drink_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS drink_fts_ai AFTER INSERT ON drink BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, instructions, ingredients_json, tags)
+        VALUES (new.drink_id, new.name, new.instructions, new.ingredients_json, new.tags);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS drink_fts_ad AFTER DELETE ON drink BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, instructions, ingredients_json, tags)
+        VALUES ('delete', old.drink_id, old.name, old.instructions, old.ingredients_json, old.tags);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS drink_fts_au AFTER UPDATE ON drink BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, instructions, ingredients_json, tags)
+        VALUES ('delete', old.drink_id, old.name, old.instructions, old.ingredients_json, old.tags);
+        INSERT INTO {FTS_TABLE}(rowid, name, instructions, ingredients_json, tags)
+        VALUES (new.drink_id, new.name, new.instructions, new.ingredients_json, new.tags);
+    END""",
+]
+
+# Filler words that would otherwise dominate natural-language queries
+STOPWORDS = {
+    "a", "an", "and", "the", "with", "that", "thats", "that's", "is", "it", "of", "in",
+    "on", "or", "to", "for", "something", "some", "drink", "drinks", "me", "i", "want",
+}
+
+
+def ensure_fts_index(rebuild: bool = False) -> None:
+    """Create the FTS table and sync triggers if missing; (re)index existing drinks"""
+    with Session(engine) as session:
+        exists = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in FTS_SCHEMA:
+            session.execute(text(statement))
+        if rebuild or not exists:
+            session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        session.commit()
+
+
+def build_fts_query(query: str) -> str:
+    """
+    Turn free text like "something with mint that's stirred" into an FTS5 MATCH expression.
+    Terms are quoted (so user input cannot inject FTS syntax) and OR'd; bm25 ranks
+    drinks matching more terms first.
+    """
+    terms = [t for t in re.findall(r"\w+", query.lower()) if t not in STOPWORDS]
+    if not terms:
+        terms = re.findall(r"\w+", query.lower())
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def _clean_snippet(snippet: str) -> str:
+    """Strip JSON list punctuation and \\uXXXX escapes from ingredients/tags snippets"""
+    if not snippet:
+        return snippet
+    snippet = re.sub(r"\\u([0-9a-fA-F]{4})", lambda m: chr(int(m.group(1), 16)), snippet)
+    return re.sub(r'"\s*,\s*"', ", ", snippet).strip('[]"').replace('"', "")
+
+
+def search_drinks_local(query: str, limit: int = 10) -> List[dict]:
+    """
+    Ranked local search over drink names, instructions, ingredients and tags.
+    Returns dicts with drink_id, name, score (higher is better) and a highlighted snippet.
+    """
+    match = build_fts_query(query)
+    if not match:
+        return []
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    sql = text(f"""
+        SELECT rowid, name, bm25({FTS_TABLE}, {weights}) AS rank,
+               snippet({FTS_TABLE}, -1, '**', '**', '…', 12) AS snippet
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match
+        ORDER BY rank
+        LIMIT :limit
+    """)
+    with Session(engine) as session:
+        rows = session.execute(sql, {"match": match, "limit": limit}).all()
+    return [
+        {"drink_id": row[0], "name": row[1], "score": -float(row[2]), "snippet": _clean_snippet(row[3])}
+        for row in rows
+    ]
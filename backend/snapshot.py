@@ -0,0 +1,234 @@
+"""
+Catalog snapshots: export the Drink catalog to one streamed binary file and seed a
+fresh database from it without calling TheCocktailDB.
+
+Layout (all integers little-endian, ".gz" paths are gzip-compressed):
+    magic b"OTRSNAP\\n"
+    u32 header length, header JSON (format_version, created_at, drink_count, ...)
+    per drink: u32 record length, 16-byte blake2b of the body, drink JSON body
+    u32 0 (end marker), 32-byte sha256 over every record, u64 record count
+
+Embeddings are not stored: the columnar catalog derives them from name and ingredients.
+
+    python -m backend.snapshot export catalog_snapshot.bin
+    python -m backend.snapshot import catalog_snapshot.bin
+    python -m backend.snapshot verify catalog_snapshot.bin
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import struct
+import time
+from datetime import datetime
+from typing import Iterator, Tuple
+from sqlalchemy import func
+from sqlmodel import Session, select
+from .models import Drink
+from .database import engine, get_catalog_version, bump_catalog_version, set_metadata_value
+from .ingredients import load_alias_map, sync_drink_ingredients, INGREDIENT_BACKFILL_KEY
+from .ml_utils import compute_drink_weights, compute_volume_weights
+from .reweight import VOLUME_WEIGHTS_BACKFILL_KEY, VOLUME_WEIGHTS_VERSION
+
+SNAPSHOT_MAGIC = b"OTRSNAP\n"
+SNAPSHOT_FORMAT_VERSION = 1
+IMPORT_BATCH = 1000
+# Default seed file for update_database, next to drinks_hardcoded.json
+DEFAULT_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "catalog_snapshot.bin")
+)
+SNAPSHOT_FIELDS = [
+    "name", "ingredients_json", "measures_json", "instructions", "cocktail_db_id", "image_url",
+    "category", "alcoholic", "glass", "tags", "weights", "volume_weights", "last_updated"
+]
+
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_RECORD_DIGEST_SIZE = 16
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is malformed or fails a content hash check"""
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise SnapshotError("Snapshot is truncated")
+    return data
+
+
+def _drink_record(drink: Drink) -> bytes:
+    values = {}
+    for field in SNAPSHOT_FIELDS:
+        value = getattr(drink, field)
+        values[field] = value.isoformat() if isinstance(value, datetime) else value
+    body = json.dumps(values, separators=(",", ":")).encode()
+    return hashlib.blake2b(body, digest_size=_RECORD_DIGEST_SIZE).digest() + body
+
+
+def export_snapshot(path: str, verbose: bool = True) -> int:
+    """Stream every drink into a snapshot file. Returns the number of drinks written."""
+    started = time.perf_counter()
+    with Session(engine) as session:
+        drink_count = session.exec(select(func.count(Drink.drink_id))).one()
+        header = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "catalog_version": get_catalog_version(),
+            "drink_count": drink_count,
+            "fields": SNAPSHOT_FIELDS
+        }
+        header_bytes = json.dumps(header).encode()
+        content_hash = hashlib.sha256()
+        written = 0
+        with _open(path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + _U32.pack(len(header_bytes)) + header_bytes)
+            query = select(Drink).order_by(Drink.drink_id).execution_options(yield_per=IMPORT_BATCH)
+            for drink in session.exec(query):
+                record = _drink_record(drink)
+                content_hash.update(record)
+                f.write(_U32.pack(len(record)) + record)
+                written += 1
+            f.write(_U32.pack(0) + content_hash.digest() + _U64.pack(written))
+    if verbose:
+        print(f"Exported {written} drinks to {path} in {time.perf_counter() - started:.2f}s")
+    return written
+
+
+def read_snapshot(path: str) -> Tuple[dict, Iterator[dict]]:
+    """
+    Open a snapshot and return (header, records). records lazily yields
+    the drink fields and checks every record hash plus the trailer;
+    it raises SnapshotError on any mismatch.
+    """
+    f = _open(path, "rb")
+    try:
+        if _read_exact(f, len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise SnapshotError("Not a catalog snapshot")
+        (header_length,) = _U32.unpack(_read_exact(f, _U32.size))
+        header = json.loads(_read_exact(f, header_length))
+        if header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {header.get('format_version')}")
+    except Exception:
+        f.close()
+        raise
+
+    def records():
+        content_hash = hashlib.sha256()
+        count = 0
+        with f:
+            while True:
+                (length,) = _U32.unpack(_read_exact(f, _U32.size))
+                if length == 0:
+                    break
+                record = _read_exact(f, length)
+                digest, body = record[:_RECORD_DIGEST_SIZE], record[_RECORD_DIGEST_SIZE:]
+                if hashlib.blake2b(body, digest_size=_RECORD_DIGEST_SIZE).digest() != digest:
+                    raise SnapshotError(f"Content hash mismatch in record {count}")
+                content_hash.update(record)
+                count += 1
+                yield json.loads(body)
+            expected_hash = _read_exact(f, 32)
+            (expected_count,) = _U64.unpack(_read_exact(f, _U64.size))
+            if expected_hash != content_hash.digest() or expected_count != count:
+                raise SnapshotError("Snapshot trailer does not match its records")
+
+    return header, records()
+
+
+def verify_snapshot(path: str) -> dict:
+    """Check every hash in a snapshot without touching the database. Returns the header."""
+    header, records = read_snapshot(path)
+    count = sum(1 for _ in records)
+    if count != header.get("drink_count"):
+        raise SnapshotError(f"Header lists {header.get('drink_count')} drinks, found {count}")
+    return header
+
+
+def import_snapshot(path: str, verbose: bool = True) -> int:
+    """
+    Insert the drinks from a snapshot, skipping ones already present (by CocktailDB id
+    or exact name), and rebuild their DrinkIngredient rows. No network access.
+    Returns the number of drinks imported.
+    """
+    started = time.perf_counter()
+    header, records = read_snapshot(path)
+    imported = 0
+    with Session(engine) as session:
+        alias_map = load_alias_map(session)
+        existing = session.exec(select(Drink.name, Drink.cocktail_db_id)).all()
+        seeded_empty = not existing
+        names = {name for name, _ in existing}
+        cocktail_db_ids = {cid for _, cid in existing if cid}
+        batch = []
+        for values in records:
+            if values.get("cocktail_db_id") in cocktail_db_ids or values["name"] in names:
+                continue
+            fields = {field: values.get(field) for field in SNAPSHOT_FIELDS}
+            if fields["last_updated"]:
+                fields["last_updated"] = datetime.fromisoformat(fields["last_updated"])
+            else:
+                fields.pop("last_updated")
+            ingredients = fields["ingredients_json"] if isinstance(fields["ingredients_json"], list) else []
+            if fields["weights"] is None:
+                fields["weights"] = compute_drink_weights(ingredients)
+            if fields["volume_weights"] is None:
+                fields["volume_weights"] = compute_volume_weights(ingredients, fields["measures_json"])
+            batch.append(Drink(**fields))
+            names.add(values["name"])
+            if fields["cocktail_db_id"]:
+                cocktail_db_ids.add(fields["cocktail_db_id"])
+            if len(batch) >= IMPORT_BATCH:
+                imported += _insert_batch(session, batch, alias_map)
+                batch = []
+        imported += _insert_batch(session, batch, alias_map)
+        if imported:
+            bump_catalog_version(session)
+        session.commit()
+    if seeded_empty:
+        # Every drink came from the snapshot with weights and ingredient rows; the startup
+        # backfills can skip them. Drinks already present may predate both, so leave the keys.
+        set_metadata_value(INGREDIENT_BACKFILL_KEY, "1")
+        set_metadata_value(VOLUME_WEIGHTS_BACKFILL_KEY, VOLUME_WEIGHTS_VERSION)
+    if verbose:
+        print(f"Imported {imported} drinks from {path} (snapshot of {header.get('created_at')}) in {time.perf_counter() - started:.2f}s")
+    return imported
+
+
+def _insert_batch(session, batch, alias_map) -> int:
+    if not batch:
+        return 0
+    session.add_all(batch)
+    session.flush()
+    for drink in batch:
+        sync_drink_ingredients(session, drink, alias_map=alias_map)
+    # Flush only: one transaction, so a hash mismatch late in the file leaves nothing behind
+    session.flush()
+    session.expunge_all()
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a drink catalog snapshot")
+    parser.add_argument("command", choices=["export", "import", "verify"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_PATH)
+    args = parser.parse_args()
+    if args.command == "export":
+        export_snapshot(args.path)
+    elif args.command == "import":
+        import_snapshot(args.path)
+    else:
+        header = verify_snapshot(args.path)
+        print(f"OK: {header['drink_count']} drinks, created {header['created_at']}")
+
+
+if __name__ == "__main__":
+    main()
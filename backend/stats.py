@@ -0,0 +1,239 @@
+"""
+Incrementally maintained consumption aggregates.
+Every logged drink updates one UserDailyStats bucket (calendar day in the user's
+timezone) and one UserDrinkStats row, so !stats and /users/{id}/stats read
+O(active days) rows instead of scanning UserDrinkLog. Rebuild after backfills:
+
+    python -m backend.stats --rebuild
+"""
+
+import argparse
+import time
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select, delete
+from .models import User, UserDrinkLog, UserDailyStats, UserDrinkStats, UserDrinkLogRollup
+from .database import engine
+from .cooccurrence import user_drink_sets, update_cooccurrence, rebuild_cooccurrence
+
+REBUILD_BATCH = 10000
+
+
+@lru_cache(maxsize=None)
+def _zone(tz_name: Optional[str]):
+    if not tz_name:
+        return timezone.utc
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def local_day(timestamp: datetime, tz_name: Optional[str] = None) -> date:
+    """Calendar day of a naive-UTC timestamp in the given IANA timezone"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(_zone(tz_name)).date()
+
+
+def record_logs(session, logs: List[UserDrinkLog], timezones: Optional[Dict[int, Optional[str]]] = None, sign: int = 1,
+                cooccurrence: bool = True) -> None:
+    """
+    Fold logs into the aggregate tables inside the caller's transaction.
+    Logs are pre-grouped so each (user, day) and (user, drink) bucket costs one upsert.
+    Use sign=-1 to remove deleted logs. Drinks entering or leaving a user's history
+    also update the drink co-occurrence matrix (skipped by full rebuilds).
+    """
+    if not logs:
+        return
+    if cooccurrence:
+        drink_users = {log.user_id for log in logs}
+        before = user_drink_sets(session, drink_users)
+    if timezones is None:
+        user_ids = {log.user_id for log in logs}
+        timezones = dict(session.exec(select(User.user_id, User.timezone).where(User.user_id.in_(user_ids))).all())
+
+    days: Dict[tuple, list] = {}
+    drinks: Dict[tuple, list] = {}
+    for log in logs:
+        timestamp = log.timestamp or datetime.utcnow()
+        quantity = (log.quantity if log.quantity is not None else 1.0) * sign
+        day_bucket = days.setdefault((log.user_id, local_day(timestamp, timezones.get(log.user_id))), [0, 0.0])
+        day_bucket[0] += sign
+        day_bucket[1] += quantity
+        drink_bucket = drinks.setdefault((log.user_id, log.name), [0, 0.0, log.drink_id, timestamp, timestamp])
+        drink_bucket[0] += sign
+        drink_bucket[1] += quantity
+        drink_bucket[3] = min(drink_bucket[3], timestamp)
+        drink_bucket[4] = max(drink_bucket[4], timestamp)
+
+    for (user_id, day), (count, quantity) in days.items():
+        stmt = sqlite_insert(UserDailyStats).values(user_id=user_id, day=day, logs=count, quantity=quantity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={"logs": UserDailyStats.logs + stmt.excluded.logs, "quantity": UserDailyStats.quantity + stmt.excluded.quantity}
+        )
+        session.execute(stmt)
+    for (user_id, name), (count, quantity, drink_id, first_at, last_at) in drinks.items():
+        stmt = sqlite_insert(UserDrinkStats).values(
+            user_id=user_id, name=name, drink_id=drink_id, logs=count, quantity=quantity, first_at=first_at, last_at=last_at
+        )
+        update = {"logs": UserDrinkStats.logs + stmt.excluded.logs, "quantity": UserDrinkStats.quantity + stmt.excluded.quantity}
+        if sign > 0:
+            update["drink_id"] = func.coalesce(stmt.excluded.drink_id, UserDrinkStats.drink_id)
+            update["first_at"] = func.min(func.coalesce(UserDrinkStats.first_at, stmt.excluded.first_at), stmt.excluded.first_at)
+            update["last_at"] = func.max(func.coalesce(UserDrinkStats.last_at, stmt.excluded.last_at), stmt.excluded.last_at)
+        session.execute(stmt.on_conflict_do_update(index_elements=["user_id", "name"], set_=update))
+
+    if sign < 0:
+        user_ids = {log.user_id for log in logs}
+        session.exec(delete(UserDailyStats).where(UserDailyStats.user_id.in_(user_ids), UserDailyStats.logs <= 0))
+        session.exec(delete(UserDrinkStats).where(UserDrinkStats.user_id.in_(user_ids), UserDrinkStats.logs <= 0))
+    if cooccurrence:
+        update_cooccurrence(session, before, user_drink_sets(session, drink_users))
+
+
+def record_rollups(session, rollups: List[UserDrinkLogRollup]) -> None:
+    """Fold rolled-up log rows (see backend.maintenance) into the aggregate tables, like record_logs"""
+    days: Dict[tuple, list] = {}
+    for rollup in rollups:
+        bucket = days.setdefault((rollup.user_id, rollup.day), [0, 0.0])
+        bucket[0] += rollup.logs
+        bucket[1] += rollup.quantity
+    for (user_id, day), (count, quantity) in days.items():
+        stmt = sqlite_insert(UserDailyStats).values(user_id=user_id, day=day, logs=count, quantity=quantity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={"logs": UserDailyStats.logs + stmt.excluded.logs, "quantity": UserDailyStats.quantity + stmt.excluded.quantity}
+        )
+        session.execute(stmt)
+    for rollup in rollups:
+        stmt = sqlite_insert(UserDrinkStats).values(
+            user_id=rollup.user_id, name=rollup.name, drink_id=rollup.drink_id, logs=rollup.logs,
+            quantity=rollup.quantity, first_at=rollup.first_at, last_at=rollup.last_at
+        )
+        session.execute(stmt.on_conflict_do_update(index_elements=["user_id", "name"], set_={
+            "logs": UserDrinkStats.logs + stmt.excluded.logs,
+            "quantity": UserDrinkStats.quantity + stmt.excluded.quantity,
+            "drink_id": func.coalesce(stmt.excluded.drink_id, UserDrinkStats.drink_id),
+            "first_at": func.min(func.coalesce(UserDrinkStats.first_at, stmt.excluded.first_at), stmt.excluded.first_at),
+            "last_at": func.max(func.coalesce(UserDrinkStats.last_at, stmt.excluded.last_at), stmt.excluded.last_at),
+        }))
+
+
+def rebuild_aggregates(verbose: bool = True) -> int:
+    """
+    Recompute all aggregate rows from UserDrinkLog, starting from the rollups of logs
+    past the retention window. Returns the number of logs replayed.
+    """
+    started = time.perf_counter()
+    replayed = 0
+    with Session(engine) as session:
+        session.exec(delete(UserDailyStats))
+        session.exec(delete(UserDrinkStats))
+        rollups = select(UserDrinkLogRollup).order_by(UserDrinkLogRollup.user_id).execution_options(yield_per=REBUILD_BATCH)
+        for partition in session.exec(rollups).partitions():
+            record_rollups(session, list(partition))
+        timezones = dict(session.exec(select(User.user_id, User.timezone)).all())
+        query = select(UserDrinkLog).order_by(UserDrinkLog.user_id).execution_options(yield_per=REBUILD_BATCH)
+        for partition in session.exec(query).partitions():
+            record_logs(session, list(partition), timezones, cooccurrence=False)
+            replayed += len(partition)
+        session.commit()
+    rebuild_cooccurrence(verbose)
+    if verbose:
+        print(f"Rebuilt consumption aggregates from {replayed} logs in {time.perf_counter() - started:.2f}s")
+    return replayed
+
+
+def _streaks(days: List[date], today: date):
+    """(current, longest) runs of consecutive active days; current counts if it reaches today or yesterday"""
+    longest = current = run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    if previous is not None and today - previous <= timedelta(days=1):
+        current = run
+    return current, longest
+
+
+def get_user_stats(session, user_id: int, now: Optional[datetime] = None, days: int = 14, weeks: int = 8, favorites: int = 5) -> Optional[dict]:
+    """
+    Consumption summary for a user from the aggregate tables.
+    Returns None if the user does not exist.
+    """
+    user = session.get(User, user_id)
+    if not user:
+        return None
+    today = local_day(now or datetime.utcnow(), user.timezone)
+    buckets = session.exec(
+        select(UserDailyStats.day, UserDailyStats.logs, UserDailyStats.quantity)
+        .where(UserDailyStats.user_id == user_id)
+        .order_by(UserDailyStats.day)
+    ).all()
+    per_day = {day: quantity for day, _, quantity in buckets}
+
+    def window(n_days: int) -> float:
+        start = today - timedelta(days=n_days - 1)
+        return sum(q for day, q in per_day.items() if start <= day <= today)
+
+    week_start = today - timedelta(days=today.weekday())
+    weekly = {}
+    for day, quantity in per_day.items():
+        start = day - timedelta(days=day.weekday())
+        weekly[start] = weekly.get(start, 0.0) + quantity
+
+    top = session.exec(
+        select(UserDrinkStats.name, UserDrinkStats.logs, UserDrinkStats.quantity, UserDrinkStats.last_at)
+        .where(UserDrinkStats.user_id == user_id)
+        .order_by(UserDrinkStats.logs.desc(), UserDrinkStats.last_at.desc())
+        .limit(favorites)
+    ).all()
+    current_streak, longest_streak = _streaks(list(per_day.keys()), today)
+    total = sum(per_day.values())
+
+    return {
+        "user_id": user_id,
+        "timezone": user.timezone or "UTC",
+        "total_drinks": total,
+        "total_logs": sum(logs for _, logs, _ in buckets),
+        "active_days": len(per_day),
+        "average_per_active_day": total / len(per_day) if per_day else 0.0,
+        "today": per_day.get(today, 0.0),
+        "last_7_days": window(7),
+        "last_30_days": window(30),
+        "current_streak": current_streak,
+        "longest_streak": longest_streak,
+        "per_day": [
+            {"day": (today - timedelta(days=i)).isoformat(), "drinks": per_day.get(today - timedelta(days=i), 0.0)}
+            for i in reversed(range(days))
+        ],
+        "per_week": [
+            {"week_start": (week_start - timedelta(weeks=i)).isoformat(), "drinks": weekly.get(week_start - timedelta(weeks=i), 0.0)}
+            for i in reversed(range(weeks))
+        ],
+        "favorites": [
+            {"name": name, "logs": logs, "drinks": quantity, "last_at": last_at.isoformat() if last_at else None}
+            for name, logs, quantity, last_at in top
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consumption aggregate maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all aggregates from UserDrinkLog")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_aggregates()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
 from sqlmodel import Session, select
-from .models import User, Drink, UserDrinkLog
-from .database import engine
+from .models import User, Drink, UserDrinkLog, UserDrinkLogRollup
+from .database import engine, bump_catalog_version
 from datetime import datetime
 from typing import Optional, Any, List
-from .faiss_utils import get_drink_embedding, update_drink_embedding
-from .ml_utils import compute_drink_weights, update_user_prefs, suggest_drink
+from .faiss_utils import get_drink_embedding, add_drink_to_vector_index
+from .ml_utils import compute_drink_weights, compute_volume_weights, suggest_drink, replay_prefs_updates
+from .ingredients import sync_drink_ingredients
+from .pantry_index import add_drink_to_pantry_index
+from .autocomplete import autocomplete_index, add_drink_to_autocomplete_index
+from .stats import record_logs
+from .hydration import hydrate_drinks_by_cocktail_db_id
 import re
 from rapidfuzz import process, fuzz
 
+# session.info key: drinks inserted in the session, added to the in-memory indexes after commit
+NEW_DRINKS_KEY = "new_drinks"
+
 # Updated embedding function using FAISS utilities
 def compute_embedding(drink: Drink) -> List[float]:
     ingredients = drink.ingredients_json if isinstance(drink.ingredients_json, list) else None
-    embedding = get_drink_embedding(drink.name, ingredients)
-    if drink.drink_id:
-        update_drink_embedding(drink.drink_id, drink.name, ingredients)
-    return embedding
+    return get_drink_embedding(drink.name, ingredients)
 
 def get_drink_by_name(name: str) -> Optional[Drink]:
     with Session(engine) as session:
@@ -27,12 +32,9 @@ def get_drink_by_name(name: str) -> Optional[Drink]:
         return None
 
 def fuzzy_drink_exists(session, name: str, threshold: int = 70):
-    # Fetch all drinks and print their name and category for debugging
-    drinks = session.exec(select(Drink)).all()
-    db_names = []
-    for drink in drinks:
-        if drink.name and len(drink.name.strip()) > 2:
-            db_names.append(drink.name)
+    # Only the names are needed to match; the winning row is loaded afterwards
+    names = session.exec(select(Drink.name)).all()
+    db_names = [name for name in names if name and len(name.strip()) > 2]
     if not db_names:
         return None
     match = process.extractOne(name, db_names, scorer=fuzz.token_sort_ratio)
@@ -44,9 +46,14 @@ def fuzzy_drink_exists(session, name: str, threshold: int = 70):
 def find_drink_by_name(name: str, threshold: int = 70) -> Optional[Drink]:
     """
     Fuzzy search for a drink by name. Returns the best match or None if not found.
-    Never creates a new drink.
+    Never creates a new drink. Exact (normalized) names skip the fuzzy scan.
     """
     with Session(engine) as session:
+        drink_id = autocomplete_index.lookup(name)
+        if drink_id is not None:
+            drink = session.get(Drink, drink_id)
+            if drink:
+                return drink
         drink = fuzzy_drink_exists(session, name, threshold=threshold)
         return drink
 
@@ -77,6 +84,7 @@ def get_or_create_drink_by_name(session, name: str, ingredients_json: Any = None
     # Since we have a comprehensive database, this should be rare
     # Compute weights for the new drink
     weights = compute_drink_weights(ingredients_json) if ingredients_json else {}
+    volume_weights = compute_volume_weights(ingredients_json, measures_json) if ingredients_json else {}
     
     drink = Drink(
         name=name, 
@@ -84,25 +92,114 @@ def get_or_create_drink_by_name(session, name: str, ingredients_json: Any = None
         measures_json=measures_json,
         instructions=instructions, 
         created_by_user_id=created_by_user_id,
-        weights=weights
+        weights=weights,
+        volume_weights=volume_weights
     )
     # drink.embedding = compute_embedding(drink)  # Removed: no longer used
     session.add(drink)
+    session.flush()
+    ingredient_ids = sync_drink_ingredients(session, drink)
+    # Publish the change to other processes in the same transaction as the insert;
+    # this process's indexes only take the drink once the caller has committed
+    version = bump_catalog_version(session)
+    ingredients = ingredients_json if isinstance(ingredients_json, list) else None
+    session.info.setdefault(NEW_DRINKS_KEY, []).append((drink.drink_id, drink.name, ingredients, ingredient_ids, version))
     return drink
 
+def add_new_drinks_to_indexes(session) -> None:
+    """Add drinks created by get_or_create_drink_by_name to the in-memory indexes; call after session.commit()"""
+    for drink_id, name, ingredients, ingredient_ids, version in session.info.pop(NEW_DRINKS_KEY, []):
+        add_drink_to_pantry_index(drink_id, name, ingredient_ids, version)
+        add_drink_to_vector_index(drink_id, name, ingredients, version)
+        add_drink_to_autocomplete_index(drink_id, name, version)
+
 def upsert_drink(name: str, ingredients_json: Any = None, measures_json: Any = None, instructions: Optional[str] = None, created_by_user_id: Optional[int] = None) -> Drink:
     with Session(engine) as session:
         drink = get_or_create_drink_by_name(session, name, ingredients_json, measures_json, instructions, created_by_user_id)
         session.commit()
+        add_new_drinks_to_indexes(session)
         session.refresh(drink)
         return drink
 
+def resolve_drink_names(session, names: List[str], threshold: int = 70) -> dict:
+    """
+    Resolve many drink names at once: exact (case-insensitive) match first, then the same
+    token_sort_ratio fuzzy match as fuzzy_drink_exists. Loads the name list with one query.
+    Returns {name: drink_id} for the names that resolved.
+    """
+    rows = session.exec(select(Drink.drink_id, Drink.name)).all()
+    by_lower = {}
+    for drink_id, drink_name in rows:
+        if drink_name:
+            by_lower.setdefault(drink_name.strip().lower(), drink_id)
+    choices = [n for _, n in rows if n and len(n.strip()) > 2]
+    by_name = {n: i for i, n in rows}
+    resolved = {}
+    for name in set(names):
+        drink_id = by_lower.get(name.strip().lower())
+        if drink_id is None and choices:
+            match = process.extractOne(name, choices, scorer=fuzz.token_sort_ratio)
+            if match and match[1] >= threshold:
+                drink_id = by_name[match[0]]
+        if drink_id is not None:
+            resolved[name] = drink_id
+    return resolved
+
+def bulk_log_user_drinks(session, logs: List[UserDrinkLog], decay: float = 0.8, norm: str = "l1") -> dict:
+    """
+    Insert many drink logs in the caller's transaction and fold them into User.prefs.
+    - Drink names without a drink_id are resolved in one batch
+    - Missing users are created
+    - Each affected user's preferences are updated once, replaying the EMA over
+      their new logs in timestamp order
+    The caller commits.
+    """
+    unresolved_names = [log.name for log in logs if log.drink_id is None]
+    resolved = resolve_drink_names(session, unresolved_names) if unresolved_names else {}
+    for log in logs:
+        if log.drink_id is None:
+            log.drink_id = resolved.get(log.name)
+
+    # Ingredients for every referenced drink in one query
+    drink_ids = {log.drink_id for log in logs if log.drink_id is not None}
+    ingredients = {}
+    if drink_ids:
+        for drink_id, ingredients_json in session.exec(select(Drink.drink_id, Drink.ingredients_json).where(Drink.drink_id.in_(drink_ids))).all():
+            ingredients[drink_id] = ingredients_json if isinstance(ingredients_json, list) else []
+
+    user_ids = {log.user_id for log in logs}
+    users = {u.user_id: u for u in session.exec(select(User).where(User.user_id.in_(user_ids))).all()}
+    now = datetime.utcnow()
+    for user_id in user_ids - users.keys():
+        users[user_id] = User(user_id=user_id, first_seen_at=now, last_seen_at=now)
+        session.add(users[user_id])
+
+    session.add_all(logs)
+    record_logs(session, logs, {user_id: user.timezone for user_id, user in users.items()})
+
+    by_user = {}
+    for log in sorted(logs, key=lambda l: l.timestamp):
+        if log.drink_id is not None and ingredients.get(log.drink_id):
+            by_user.setdefault(log.user_id, []).append(ingredients[log.drink_id])
+    for user_id, ingredient_lists in by_user.items():
+        user = users[user_id]
+        user.prefs = replay_prefs_updates(user.prefs, ingredient_lists, decay=decay, norm=norm)
+        session.add(user)
+
+    return {
+        "inserted": len(logs),
+        "users_updated": len(by_user),
+        "unresolved": sorted({log.name for log in logs if log.drink_id is None})
+    }
+
 def log_user_drink(user_id: int, drink_id: Optional[int], name: str, quantity: Optional[float], units: Optional[str]) -> UserDrinkLog:
     with Session(engine) as session:
         log = UserDrinkLog(user_id=user_id, drink_id=drink_id, name=name, quantity=quantity, units=units)
         session.add(log)
+        record_logs(session, [log])
         session.commit()
         session.refresh(log)
+        autocomplete_index.record_log(drink_id)
         return log
 
 
@@ -136,6 +233,45 @@ def parse_measure_amount(measure: str) -> float:
 
 
 
+# Millilitres per unit; "part" is resolved relative to the other measures
+MEASURE_UNITS_ML = {
+    "oz": 29.57, "ounce": 29.57, "cl": 10.0, "ml": 1.0, "dl": 100.0, "l": 1000.0,
+    "tsp": 4.93, "teaspoon": 4.93, "tblsp": 14.79, "tbsp": 14.79, "tablespoon": 14.79,
+    "dash": 0.92, "drop": 0.05, "splash": 5.9, "shot": 44.36, "jigger": 44.36,
+    "cup": 236.6, "pint": 473.2, "qt": 946.4, "quart": 946.4, "gal": 3785.4,
+    "fifth": 757.0, "bottle": 750.0, "can": 355.0, "scoop": 60.0, "pinch": 0.3,
+    "part": None,
+}
+# Garnishes count, but only a little
+GARNISH_UNITS = {"twist", "slice", "wedge", "sprig", "cube", "piece", "leaf", "leave", "peel", "garnish"}
+GARNISH_ML = 2.0
+PART_ML = MEASURE_UNITS_ML["oz"]  # A "part" next to absolute measures is read as 1 oz
+
+# Units may follow the number directly ("4cl", "1.5oz"), so no \b before them
+_UNIT_PATTERN = re.compile(r"(?<![a-z])(" + "|".join(sorted(list(MEASURE_UNITS_ML) + list(GARNISH_UNITS), key=len, reverse=True)) + r")(?:e?s)?\b")
+
+def parse_measure_volume(measure: str):
+    """
+    Parse a measure string like '1 1/2 oz', '2-3 dashes' or '2 parts' into a volume.
+    Returns (amount_ml, is_part) where is_part marks relative "parts" (amount in parts),
+    or (None, False) when the measure has no recognizable unit (e.g. 'Fill with', '1').
+    """
+    if not measure or not measure.strip():
+        return None, False
+    text = measure.strip().lower()
+    match = _UNIT_PATTERN.search(text)
+    if not match:
+        return None, False
+    unit = match.group(1)
+    # Ranges like '2-3' use the lower bound; amount defaults to 1 ('dash of bitters')
+    number_text = re.sub(r"(\d)\s*-\s*[\d/\.]+", r"\1", text[:match.start()])
+    amount = parse_measure_amount(number_text) or 1.0
+    if unit in GARNISH_UNITS:
+        return amount * GARNISH_ML, False
+    if MEASURE_UNITS_ML[unit] is None:
+        return amount, True
+    return amount * MEASURE_UNITS_ML[unit], False
+
 def get_user_drink_history(user_id: int) -> List[str]:
     """
     Get list of drink names that a user has logged.
@@ -144,11 +280,28 @@ def get_user_drink_history(user_id: int) -> List[str]:
         user_id: The user's ID
         
     Returns:
-        List of drink names the user has consumed
+        List of drink names the user has consumed (one entry per log, including rolled-up logs)
     """
     with Session(engine) as session:
-        logs = session.exec(select(UserDrinkLog).where(UserDrinkLog.user_id == user_id)).all()
-        return [log.name for log in logs]
+        names = list(session.exec(select(UserDrinkLog.name).where(UserDrinkLog.user_id == user_id)).all())
+        for name, logs in session.exec(select(UserDrinkLogRollup.name, UserDrinkLogRollup.logs).where(UserDrinkLogRollup.user_id == user_id)).all():
+            names.extend([name] * logs)
+        return names
+
+def popular_suggestion(fields: dict) -> dict:
+    """Suggestion dict for a popular drink from Drink column values (a local row or format_drink_for_db output)"""
+    return {
+        "name": fields['name'],
+        "category": fields['category'],
+        "alcoholic": fields['alcoholic'],
+        "glass": fields['glass'],
+        "instructions": fields['instructions'],
+        "ingredients": fields['ingredients_json'],
+        "measures": fields['measures_json'],
+        "image_url": fields['image_url'],
+        "similarity_score": 1.0,  # Popular drink, high score
+        "reason": "Popular drink you haven't tried yet!"
+    }
 
 def get_popular_drink_not_tried(user_id: int) -> Optional[dict]:
     """
@@ -174,30 +327,20 @@ def get_popular_drink_not_tried(user_id: int) -> Optional[dict]:
             print("No popular cocktails found")
             return None
         
-        # Find first popular drink user hasn't tried
-        for drink_data in response['drinks']:
-            drink_name = drink_data.get('strDrink', '')
-            if drink_name and drink_name not in user_drinks:
-                print(f"Found popular drink user hasn't tried: {drink_name}")
-                
-                # Get full drink details
-                full_drink = cocktail_api.lookup_cocktail_by_id(drink_data['idDrink'])
-                if full_drink.get('drinks'):
-                    drink_detail = full_drink['drinks'][0]
-                    formatted_data = cocktail_api.format_drink_for_db(drink_detail)
-                    
-                    return {
-                        "name": formatted_data['name'],
-                        "category": formatted_data['category'],
-                        "alcoholic": formatted_data['alcoholic'],
-                        "glass": formatted_data['glass'],
-                        "instructions": formatted_data['instructions'],
-                        "ingredients": formatted_data['ingredients_json'],
-                        "measures": formatted_data['measures_json'],
-                        "image_url": formatted_data['image_url'],
-                        "similarity_score": 1.0,  # Popular drink, high score
-                        "reason": "Popular drink you haven't tried yet!"
-                    }
+        # Untried popular drinks in rank order; hydrate every candidate from the local
+        # catalog in one query and only call the API for ones not stored yet
+        candidates = [d for d in response['drinks'] if d.get('strDrink') and d['strDrink'] not in user_drinks]
+        with Session(engine) as session:
+            local = hydrate_drinks_by_cocktail_db_id(session, [d.get('idDrink') for d in candidates])
+        for drink_data in candidates:
+            print(f"Found popular drink user hasn't tried: {drink_data['strDrink']}")
+            row = local.get(drink_data.get('idDrink'))
+            if row is not None:
+                return popular_suggestion(row._mapping)
+            # Get full drink details
+            full_drink = cocktail_api.lookup_cocktail_by_id(drink_data['idDrink'])
+            if full_drink.get('drinks'):
+                return popular_suggestion(cocktail_api.format_drink_for_db(full_drink['drinks'][0]))
         
         print("User has tried all popular drinks")
         return None
@@ -0,0 +1,153 @@
+"""
+Process pool for CPU-bound recommendation and matching work.
+The bot runs in one process, so KNN scoring and fuzzy name matching would
+otherwise hold the GIL and serialize every guild. Each worker maps the
+shared columnar catalog (backend/columnar_catalog.py), loads the alias map, keeps
+both current through the catalog version, and answers small requests with small
+results (ids and scores, never ORM objects); the caller hydrates rows.
+
+    await worker_pool.suggest(prefs, k, logged_names)    # [(drink_id, similarity), ...]
+    await worker_pool.match_drink_name("margerita")     # (drink_id, score) or None
+
+Size with WORKER_POOL_SIZE (default: CPU count; 0 runs the same code on a thread instead).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import process, fuzz
+from sqlmodel import Session
+from .database import engine
+from .index_sync import VersionedIndex
+from .columnar_catalog import ColumnarCatalog, attach_catalog
+
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(os.cpu_count() or 1)))
+FUZZY_THRESHOLD = 70
+
+
+class _WorkerCatalog(VersionedIndex):
+    """Per-worker view of the shared columnar catalog plus the alias map and fuzzy-match names"""
+
+    def __init__(self):
+        super().__init__()
+        self.catalog: Optional[ColumnarCatalog] = None
+        self.alias_map: Dict[str, int] = {}
+        self.match_names: List[str] = []  # Names eligible for fuzzy matching
+        self.match_ids: List[int] = []
+
+    def _load_from_database(self) -> None:
+        from .ingredients import load_alias_map
+        # Every worker maps the same file, so adding workers does not add catalog copies
+        catalog = attach_catalog()
+        with Session(engine) as session:
+            alias_map = load_alias_map(session)
+        named = [(d, n) for d, n in zip(catalog.drink_ids.tolist(), catalog.names) if n and len(n.strip()) > 2]
+        self.catalog, self.alias_map = catalog, alias_map
+        self.match_ids = [d for d, _ in named]
+        self.match_names = [n for _, n in named]
+
+    def ensure_current(self) -> None:
+        if self.version is None:
+            self.rebuild_index_from_database()
+        else:
+            self.refresh_if_stale()
+
+
+_catalog = _WorkerCatalog()
+
+
+def _init_worker() -> None:
+    """Pool initializer: quiet SQL logging and attach the catalog before the first task"""
+    engine.echo = False
+    _catalog.ensure_current()
+
+
+def _ping(_=None) -> int:
+    return os.getpid()
+
+
+def _suggest_task(user_weights: dict, k: int, logged_names: List[str], use_volume_weights: bool) -> List[Tuple[int, float]]:
+    """Cosine top-k over the catalog's CSR arrays (same ranking as suggest_drink)"""
+    from .ingredients import canonical_weight_vector
+    _catalog.ensure_current()
+    user_vector = canonical_weight_vector(user_weights, _catalog.alias_map)
+    return _catalog.catalog.top_k(user_vector, k, use_volume_weights, logged_names)
+
+
+def _match_task(name: str, threshold: int) -> Optional[Tuple[int, float]]:
+    _catalog.ensure_current()
+    if not _catalog.match_names:
+        return None
+    match = process.extractOne(name, _catalog.match_names, scorer=fuzz.token_sort_ratio)
+    if match and match[1] >= threshold:
+        return _catalog.match_ids[match[2]], float(match[1])
+    return None
+
+
+class WorkerPool:
+    """
+    Lazily started ProcessPoolExecutor (spawn context, so workers never inherit the
+    parent's SQLite connections). A crashed worker breaks the pool; the pool is then
+    recreated and the request retried once.
+    """
+
+    def __init__(self, size: int = WORKER_POOL_SIZE):
+        self.size = size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.size <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    def warm_up(self) -> float:
+        """Start every worker and load its catalog now instead of on the first command"""
+        started = time.perf_counter()
+        executor = self._ensure_executor()
+        if executor is None:
+            _catalog.ensure_current()
+        else:
+            list(executor.map(_ping, range(self.size)))
+        return time.perf_counter() - started
+
+    def restart(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._ensure_executor()
+            try:
+                # size 0: still keep the event loop free by using the default thread pool
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                self.restart()
+                if attempt:
+                    raise
+
+    async def suggest(self, user_weights: dict, k: int = 1, logged_names: Optional[List[str]] = None, use_volume_weights: bool = True) -> List[Tuple[int, float]]:
+        return await self._submit(_suggest_task, user_weights or {}, k, list(logged_names or []), use_volume_weights)
+
+    async def match_drink_name(self, name: str, threshold: int = FUZZY_THRESHOLD) -> Optional[Tuple[int, float]]:
+        return await self._submit(_match_task, name, threshold)
+
+
+# Global instance used by the bot
+worker_pool = WorkerPool()
@@ -0,0 +1,338 @@
+"""
+Write-behind pipeline for drink logs.
+!drink appends its log to a local journal (fsynced) and replies; a background
+flusher group-commits everything journaled since the last flush in one SQLite
+transaction: log inserts, consumption aggregates, and one EMA replay per user
+(bulk_log_user_drinks), so a busy night is a few large transactions instead of
+one small one per command.
+
+The journal is a directory of numbered JSONL segments. A flush seals the active
+segment, applies every sealed segment and records the highest applied segment
+number in DatabaseMetadata in the same transaction, then deletes the files. After
+a crash, recover() re-applies whatever is left; segments the database already
+recorded are skipped, so each log is written exactly once.
+
+    await log_queue.enqueue_log(user_id, drink_id, name, quantity)
+    await log_queue.flush_user(user_id)   # before reading that user's logs/prefs
+
+Configure with LOG_JOURNAL_DIR, LOG_FLUSH_INTERVAL (seconds; 0 writes through),
+LOG_FLUSH_MAX_PENDING (flush early past this many entries) and LOG_JOURNAL_FSYNC.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from sqlmodel import Session, select
+from .models import User, UserDrinkLog, DatabaseMetadata
+from .database import engine
+from .autocomplete import autocomplete_index
+
+LOG_JOURNAL_DIR = os.getenv("LOG_JOURNAL_DIR", "log_journal")
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_FLUSH_MAX_PENDING = int(os.getenv("LOG_FLUSH_MAX_PENDING", "500"))
+LOG_JOURNAL_FSYNC = os.getenv("LOG_JOURNAL_FSYNC", "1") != "0"
+# DatabaseMetadata key: highest journal segment committed to the database
+LOG_JOURNAL_APPLIED_KEY = "log_journal_applied_segment"
+
+_SEGMENT_PATTERN = re.compile(r"segment-(\d+)\.jsonl$")
+
+
+class LogJournal:
+    """Append-only JSONL segments; only the highest-numbered segment is written to"""
+
+    def __init__(self, directory: str = LOG_JOURNAL_DIR, fsync: bool = LOG_JOURNAL_FSYNC):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._active: Optional[int] = None
+        self._active_entries = 0
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:08d}.jsonl")
+
+    def segments(self) -> List[int]:
+        numbers = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.jsonl")):
+            match = _SEGMENT_PATTERN.search(path)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def open(self, floor: int = 0) -> None:
+        """Start a fresh active segment numbered above every existing one and above floor"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._active = max(self.segments() + [floor]) + 1
+            self._file = open(self._path(self._active), "a", encoding="utf-8")
+            self._active_entries = 0
+
+    def append(self, entries: List[dict]) -> None:
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._active_entries += len(entries)
+
+    def seal(self) -> None:
+        """Close the active segment (if it has entries) and continue in a new one"""
+        with self._lock:
+            if self._file is None or not self._active_entries:
+                return
+            self._file.close()
+            self._active += 1
+            self._file = open(self._path(self._active), "a", encoding="utf-8")
+            self._active_entries = 0
+
+    def sealed(self) -> List[int]:
+        return [n for n in self.segments() if n != self._active]
+
+    def read(self, segment: int) -> List[dict]:
+        entries = []
+        with open(self._path(segment), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-append; the command never got its reply
+                    print(f"Skipping unreadable journal line in segment {segment}")
+        return entries
+
+    def remove(self, segment: int) -> None:
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._active is not None and not self._active_entries:
+                self.remove(self._active)
+            self._active = None
+
+
+def _applied_segment(session) -> int:
+    value = session.exec(select(DatabaseMetadata.value).where(DatabaseMetadata.key == LOG_JOURNAL_APPLIED_KEY)).first()
+    return int(value) if value else 0
+
+
+def _set_applied_segment(session, segment: int) -> None:
+    row = session.exec(select(DatabaseMetadata).where(DatabaseMetadata.key == LOG_JOURNAL_APPLIED_KEY)).first()
+    if row is None:
+        row = DatabaseMetadata(key=LOG_JOURNAL_APPLIED_KEY, value=str(segment))
+    else:
+        row.value = str(segment)
+        row.updated_at = datetime.utcnow()
+    session.add(row)
+
+
+def _touch_users(session, last_seen: Dict[int, datetime]) -> None:
+    """Create missing users and move last_seen_at forward"""
+    users = {u.user_id: u for u in session.exec(select(User).where(User.user_id.in_(last_seen.keys()))).all()}
+    for user_id, seen_at in last_seen.items():
+        user = users.get(user_id)
+        if user is None:
+            session.add(User(user_id=user_id, first_seen_at=seen_at, last_seen_at=seen_at))
+        elif user.last_seen_at is None or user.last_seen_at < seen_at:
+            user.last_seen_at = seen_at
+            session.add(user)
+
+
+def apply_journal_entries(session, entries: List[dict]) -> List[UserDrinkLog]:
+    """Write journal entries in the caller's transaction (the caller commits). Returns the new logs."""
+    from .utils import bulk_log_user_drinks  # utils imports most of the backend
+    last_seen: Dict[int, datetime] = {}
+    logs = []
+    for entry in entries:
+        timestamp = datetime.fromisoformat(entry["timestamp"])
+        last_seen[entry["user_id"]] = max(last_seen.get(entry["user_id"], timestamp), timestamp)
+        if entry.get("kind", "log") == "log":
+            logs.append(UserDrinkLog(
+                user_id=entry["user_id"], drink_id=entry["drink_id"], name=entry["name"],
+                quantity=entry.get("quantity"), units=entry.get("units"), timestamp=timestamp
+            ))
+    if last_seen:
+        _touch_users(session, last_seen)
+    if logs:
+        bulk_log_user_drinks(session, logs)
+    return logs
+
+
+def flush_journal(journal: LogJournal) -> int:
+    """
+    Apply every sealed segment in one transaction and delete them.
+    Segments at or below the recorded applied number were committed before a crash
+    and are only deleted. Returns the number of entries written.
+    """
+    segments = journal.sealed()
+    if not segments:
+        return 0
+    with Session(engine) as session:
+        applied = _applied_segment(session)
+        pending = [n for n in segments if n > applied]
+        entries = [entry for n in pending for entry in journal.read(n)]
+        logs = apply_journal_entries(session, entries)
+        if pending:
+            _set_applied_segment(session, pending[-1])
+        drink_ids = [log.drink_id for log in logs]
+        session.commit()
+    for drink_id in drink_ids:
+        autocomplete_index.record_log(drink_id)
+    for n in segments:
+        journal.remove(n)
+    return len(entries)
+
+
+class WriteBehindQueue:
+    """Journal + periodic group-commit flusher running on the bot's event loop"""
+
+    def __init__(self, directory: str = LOG_JOURNAL_DIR, interval: float = LOG_FLUSH_INTERVAL,
+                 max_pending: int = LOG_FLUSH_MAX_PENDING):
+        self.journal = LogJournal(directory)
+        self.interval = interval
+        self.max_pending = max_pending
+        self.stats = {"enqueued": 0, "flushed": 0, "flushes": 0, "largest_flush": 0}
+        self._pending_users: Set[int] = set()
+        self._flushing_users: Set[int] = set()  # sealed by the running flush, not yet committed
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._opened = False
+
+    def recover(self) -> int:
+        """
+        Apply everything left in the journal by a previous run and open a fresh segment
+        (call before serving). Returns the number of entries written.
+        """
+        self.journal.close()
+        # Every existing segment is sealed while no active segment is open
+        written = flush_journal(self.journal)
+        if written:
+            print(f"Recovered {written} journaled drink logs")
+        with Session(engine) as session:
+            applied = _applied_segment(session)
+        # New segment numbers must stay above the recorded one even if the directory was wiped
+        self.journal.open(floor=applied)
+        self._opened = True
+        self._pending_users.clear()
+        self._flushing_users.clear()
+        self._pending = 0
+        return written
+
+    def drain(self) -> int:
+        """
+        Write everything still journaled once the event loop has stopped, leaving the
+        journal closed (no new segment). Returns the number of entries written.
+        """
+        self.journal.close()
+        self._opened = False
+        written = flush_journal(self.journal)
+        self._pending_users.clear()
+        self._flushing_users.clear()
+        self._pending = 0
+        return written
+
+    def _ensure_started(self) -> None:
+        if not self._opened:
+            self.recover()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _enqueue(self, entry: dict) -> None:
+        self._ensure_started()
+        await asyncio.get_running_loop().run_in_executor(None, self.journal.append, [entry])
+        self.stats["enqueued"] += 1
+        self._pending += 1
+        self._pending_users.add(entry["user_id"])
+        if self.interval <= 0:
+            await self.flush()
+        elif self._pending >= self.max_pending:
+            self._wakeup.set()
+
+    async def enqueue_log(self, user_id: int, drink_id: Optional[int], name: str, quantity: Optional[float],
+                          units: Optional[str] = None, timestamp: Optional[datetime] = None) -> UserDrinkLog:
+        """Journal a drink log; returns the (not yet inserted) log"""
+        timestamp = timestamp or datetime.utcnow()
+        await self._enqueue({
+            "kind": "log", "user_id": user_id, "drink_id": drink_id, "name": name,
+            "quantity": quantity, "units": units, "timestamp": timestamp.isoformat()
+        })
+        return UserDrinkLog(user_id=user_id, drink_id=drink_id, name=name, quantity=quantity, units=units, timestamp=timestamp)
+
+    async def enqueue_seen(self, user_id: int, timestamp: Optional[datetime] = None) -> None:
+        """Journal a user visit (creates the user / bumps last_seen_at) without a log"""
+        await self._enqueue({"kind": "seen", "user_id": user_id, "timestamp": (timestamp or datetime.utcnow()).isoformat()})
+
+    async def flush(self) -> int:
+        """Group-commit everything journaled so far. Returns the number of entries written."""
+        if not self._opened or self._flush_lock is None:
+            return 0
+        async with self._flush_lock:
+            # Users stay visible as unflushed until their segment has committed
+            self._flushing_users, self._pending_users = self._pending_users, set()
+            self._pending = 0
+            self.journal.seal()
+            try:
+                written = await asyncio.get_running_loop().run_in_executor(None, flush_journal, self.journal)
+            except Exception:
+                # Still journaled; the next flush (or recover) retries
+                self._pending_users |= self._flushing_users
+                raise
+            finally:
+                self._flushing_users = set()
+        if written:
+            self.stats["flushed"] += written
+            self.stats["flushes"] += 1
+            self.stats["largest_flush"] = max(self.stats["largest_flush"], written)
+        return written
+
+    async def flush_user(self, user_id: int) -> None:
+        """Read-your-writes: return once every entry this user journaled is in the database"""
+        if user_id in self._pending_users:
+            await self.flush()
+        elif user_id in self._flushing_users:
+            # Already sealed: wait for the running flush to commit
+            async with self._flush_lock:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval if self.interval > 0 else None)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Drink log flush failed, will retry: {e}")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out everything pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self.journal.close()
+        self._opened = False
+
+
+# Global instance used by the bot
+log_queue = WriteBehindQueue()
@@ -0,0 +1,266 @@
+"""
+End-to-end load test for the Discord bot without Discord.
+Synthetic users send a weighted mix of !drink, !suggestdrink, !howto and !adddrink
+through bot_core.message_handler against a throwaway copy of a seeded database.
+Reports per-command throughput and p50/p95/p99, plus event-loop lag (how late a
+10 ms ticker wakes up, i.e. how long handlers block the loop):
+
+    python bot_loadtest.py                      # exits 1 on regression against bot_baseline.json
+    python bot_loadtest.py --update-baseline    # accept this run as the new baseline
+
+The first run on a machine without bot_baseline.json writes it instead of comparing.
+A run where more than --max-error-rate of a command's replies are "Error: ..." fails
+(and is never saved as the baseline): its timings would measure the error paths.
+Baselines are only comparable on the same hardware and settings (--users, --duration,
+--think, --seed), so refresh the committed one when those change.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# (command, weight)
+COMMAND_MIX = [("!drink", 45), ("!suggestdrink", 25), ("!howto", 20), ("!adddrink", 10)]
+USER_ID_BASE = 900_000_000_000  # Far above real Discord ids in the test database
+LAG_INTERVAL = 0.01
+TYPO_RATE = 0.1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot_baseline.json")
+
+
+class FakeAuthor:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.display_name = f"loadtest-{user_id - USER_ID_BASE}"
+        self.bot = False
+
+
+class FakeChannel:
+    def __init__(self):
+        self.replies = []
+
+    async def send(self, content=None, embed=None):
+        self.replies.append(content if content is not None else embed)
+
+
+class FakeMessage:
+    def __init__(self, content: str, author: FakeAuthor):
+        self.content = content
+        self.author = author
+        self.channel = FakeChannel()
+
+
+def add_typo(name: str, rng: random.Random) -> str:
+    """Swap two adjacent letters; a dropped letter too often leaves a prefix that names another drink"""
+    spots = [i for i in range(1, len(name) - 2) if name[i].isalpha() and name[i + 1].isalpha()]
+    if not spots:
+        return name
+    i = rng.choice(spots)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def random_drink_name(rng: random.Random) -> str:
+    """Two random letter words: unlike each other and the catalog, so !adddrink inserts instead of hitting the similar-name check"""
+    return " ".join(
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 9))).capitalize()
+        for _ in range(2)
+    )
+
+
+def build_command(command: str, names: List[str], ingredients: List[str], rng: random.Random) -> str:
+    if command == "!drink":
+        name = rng.choice(names)
+        if rng.random() < TYPO_RATE:
+            name = add_typo(name, rng)
+        return f'!drink "{name}" qty:{rng.randint(1, 2)}'
+    if command == "!howto":
+        return f'!howto "{rng.choice(names)}"'
+    if command == "!suggestdrink":
+        return f"!suggestdrink {rng.randint(1, 3)}"
+    picked = rng.sample(ingredients, k=min(len(ingredients), rng.randint(2, 4)))
+    measures = ", ".join(f"{rng.choice(['1', '1 1/2', '2'])} oz" for _ in picked)
+    return f'!adddrink "{random_drink_name(rng)}" | {", ".join(picked)} | {measures}'
+
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_load(users: int, duration: float, think: float, seed: int = 0) -> dict:
+    from sqlmodel import Session, select
+    from backend.database import engine
+    from backend.models import Drink, Ingredient
+    from backend.loadtest import summarize, percentile
+    from backend.write_behind import log_queue
+    from bot_core import message_handler
+    from utils.command_utils import normalize_quotes
+
+    with Session(engine) as session:
+        names = [n for n in session.exec(select(Drink.name).where(Drink.cocktail_db_id.is_not(None))).all() if n]
+        ingredients = list(session.exec(select(Ingredient.name)).all())
+    # The command parser reads an apostrophe as a closing quote ("Bee's Knees" -> "Bee")
+    names = [n for n in names if '"' not in normalize_quotes(n)]
+    if not names or not ingredients:
+        raise SystemExit("The database has no catalog; seed it first (update_database or a snapshot)")
+
+    rng = random.Random(seed)
+    commands = [c for c, _ in COMMAND_MIX]
+    weights = [w for _, w in COMMAND_MIX]
+    latencies: Dict[str, List[float]] = {c: [] for c in commands}
+    errors: Dict[str, int] = {}
+    error_replies: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def user(user_id: int):
+        author = FakeAuthor(user_id)
+        # Log a drink first so !suggestdrink has history instead of replying with an error
+        command = "!drink"
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.expovariate(1.0 / think) if think > 0 else 0)
+            message = FakeMessage(build_command(command, names, ingredients, rng), author)
+            started = time.perf_counter()
+            try:
+                await message_handler(message)
+            except Exception:
+                errors[command] = errors.get(command, 0) + 1
+            latencies[command].append(time.perf_counter() - started)
+            if any(isinstance(r, str) and r.startswith("Error:") for r in message.channel.replies):
+                error_replies[command] = error_replies.get(command, 0) + 1
+            command = rng.choices(commands, weights)[0]
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(user(USER_ID_BASE + i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    # Write what is still journaled; outside the timed window
+    await log_queue.stop()
+
+    report = summarize(latencies, errors, elapsed)
+    for command, stats in report["routes"].items():
+        stats["error_replies"] = error_replies.get(command, 0)
+    lag.sort()
+    report["loop_lag"] = {
+        "p50_ms": percentile(lag, 50) * 1000,
+        "p99_ms": percentile(lag, 99) * 1000,
+        "max_ms": (lag[-1] if lag else 0.0) * 1000,
+    }
+    report["write_behind"] = dict(log_queue.stats)
+    report["config"] = {"users": users, "duration": duration, "think": think, "seed": seed}
+    return report
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float, slack_ms: float) -> List[str]:
+    """Commands (and totals) whose p95 or throughput got worse than baseline beyond tolerance"""
+    problems = []
+    rows = list(report["routes"].items()) + [("TOTAL", report["total"])]
+    for name, stats in rows:
+        base = baseline["total"] if name == "TOTAL" else baseline["routes"].get(name)
+        if not base or not stats["requests"]:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance) + slack_ms:
+            problems.append(f"{name}: p95 {stats['p95_ms']:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+        if stats["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: {stats['rps']:.1f} req/s vs baseline {base['rps']:.1f} req/s")
+    base_lag = baseline.get("loop_lag")
+    if base_lag and report["loop_lag"]["p99_ms"] > base_lag["p99_ms"] * (1 + tolerance) + slack_ms:
+        problems.append(f"loop lag p99 {report['loop_lag']['p99_ms']:.1f} ms vs baseline {base_lag['p99_ms']:.1f} ms")
+    return problems
+
+
+def find_error_replies(report: dict, max_error_rate: float) -> List[str]:
+    """Commands answering "Error: ..." too often; the timings of a run like that measure the wrong paths"""
+    problems = []
+    for name, stats in report["routes"].items():
+        if stats["requests"] and stats["error_replies"] > stats["requests"] * max_error_rate:
+            problems.append(f"{name}: {stats['error_replies']} of {stats['requests']} requests got an error reply")
+    return problems
+
+
+def prepare_database(source: str) -> str:
+    """Copy the seeded database into a temp dir and run from there so the source is never written"""
+    workdir = tempfile.mkdtemp(prefix="bot_loadtest_")
+    if os.path.exists(source):
+        shutil.copy(source, os.path.join(workdir, "database.db"))
+    os.chdir(workdir)
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Discord bot with synthetic users")
+    parser.add_argument("--database", default="database.db", help="Seeded database to copy (never modified)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--think", type=float, default=0.2, help="Mean seconds between a user's commands")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Also write the report as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON report; exit 1 if this run regresses (written if missing)")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with this run instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Allowed absolute p95/lag regression")
+    parser.add_argument("--max-error-rate", type=float, default=0.02, help="Allowed share of error replies per command")
+    args = parser.parse_args()
+
+    source = os.path.abspath(args.database)
+    save = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.baseline)
+    baseline = None
+    if os.path.exists(baseline_path) and not args.update_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = prepare_database(source)
+
+    # The engines open ./database.db, so import the backend only after chdir
+    from backend import database
+    database.engine.echo = False
+    database.async_engine.echo = False
+    # Same migrations as bot startup; an empty database is seeded from catalog_snapshot.bin
+    database.update_database(sync_cocktaildb=False)
+    from backend.loadtest import print_report
+    from backend.worker_pool import worker_pool
+    from backend.write_behind import log_queue
+    log_queue.recover()
+    print(f"Worker pool ({worker_pool.size} processes) warm in {worker_pool.warm_up():.2f}s")
+
+    try:
+        report = asyncio.run(run_load(args.users, args.duration, args.think, args.seed))
+    finally:
+        worker_pool.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report, "bot", baseline)
+    lag = report["loop_lag"]
+    print(f"event loop lag: p50 {lag['p50_ms']:.1f} ms  p99 {lag['p99_ms']:.1f} ms  max {lag['max_ms']:.1f} ms")
+    writes = report["write_behind"]
+    print(f"write-behind: {writes['flushed']} entries in {writes['flushes']} group commits (largest {writes['largest_flush']})")
+    if save:
+        with open(save, "w") as f:
+            json.dump(report, f, indent=2)
+    problems = find_error_replies(report, args.max_error_rate)
+    if baseline is None and not problems:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved this run as the baseline: {baseline_path}")
+    elif baseline is not None:
+        problems += find_regressions(report, baseline, args.tolerance, args.slack_ms)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 import backend.utils as backend_utils
-from backend.ml_utils import update_user_prefs
-from backend.utils import get_or_create_drink_by_name
+from backend.utils import get_or_create_drink_by_name, add_new_drinks_to_indexes
 from backend.database import engine
+from backend.models import Drink, User
+from backend.write_behind import log_queue
+from backend.pantry_index import find_makeable_drinks
+from backend.search import search_drinks_local
+from backend.autocomplete import autocomplete_index, suggest_drink_names
+from backend.worker_pool import worker_pool
 from sqlmodel import Session
 
-def process_drink_logging_workflow(drink_name, qty, user_id):
+async def process_drink_logging_workflow(drink_name, qty, user_id):
     """
     Process the complete drink logging workflow
+    Resolves the drink without touching the database (autocomplete index, then fuzzy
+    matching in the worker pool), reads the drink row, and journals the log. The log
+    insert, aggregates and preference update are group-committed by the write-behind
+    flusher (backend/write_behind.py), so the reply does not wait for a SQLite write.
     
     Args:
         drink_name: Name of the drink to log
@@ -14,38 +23,29 @@ def process_drink_logging_workflow(drink_name, qty, user_id):
         user_id: Discord user ID
         
     Returns:
-        tuple: (user, drink, log) objects
+        tuple: (user, drink, log); user and log are not yet in the database;
+        drink and log are None if no drink matched
     """
-    # Upsert user
-    user = backend_utils.upsert_user(user_id)
-    
     # Find drink (never create)
-    drink = backend_utils.find_drink_by_name(drink_name)
+    drink_id = autocomplete_index.lookup(drink_name)
+    if drink_id is None:
+        match = await worker_pool.match_drink_name(drink_name)
+        drink_id = match[0] if match else None
+    
+    drink = None
+    if drink_id is not None:
+        with Session(engine) as session:
+            drink = session.get(Drink, drink_id)
+    
+    # The flusher creates the user if needed and bumps last_seen_at either way
+    user = User(user_id=user_id)
     if not drink:
+        await log_queue.enqueue_seen(user_id)
         return user, None, None
     
-    # Log drink
-    log = backend_utils.log_user_drink(
-        user_id=user.user_id,
-        drink_id=drink.drink_id,
-        name=drink.name,
-        quantity=qty,
-        units=None
-    )
-    
+    log = await log_queue.enqueue_log(user_id, drink.drink_id, drink.name, qty)
     return user, drink, log
 
-def update_user_preferences_workflow(user_id, drink):
-    """
-    Update user preferences based on consumed drink
-    
-    Args:
-        user_id: User ID
-        drink: Drink object with ingredients
-    """
-    if drink.ingredients_json:
-        update_user_prefs(user_id, drink.ingredients_json, drink.measures_json)
-
 def get_drink_by_name_from_db(drink_name):
     """
     Get drink from database by name
@@ -59,5 +59,46 @@ def get_drink_by_name_from_db(drink_name):
     with Session(engine) as session:
         drink = get_or_create_drink_by_name(session, drink_name)
         session.commit()
+        add_new_drinks_to_indexes(session)
         session.refresh(drink)
-        return drink 
\ No newline at end of file
+        return drink 
+
+def get_makeable_drinks_workflow(pantry, max_missing=1, limit=20):
+    """
+    Find drinks that can be made from a list of pantry ingredients
+    
+    Args:
+        pantry: List of ingredient names
+        max_missing: Maximum number of missing ingredients for near misses
+        limit: Maximum number of drinks returned
+        
+    Returns:
+        dict: {'makeable': [...], 'almost': [...], 'unknown_ingredients': [...]}
+    """
+    return find_makeable_drinks(pantry, max_missing=max_missing, limit=limit)
+
+def search_drinks_workflow(query, limit=5):
+    """
+    Full-text search the local drink catalog
+    
+    Args:
+        query: Free-text query (e.g. "mint stirred")
+        limit: Maximum number of results
+        
+    Returns:
+        List of dicts with drink_id, name, score and snippet
+    """
+    return search_drinks_local(query, limit=limit)
+
+def get_drink_name_hints_workflow(drink_name, limit=3):
+    """
+    "Did you mean" hints for a drink name that did not resolve
+    
+    Args:
+        drink_name: Name the user typed
+        limit: Maximum number of hints
+        
+    Returns:
+        List of drink names
+    """
+    return suggest_drink_names(drink_name, limit=limit)
@@ -1,5 +1,22 @@
+import asyncio
 import backend.utils as backend_utils
-from backend.ml_utils import suggest_drink
+from backend.ml_utils import hydrate_suggestions
+from backend.worker_pool import worker_pool
+from backend.stats import get_user_stats
+from backend.database import engine
+from backend.write_behind import log_queue
+from backend.cooccurrence import cooccurrence_suggestions
+from backend.factorization import factor_model, collaborative_suggestions
+from sqlmodel import Session
+
+async def flush_pending_logs_workflow(user_id):
+    """
+    Write the user's journaled !drink logs before reading their history, stats or prefs
+    
+    Args:
+        user_id: Discord user ID
+    """
+    await log_queue.flush_user(user_id)
 
 def get_user_with_history(user_id):
     """
@@ -17,7 +34,7 @@ def get_user_with_history(user_id):
     
     return user, user_drink_history, drink_count
 
-def determine_user_suggestion_strategy(drink_count, user_prefs, k_threshold=1):
+def determine_user_suggestion_strategy(drink_count, user_prefs, k_threshold=1, cooccurrence_threshold=2, collaborative_threshold=5):
     """
     Determine which suggestion strategy to use for a user
     
@@ -25,30 +42,62 @@ def determine_user_suggestion_strategy(drink_count, user_prefs, k_threshold=1):
         drink_count: Number of drinks user has logged
         user_prefs: User preference weights
         k_threshold: Minimum drinks needed for preference-based recommendations
+        cooccurrence_threshold: Minimum drinks needed for "people who drink X also drink Y" recommendations
+        collaborative_threshold: Minimum drinks needed for matrix-factorization recommendations (once a model is trained)
         
     Returns:
-        str: Strategy type ('popular' or 'preference')
+        str: Strategy type ('popular', 'preference', 'cooccurrence' or 'collaborative')
     """
     if drink_count < k_threshold or not user_prefs:
         return 'popular'
+    elif drink_count >= collaborative_threshold and factor_model.available():
+        return 'collaborative'
+    elif drink_count >= cooccurrence_threshold:
+        return 'cooccurrence'
     else:
         return 'preference'
 
-def get_drink_suggestion_workflow(user_id, strategy, k=1):
+async def get_drink_suggestion_workflow(user_id, strategy, k=1):
     """
     Get drink suggestions based on strategy
+    KNN scoring runs in the worker pool so concurrent suggestions use every core
     
     Args:
         user_id: Discord user ID
-        strategy: Strategy type ('popular' or 'preference')
+        strategy: Strategy type ('popular', 'preference', 'cooccurrence' or 'collaborative')
         k: Number of neighbors for KNN (default 1)
         
     Returns:
-        List of up to k drink dicts (if preference), or a single dict (if popular)
+        List of up to k drink dicts (if preference, cooccurrence or collaborative), or a single dict (if popular)
     """
+    loop = asyncio.get_running_loop()
     if strategy == 'popular':
-        return backend_utils.get_popular_drink_not_tried(user_id)
-    else:
-        user = backend_utils.upsert_user(user_id)
-        logged_drinks = backend_utils.get_user_drink_history(user_id)
-        return suggest_drink(user.prefs, k=k, logged_drinks=logged_drinks) 
\ No newline at end of file
+        return await loop.run_in_executor(None, backend_utils.get_popular_drink_not_tried, user_id)
+    suggestions = []
+    if strategy == 'cooccurrence':
+        suggestions = await loop.run_in_executor(None, cooccurrence_suggestions, user_id, k)
+    elif strategy == 'collaborative':
+        # Users who started logging after the last training run are cold and get KNN
+        suggestions = await loop.run_in_executor(None, collaborative_suggestions, user_id, k)
+    if len(suggestions) >= k:
+        return suggestions
+    # Preference KNN (fills the rest when co-occurrence / factors have too few candidates)
+    user = backend_utils.upsert_user(user_id)
+    logged_drinks = backend_utils.get_user_drink_history(user_id) + [s["name"] for s in suggestions]
+    remaining = k - len(suggestions)
+    hits = await worker_pool.suggest(user.prefs, k=remaining, logged_names=logged_drinks)
+    return (suggestions + (hydrate_suggestions(hits, remaining) or [])) or None
+
+def get_user_stats_workflow(user_id):
+    """
+    Get consumption stats for a user from the aggregate tables
+    
+    Args:
+        user_id: Discord user ID
+        
+    Returns:
+        dict: Stats summary (see backend.stats.get_user_stats)
+    """
+    backend_utils.upsert_user(user_id)
+    with Session(engine) as session:
+        return get_user_stats(session, user_id)
@@ -0,0 +1,60 @@
+import discord
+from utils.response_utils import send_usage_response, send_error_response, send_success_response
+from data.drink_processor import get_makeable_drinks_workflow
+
+def format_makeable_lines(entries, limit=10):
+    """
+    Format pantry query hits as one line per drink
+    
+    Args:
+        entries: List of dicts with 'name' and 'missing' keys
+        limit: Maximum number of lines
+        
+    Returns:
+        str: Formatted lines
+    """
+    lines = []
+    for entry in entries[:limit]:
+        if entry['missing']:
+            lines.append(f"{entry['name']} (missing: {', '.join(entry['missing'])})")
+        else:
+            lines.append(entry['name'])
+    return "\n".join(lines)
+
+async def handle_canmake_command(message):
+    """
+    Handle the !canmake command
+    
+    Args:
+        message: Discord message object
+    """
+    try:
+        # Parse comma-separated pantry ingredients after the command
+        pantry = [i.strip() for i in message.content[len("!canmake"):].split(",") if i.strip()]
+        
+        if not pantry:
+            await send_usage_response(message.channel, "Usage: !canmake ingredient1, ingredient2, ...")
+            return
+        
+        result = get_makeable_drinks_workflow(pantry)
+        
+        if not result['makeable'] and not result['almost']:
+            await send_error_response(message.channel, f"No drinks found for: {', '.join(pantry)}")
+            return
+        
+        embed = discord.Embed(
+            title="🍸 What you can make",
+            description=f"With: {', '.join(pantry)}",
+            color=0x88c0ee
+        )
+        if result['makeable']:
+            embed.add_field(name="Ready to make", value=format_makeable_lines(result['makeable']), inline=False)
+        if result['almost']:
+            embed.add_field(name="Missing one ingredient", value=format_makeable_lines(result['almost']), inline=False)
+        if result['unknown_ingredients']:
+            embed.add_field(name="Unknown ingredients", value=", ".join(result['unknown_ingredients']), inline=False)
+        
+        await send_success_response(message.channel, embed)
+        
+    except Exception as e:
+        await send_error_response(message.channel, str(e))
@@ -4,6 +4,12 @@ from handlers.drink_handler import handle_drink_command
 from handlers.suggest_handler import handle_suggest_command
 from handlers.help_handler import handle_help_command
 from handlers.add_drink_handler import handle_add_drink_command
+from handlers.canmake_handler import handle_canmake_command
+from handlers.search_handler import handle_search_command
+from handlers.stats_handler import handle_stats_command
+from handlers.profile_handler import handle_profile_command
+from utils.command_executor import command_executor
+from backend.profiling import profiler
 
 async def route_command(message):
     """
@@ -13,17 +19,31 @@ async def route_command(message):
         message: Discord message object
     """
     content = message.content.lower()
+    handler = None
     
     if content == "!hello":
-        await handle_hello_command(message)
+        handler = handle_hello_command
     elif content.startswith("!howto"):
-        await handle_howto_command(message)
+        handler = handle_howto_command
     elif content.startswith("!drinkhelp"):
-        await handle_help_command(message) 
+        handler = handle_help_command
     elif content.startswith("!adddrink"):
-        await handle_add_drink_command(message)
+        handler = handle_add_drink_command
     elif content.startswith("!drink"):
-        await handle_drink_command(message)
+        handler = handle_drink_command
     elif content.startswith("!suggestdrink"):
-        await handle_suggest_command(message)
-    
\ No newline at end of file
+        handler = handle_suggest_command
+    elif content.startswith("!canmake"):
+        handler = handle_canmake_command
+    elif content.startswith("!search"):
+        handler = handle_search_command
+    elif content.startswith("!stats"):
+        handler = handle_stats_command
+    elif content.startswith("!profile"):
+        handler = handle_profile_command
+    
+    if handler:
+        # Opt-in (PROFILE_MODE or !profile): keeps stack samples of the slowest commands
+        handler = profiler.wrap(handler, content.split(" ", 1)[0], {"content": message.content, "user_id": message.author.id})
+        # Coalesces duplicate in-flight commands and serializes !drink/!adddrink per user
+        await command_executor.execute(message, handler)
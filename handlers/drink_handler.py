@@ -2,7 +2,7 @@ import discord
 from utils.command_utils import parse_quoted_argument, validate_drink_name
 from utils.embed_utils import build_ingredients_text, add_drink_fields_to_embed, add_ingredients_field_to_embed
 from utils.response_utils import send_usage_response, send_error_response, send_success_response
-from data.drink_processor import process_drink_logging_workflow, update_user_preferences_workflow
+from data.drink_processor import process_drink_logging_workflow, get_drink_name_hints_workflow
 
 async def handle_drink_command(message):
     """
@@ -21,20 +21,19 @@ async def handle_drink_command(message):
         
         user_id = message.author.id
         
-        # Process drink logging workflow
-        user, drink, log = process_drink_logging_workflow(drink_name, qty, user_id)
+        # Journal the log; the background flush writes it and updates preferences
+        user, drink, log = await process_drink_logging_workflow(drink_name, qty, user_id)
         
         # If drink has no ingredients, treat as not found
         if not drink or not getattr(drink, 'ingredients_json', None):
+            hints = get_drink_name_hints_workflow(drink_name)
+            hint_text = f" Did you mean {', '.join(f'`{h}`' for h in hints)}?" if hints else ""
             await send_error_response(
                 message.channel,
-                f'No drink found for "{drink_name}". Use `!adddrink "{drink_name}" | Ingredient1,Ingredient2 | Measure1,Measure2` to add it to the database!'
+                f'No drink found for "{drink_name}".{hint_text} Use `!adddrink "{drink_name}" | Ingredient1,Ingredient2 | Measure1,Measure2` to add it to the database!'
             )
             return
         
-        # Update user preferences
-        update_user_preferences_workflow(user.user_id, drink)
-        
         # Build ingredients text
         ingredients_text = build_ingredients_text(drink)
         
@@ -13,6 +13,12 @@ async def handle_help_command(message):
         "The bot uses a KNN (nearest neighbors) algorithm to recommend drinks you haven't logged yet, based on your ingredient preferences.\n\n"
         "**!howto \"Drink Name\"**\n"
         "Get instructions and ingredients for making a specific drink. Example: `!howto \"Old Fashioned\"`\n\n"
+        "**!canmake ingredient1, ingredient2, ...**\n"
+        "List drinks you can make with what you have, plus drinks missing only one ingredient. Example: `!canmake vodka, lime, triple sec`\n\n"
+        "**!search words**\n"
+        "Search drink names, instructions, ingredients and tags. Example: `!search mint stirred`\n\n"
+        "**!stats**\n"
+        "Show your drinks per day and week, streaks and favorite drinks.\n\n"
         "**!drinkhelp**\n"
         "Show this help message.\n\n"
         "**How suggestions work:**\n"
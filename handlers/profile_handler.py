@@ -0,0 +1,40 @@
+import os
+from utils.response_utils import send_error_response
+from backend.profiling import profiler, PROFILE_MODES
+
+# Discord user IDs allowed to switch profiling on and off
+PROFILE_ADMIN_IDS = {int(i) for i in os.getenv("PROFILE_ADMIN_IDS", "").split(",") if i.strip().isdigit()}
+
+async def handle_profile_command(message):
+    """
+    Handle the admin-only !profile command
+    !profile sample|cprofile [rate], !profile off, !profile status
+    
+    Args:
+        message: Discord message object
+    """
+    if message.author.id not in PROFILE_ADMIN_IDS:
+        await send_error_response(message.channel, "Only bot admins can use !profile.")
+        return
+    
+    parts = message.content.strip().split()
+    action = parts[1].lower() if len(parts) > 1 else "status"
+    if action in PROFILE_MODES or action == "off":
+        rate = None
+        if len(parts) > 2:
+            try:
+                rate = float(parts[2])
+            except ValueError:
+                await send_error_response(message.channel, "Sample rate must be a number between 0 and 1.")
+                return
+        profiler.configure(mode=action, sample_rate=rate)
+    elif action != "status":
+        await send_error_response(message.channel, "Usage: `!profile sample|cprofile [rate]`, `!profile off` or `!profile status`")
+        return
+    
+    lines = [
+        f"Profiling: {profiler.mode or 'off'} (sample rate {profiler.sample_rate:g})",
+        f"Profiled {profiler.stats['profiled']} invocations; slowest kept in `{profiler.directory}/`:"
+    ]
+    lines += [f"{duration * 1000:.0f} ms  `{os.path.basename(base)}`" for duration, base in profiler.slowest()[:5]]
+    await message.channel.send("\n".join(lines))
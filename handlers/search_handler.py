@@ -0,0 +1,32 @@
+import discord
+from utils.response_utils import send_usage_response, send_error_response, send_success_response
+from data.drink_processor import search_drinks_workflow
+
+async def handle_search_command(message):
+    """
+    Handle the !search command
+    
+    Args:
+        message: Discord message object
+    """
+    try:
+        query = message.content[len("!search"):].strip()
+        
+        if not query:
+            await send_usage_response(message.channel, "Usage: !search words to look for (e.g. `!search mint stirred`)")
+            return
+        
+        results = search_drinks_workflow(query)
+        
+        if not results:
+            await send_error_response(message.channel, f"No drinks found for '{query}'.")
+            return
+        
+        embed = discord.Embed(title=f"🔎 Results for \"{query}\"", color=0x88c0ee)
+        for result in results:
+            embed.add_field(name=result['name'], value=result['snippet'] or "​", inline=False)
+        
+        await send_success_response(message.channel, embed)
+        
+    except Exception as e:
+        await send_error_response(message.channel, str(e))
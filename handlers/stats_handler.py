@@ -0,0 +1,45 @@
+import discord
+from utils.response_utils import send_error_response, send_success_response
+from data.user_processor import get_user_stats_workflow, flush_pending_logs_workflow
+
+def format_count(value):
+    """Format a drink count without a trailing .0"""
+    return f"{value:g}"
+
+async def handle_stats_command(message):
+    """
+    Handle the !stats command
+    
+    Args:
+        message: Discord message object
+    """
+    try:
+        await flush_pending_logs_workflow(message.author.id)
+        stats = get_user_stats_workflow(message.author.id)
+        
+        if not stats or not stats['total_logs']:
+            await send_error_response(message.channel, "You haven't logged any drinks yet! Try `!drink \"Drink Name\"` first.")
+            return
+        
+        embed = discord.Embed(
+            title=f"📊 Drink stats for {message.author.display_name}",
+            description=f"{format_count(stats['total_drinks'])} drinks over {stats['active_days']} days",
+            color=0x88c0ee
+        )
+        embed.add_field(name="Today", value=format_count(stats['today']), inline=True)
+        embed.add_field(name="Last 7 days", value=format_count(stats['last_7_days']), inline=True)
+        embed.add_field(name="Last 30 days", value=format_count(stats['last_30_days']), inline=True)
+        embed.add_field(name="Per active day", value=f"{stats['average_per_active_day']:.1f}", inline=True)
+        embed.add_field(name="Current streak", value=f"{stats['current_streak']} days", inline=True)
+        embed.add_field(name="Longest streak", value=f"{stats['longest_streak']} days", inline=True)
+        
+        weeks = "\n".join(f"{w['week_start']}: {format_count(w['drinks'])}" for w in stats['per_week'][-4:])
+        embed.add_field(name="Weekly", value=weeks, inline=False)
+        if stats['favorites']:
+            favorites = "\n".join(f"{f['name']} ({f['logs']}x)" for f in stats['favorites'])
+            embed.add_field(name="Favorites", value=favorites, inline=False)
+        
+        await send_success_response(message.channel, embed)
+        
+    except Exception as e:
+        await send_error_response(message.channel, f"Error getting stats: {e}")
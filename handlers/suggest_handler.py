@@ -1,7 +1,7 @@
 import discord
 from utils.embed_utils import build_ingredients_text_from_dict
 from utils.response_utils import send_error_response, send_success_response
-from data.user_processor import get_user_with_history, determine_user_suggestion_strategy, get_drink_suggestion_workflow
+from data.user_processor import get_user_with_history, determine_user_suggestion_strategy, get_drink_suggestion_workflow, flush_pending_logs_workflow
 
 async def handle_suggest_command(message):
     """
@@ -24,7 +24,8 @@ async def handle_suggest_command(message):
             except Exception:
                 k = 1
         
-        # Get user and their drink history
+        # Get user and their drink history (including !drink logs still in the journal)
+        await flush_pending_logs_workflow(user_id)
         user, user_drink_history, drink_count = get_user_with_history(user_id)
         
         # Determine suggestion strategy
@@ -36,7 +37,7 @@ async def handle_suggest_command(message):
             print(f"User {user_id} weights: {user.prefs}")
         
         # Get drink suggestion (pass k)
-        suggested_drinks = get_drink_suggestion_workflow(user_id, strategy, k=k)
+        suggested_drinks = await get_drink_suggestion_workflow(user_id, strategy, k=k)
         
         if not suggested_drinks:
             if strategy == 'popular':
@@ -2,6 +2,9 @@ import discord
 import os
 from dotenv import load_dotenv
 from backend.database import update_database
+from backend.worker_pool import worker_pool
+from backend.write_behind import log_queue
+from backend.maintenance import maintenance_scheduler
 from config.bot_config import create_discord_client
 from bot_core import on_ready_handler, message_handler
 
@@ -15,6 +18,8 @@ client = discord.Client(intents=intents)
 @client.event
 async def on_ready():
     await client.change_presence(activity=discord.Game(name="!drinkhelp for help"))
+    # Log rollup, ANALYZE and incremental vacuum in the background every MAINTENANCE_INTERVAL_HOURS
+    maintenance_scheduler.start()
     print(f"Logged in as {client.user}")
 
 @client.event
@@ -25,4 +30,10 @@ async def on_message(message):
 
 if __name__ == "__main__":
     update_database()
-    client.run(TOKEN) 
\ No newline at end of file
+    # Write drink logs journaled by a previous run that stopped before flushing
+    log_queue.recover()
+    # Start the recommendation/matching workers before the first command arrives
+    worker_pool.warm_up()
+    client.run(TOKEN)
+    # The flusher stopped with the event loop; write what it had not flushed yet
+    log_queue.drain()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the bot's top-level packages (backend, data) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Run worker-pool tasks on a thread; a process pool would open the real database
+os.environ.setdefault("WORKER_POOL_SIZE", "0")
@@ -0,0 +1,99 @@
+"""
+Unit-of-work guarantee for !drink: the command only reads, and the write-behind
+flush writes the log, user, aggregates, co-occurrence and prefs in a fixed number
+of statements in one transaction.
+"""
+
+import asyncio
+import pytest
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, select
+from backend import database, index_sync
+from backend.database import count_statements, bump_catalog_version
+from backend.models import Drink, User, UserDrinkLog
+from backend.autocomplete import autocomplete_index
+from backend.write_behind import WriteBehindQueue
+import data.drink_processor as drink_processor
+
+# The drink row; resolution comes from the autocomplete index and the log goes to the journal
+WORKFLOW_STATEMENTS = 1
+# Journal segment check, user touch (insert or last_seen update), drink ingredients, user
+# load, log insert, daily and drink stats upserts, co-occurrence before/after reads, pair
+# upsert, neighbor staleness, prefs update, applied segment read and write
+NEW_USER_FLUSH_STATEMENTS = 15
+EXISTING_USER_FLUSH_STATEMENTS = 15
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # Point every new connection of the shared engine at a temp database
+    path = str(tmp_path / "database.db")
+
+    def connect_to_temp(dialect, connection_record, cargs, cparams):
+        cargs[0] = path
+
+    monkeypatch.setattr(database.engine, "echo", False)
+    database.engine.dispose()
+    event.listen(database.engine, "do_connect", connect_to_temp)
+    SQLModel.metadata.create_all(database.engine)
+    with Session(database.engine) as session:
+        session.add(Drink(name="Negroni", ingredients_json=["Gin", "Campari", "Sweet Vermouth"], measures_json=["1 oz", "1 oz", "1 oz"]))
+        session.add(Drink(name="Boulevardier", ingredients_json=["Bourbon", "Campari", "Sweet Vermouth"], measures_json=["1 oz", "1 oz", "1 oz"]))
+        bump_catalog_version(session)
+        session.commit()
+    autocomplete_index.rebuild_index_from_database()
+    # Keep refresh_if_stale's catalog-version query out of the counted statements
+    monkeypatch.setattr(index_sync, "VERSION_CHECK_INTERVAL", float("inf"))
+    log_queue = WriteBehindQueue(directory=str(tmp_path / "journal"), interval=3600)
+    monkeypatch.setattr(drink_processor, "log_queue", log_queue)
+    yield log_queue
+    event.remove(database.engine, "do_connect", connect_to_temp)
+    database.engine.dispose()
+
+
+async def log_drink(log_queue, drink_name, user_id):
+    """Run !drink's workflow, then flush; returns (workflow statements, flush statements, flush commits)"""
+    with count_statements() as workflow:
+        _, drink, _ = await drink_processor.process_drink_logging_workflow(drink_name, 1, user_id)
+    assert drink is not None and drink.name == drink_name
+    commits = []
+
+    def count_commit(conn):
+        commits.append(conn)
+
+    event.listen(database.engine, "commit", count_commit)
+    try:
+        with count_statements() as flush:
+            assert await log_queue.flush() == 1
+    finally:
+        event.remove(database.engine, "commit", count_commit)
+    return workflow, flush, len(commits)
+
+
+def run_logs(log_queue, logs):
+    """Log (drink name, user id) pairs in order on one event loop; returns log_drink's result for each"""
+    async def run():
+        log_queue.recover()
+        try:
+            return [await log_drink(log_queue, name, user_id) for name, user_id in logs]
+        finally:
+            await log_queue.stop()
+    return asyncio.run(run())
+
+
+def test_new_user_drink_is_one_read_and_one_flush_transaction(queue):
+    [(workflow, flush, commits)] = run_logs(queue, [("Negroni", 42)])
+    assert len(workflow) == WORKFLOW_STATEMENTS, workflow
+    assert commits == 1
+    assert len(flush) == NEW_USER_FLUSH_STATEMENTS, flush
+    with Session(database.engine) as session:
+        user = session.get(User, 42)
+        assert user is not None and set(user.prefs) == {"Gin", "Campari", "Sweet Vermouth"}
+        assert len(session.exec(select(UserDrinkLog)).all()) == 1
+
+
+def test_existing_user_drink_is_one_read_and_one_flush_transaction(queue):
+    _, (workflow, flush, commits) = run_logs(queue, [("Negroni", 42), ("Boulevardier", 42)])
+    assert len(workflow) == WORKFLOW_STATEMENTS, workflow
+    assert commits == 1
+    assert len(flush) == EXISTING_USER_FLUSH_STATEMENTS, flush
@@ -0,0 +1,28 @@
+"""parse_measure_volume: measure strings to (millilitres or parts, is_part)"""
+
+import pytest
+from backend.utils import parse_measure_volume
+
+OZ = 29.57
+
+
+@pytest.mark.parametrize("measure, expected", [
+    ("1 1/2 oz", (1.5 * OZ, False)),
+    ("2-3 dashes", (2 * 0.92, False)),
+    ("2 parts", (2.0, True)),
+    ("1 slice", (2.0, False)),
+    # Units written right after the number
+    ("4cl", (40.0, False)),
+    ("10ml", (10.0, False)),
+    ("1.5oz", (1.5 * OZ, False)),
+    ("70ml/2fl oz", (70.0, False)),
+])
+def test_parses_units(measure, expected):
+    amount, is_part = parse_measure_volume(measure)
+    assert amount == pytest.approx(expected[0])
+    assert is_part == expected[1]
+
+
+@pytest.mark.parametrize("measure", ["", "Fill with", "1", "1/2 lime", "Juice of 1 lemon", "Top up with soda"])
+def test_measures_without_a_unit(measure):
+    assert parse_measure_volume(measure) == (None, False)
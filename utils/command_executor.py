@@ -0,0 +1,122 @@
+import asyncio
+
+# Commands that write user state; run one at a time per user
+MUTATING_COMMANDS = ("!drink", "!adddrink")
+
+
+def normalize_command(content):
+    """
+    Normalize a command for coalescing: case-folded, whitespace collapsed
+    Args:
+        content: Raw message content
+    Returns:
+        str: Normalized command text
+    """
+    return " ".join(content.lower().split())
+
+
+def is_mutating_command(content):
+    """
+    Check whether a command changes user state (logs, prefs, drinks)
+    Args:
+        content: Raw message content
+    Returns:
+        bool: True for !drink / !adddrink (but not !drinkhelp)
+    """
+    command = normalize_command(content).split(" ", 1)[0]
+    return command in MUTATING_COMMANDS
+
+
+class RecordingChannel:
+    """Forwards send() to the real channel and keeps the replies for coalesced callers"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.sent = []
+
+    async def send(self, *args, **kwargs):
+        self.sent.append((args, kwargs))
+        return await self.channel.send(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+
+class MessageProxy:
+    """Message whose channel records replies; everything else comes from the original"""
+
+    def __init__(self, message):
+        self._message = message
+        self.channel = RecordingChannel(message.channel)
+
+    def __getattr__(self, name):
+        return getattr(self._message, name)
+
+
+class CommandExecutor:
+    """
+    Runs bot command handlers with:
+    - single-flight coalescing: an identical read-only command (same user, same
+      normalized text) that is already running is awaited instead of re-run, and its
+      replies are replayed if the duplicate came from another channel; a message
+      delivered twice (same message id) runs once
+    - per-user serialization of mutating commands, so two !drink calls from one user
+      never interleave their read-modify-write of User.prefs; different users run in parallel
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._user_locks = {}  # user_id -> [lock, waiters]
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def _key(self, message):
+        if is_mutating_command(message.content):
+            # Only exact redeliveries are duplicates; two real !drink messages both count
+            message_id = getattr(message, "id", None)
+            return ("message", message_id) if message_id is not None else None
+        return ("command", message.author.id, normalize_command(message.content))
+
+    async def execute(self, message, handler):
+        """
+        Run handler(message), coalescing and serializing as described above
+        Args:
+            message: Discord message object
+            handler: Async command handler taking the message
+        """
+        key = self._key(message)
+        leader = self._inflight.get(key) if key is not None else None
+        if leader is not None:
+            self.stats["coalesced"] += 1
+            proxy = await asyncio.shield(leader)
+            if proxy.channel.channel is not message.channel:
+                for args, kwargs in proxy.channel.sent:
+                    await message.channel.send(*args, **kwargs)
+            return
+
+        task = asyncio.ensure_future(self._run(message, handler))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        await asyncio.shield(task)
+
+    async def _run(self, message, handler):
+        self.stats["executed"] += 1
+        proxy = MessageProxy(message)
+        if not is_mutating_command(message.content):
+            await handler(proxy)
+            return proxy
+        user_id = message.author.id
+        entry = self._user_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await handler(proxy)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._user_locks.pop(user_id, None)
+        return proxy
+
+
+# Shared by the command router
+command_executor = CommandExecutor()